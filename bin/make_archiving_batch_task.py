@@ -0,0 +1,93 @@
+import json
+import sys
+from pathlib import Path
+from uuid import uuid4
+
+import pika
+from archivingsystem.common.yaml_parser import parse_yaml_config
+from archivingsystem.rabbitmq_connection.task_consumer import ConnectionMaker
+
+DEFAULT_BATCH_SIZE = 100
+
+
+def format_batch_task_message(file_paths, owner):
+    task_message = {
+        "task": "archive_batch",
+        "files": [
+            {"file_path": str(file_path), "owner_name": str(owner)}
+            for file_path in file_paths
+        ],
+    }
+    return json.dumps(task_message)
+
+
+def read_file_list(file_list_path):
+    with open(file_list_path, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def make_batch_tasks(config, file_paths, owner):
+    batch_size = config.get("archiving_batch", {}).get(
+        "batch_size", DEFAULT_BATCH_SIZE
+    )
+    task_queue = config["rabbitmq_info"].get("task_queue")
+    c_maker = ConnectionMaker(config.get("rabbitmq_connection"))
+    connection = c_maker.make_connection()
+    channel = connection.channel()
+    for start in range(0, len(file_paths), batch_size):
+        batch = file_paths[start : start + batch_size]  # noqa: E203
+        channel.basic_publish(
+            exchange="",
+            routing_key=task_queue,
+            properties=pika.BasicProperties(correlation_id=str(uuid4())),
+            body=format_batch_task_message(batch, owner),
+        )
+        print(
+            "Batch task with {} files published to: {}".format(
+                len(batch), task_queue
+            )
+        )
+    channel.close()
+    connection.close()
+
+
+def raise_system_exit():
+    raise SystemExit(
+        f"Usage: {sys.argv[0]} (-c | --config) <path to yaml config for"
+        " Rabbitmq connection> (-fl | --fileList) <path to text file with"
+        " paths of files which will be archived, one per line>"
+        " (-o | --owner) <owner name>"
+    )
+
+
+def parse_arguments(args):
+    if not (len(args) == 6):
+        raise_system_exit()
+
+    arguments = dict(zip(args[::2], args[1::2]))
+    config_path = arguments.get("-c") or arguments.get("--config")
+    file_list_path = arguments.get("-fl") or arguments.get("--fileList")
+    owner = arguments.get("-o") or arguments.get("--owner")
+    if config_path is None or file_list_path is None or owner is None:
+        raise_system_exit()
+    return Path(config_path), Path(file_list_path), owner
+
+
+def main():
+    """
+    takes 3 system arguments:
+        -c | --config   => configuration file path for connection to Rabbitmq
+        -fl | --fileList     => text file with file paths for archiving
+        -o | --owner     => owner name of archived files
+    files are split to batches of archiving_batch.batch_size from config,
+    every batch is archived with only two timestamps
+    """
+    config_path, file_list_path, owner = parse_arguments(sys.argv[1:])
+
+    make_batch_tasks(
+        parse_yaml_config(config_path), read_file_list(file_list_path), owner
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import sys
+from pathlib import Path
+from uuid import uuid4
+
+import pika
+from archivingsystem.common.yaml_parser import parse_yaml_config
+from archivingsystem.rabbitmq_connection.task_consumer import ConnectionMaker
+from archivingsystem.validation.bulk_validator import format_bulk_task_message
+
+
+def read_recipients(recipients_path):
+    with open(recipients_path, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def make_bulk_task(config, selection, recipients):
+    task_queue = config["rabbitmq_info"].get("task_queue")
+    bulk_validation_id = str(uuid4())
+    c_maker = ConnectionMaker(config.get("rabbitmq_connection"))
+    connection = c_maker.make_connection()
+    channel = connection.channel()
+    channel.basic_publish(
+        exchange="",
+        routing_key=task_queue,
+        properties=pika.BasicProperties(correlation_id=str(uuid4())),
+        body=format_bulk_task_message(
+            bulk_validation_id, selection, recipients
+        ),
+    )
+    print(
+        "Bulk validation {} of files {} published to: {}".format(
+            bulk_validation_id, selection, task_queue
+        )
+    )
+    channel.close()
+    connection.close()
+
+
+def raise_system_exit():
+    raise SystemExit(
+        f"Usage: {sys.argv[0]} (-c | --config) <path to yaml config for"
+        " Rabbitmq connection> (-r | --recipients) <path to text file with"
+        " emails of recipients of report, one per line> and one of"
+        " (--range) <first FileID>:<last FileID>, (-o | --owner) <owner"
+        " name>, (--notValidatedSince) <'YYYY-MM-DD HH:MM:SS'>"
+    )
+
+
+def parse_selection(arguments):
+    if "--range" in arguments:
+        first_id, _, last_id = arguments["--range"].partition(":")
+        if not (first_id.isdigit() and last_id.isdigit()):
+            raise_system_exit()
+        return {"file_id_from": int(first_id), "file_id_to": int(last_id)}
+    owner = arguments.get("-o") or arguments.get("--owner")
+    if owner is not None:
+        return {"owner": owner}
+    if "--notValidatedSince" in arguments:
+        return {"not_validated_since": arguments["--notValidatedSince"]}
+    raise_system_exit()
+
+
+def parse_arguments(args):
+    if not (len(args) == 6):
+        raise_system_exit()
+
+    arguments = dict(zip(args[::2], args[1::2]))
+    config_path = arguments.get("-c") or arguments.get("--config")
+    recipients_path = arguments.get("-r") or arguments.get("--recipients")
+    if config_path is None or recipients_path is None:
+        raise_system_exit()
+    return Path(config_path), Path(recipients_path), parse_selection(arguments)
+
+
+def main():
+    """
+    takes 3 system arguments:
+        -c | --config   => configuration file path for connection to Rabbitmq
+        -r | --recipients   => text file with emails of report recipients
+        and selection of files, one of:
+        --range   => FileIDs, e.g. 1:1000 (both included)
+        -o | --owner   => owner name of validated files
+        --notValidatedSince   => files not validated since given date
+    published task validates first page of selected files and
+    publishes task for next page, progress of job is kept in
+    BulkValidations table and one report is sent to every recipient
+    after last page
+    """
+    config_path, recipients_path, selection = parse_arguments(sys.argv[1:])
+
+    make_bulk_task(
+        parse_yaml_config(config_path),
+        selection,
+        read_recipients(recipients_path),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -13,14 +13,15 @@ def raise_system_exit():
     raise SystemExit(
         f"Usage: {sys.argv[0]} (-ho | --hours) <number of hours between"
         " checks> (-c | --config) <path to yaml config for Rabbitmq"
-        " connection>"
+        " connection> [(-m | --mode) <deadline | spread>]"
     )
 
 
 def parse_arguments(args):
-    if not (len(args) == 4):
+    if not (len(args) == 4 or len(args) == 6):
         raise_system_exit()
     config_path = None
+    mode = None
     if args[0] == "-ho" or args[0] == "--hours":
         hours = int(args[1])
 
@@ -29,7 +30,14 @@ def parse_arguments(args):
 
     else:
         raise_system_exit()
-    return hours, config_path
+
+    if len(args) == 6:
+        if not (args[4] == "-m" or args[4] == "--mode"):
+            raise_system_exit()
+        if args[5] not in ("deadline", "spread"):
+            raise_system_exit()
+        mode = args[5]
+    return hours, config_path, mode
 
 
 def run_retimestamping_checker(config, hours):
@@ -37,7 +45,7 @@ def run_retimestamping_checker(config, hours):
     scheduler.add_job(
         func=run_checker_controller,
         trigger="interval",
-        args=[config],
+        args=[config, hours],
         hours=hours,
     )
     scheduler.start()
@@ -48,12 +56,17 @@ def main():
     Parse args
     -ho  | --hours      how othen will run checking scripts for retimestamping
     -c   | --config     path yaml config for rabbitmq and database
+    -m   | --mode       optional, deadline or spread, overrides config
     required options:
     reimestamping_scheduler.py [-ho | --hours ] [-c | --config]
     """
 
-    hours, config_path = parse_arguments(sys.argv[1:])
+    hours, config_path, mode = parse_arguments(sys.argv[1:])
     parsed_config = parse_yaml_config(config_path)
+    if mode is not None:
+        if not parsed_config.get("retimestamping_checker"):
+            parsed_config["retimestamping_checker"] = {}
+        parsed_config["retimestamping_checker"]["mode"] = mode
     run_retimestamping_checker(parsed_config, hours)
 
 
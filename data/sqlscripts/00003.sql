@@ -0,0 +1,3 @@
+-- Index for retimestamping checker, due files are selected by range on ExpirationDateTS
+use archivingsystem;
+CREATE INDEX ArchivedFilesIX_ExpirationDateTS ON ArchivedFiles (ExpirationDateTS);
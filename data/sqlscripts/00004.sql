@@ -0,0 +1,9 @@
+-- Leases of published retimestamping tasks, leased files are skipped by checker and duplicate tasks are dropped by worker
+use archivingsystem;
+CREATE table RetimestampLeases(
+	FileID INT NOT NULL,
+	LeaseID CHAR(36) NOT NULL,
+	LeasedUntil DATETIME NOT NULL,
+	PRIMARY KEY (FileID),
+	CONSTRAINT RetimestampLeasesFK_ArchivedFiles FOREIGN KEY (FileID) REFERENCES ArchivedFiles(FileID) ON DELETE CASCADE ON UPDATE RESTRICT
+) ENGINE = InnoDB CHARSET = utf8;
@@ -0,0 +1,10 @@
+-- Hashes and certificates are stored as raw bytes bound by prepared statements, convert existing base64 text values
+use archivingsystem;
+UPDATE ArchivedFiles SET
+	OriginFileHashSha512 = FROM_BASE64(OriginFileHashSha512),
+	SigningCert = FROM_BASE64(SigningCert),
+	SignatureHashSha512 = FROM_BASE64(SignatureHashSha512),
+	Package0HashSha512 = FROM_BASE64(Package0HashSha512);
+UPDATE FilePackages SET
+	TsaCert = FROM_BASE64(TsaCert),
+	PackageHashSha512 = FROM_BASE64(PackageHashSha512);
@@ -0,0 +1,10 @@
+-- Time and result of last validation of archived file, bulk validation selects files not validated since given date
+use archivingsystem;
+CREATE table FileValidations(
+	FileID INT NOT NULL,
+	ValidatedAt DATETIME NOT NULL,
+	IsValid BOOLEAN NOT NULL,
+	PRIMARY KEY (FileID),
+	INDEX FileValidationsIX_ValidatedAt (ValidatedAt),
+	CONSTRAINT FileValidationsFK_ArchivedFiles FOREIGN KEY (FileID) REFERENCES ArchivedFiles(FileID) ON DELETE CASCADE ON UPDATE RESTRICT
+) ENGINE = InnoDB CHARSET = utf8;
@@ -0,0 +1,15 @@
+-- Bulk validation runs as chain of tasks with one page of files each, job keeps FileID of last validated page and counts of files, results of its files are kept in FileValidations for final report
+use archivingsystem;
+CREATE table BulkValidations(
+	BulkValidationID CHAR(36) NOT NULL,
+	LastFileID INT NOT NULL,
+	ValidatedCount INT NOT NULL,
+	NotValidCount INT NOT NULL,
+	StartedAt DATETIME NOT NULL,
+	FinishedAt DATETIME NULL,
+	PRIMARY KEY (BulkValidationID)
+) ENGINE = InnoDB CHARSET = utf8;
+ALTER TABLE FileValidations
+	ADD COLUMN BulkValidationID CHAR(36) NULL,
+	ADD COLUMN Result TEXT NULL,
+	ADD INDEX FileValidationsIX_BulkValidationID (BulkValidationID);
@@ -1,16 +1,22 @@
 import base64
+import hashlib
+import json
 import logging
 import ntpath
 import os
+import time
 from contextlib import closing
 from hashlib import sha512
 from uuid import uuid4
 
 import rfc3161ng
-from cryptography.hazmat.primitives.serialization import Encoding
 
+from ..common import merkle, package_index
 from ..common import utils as common_utils
+from ..common.credential_store import get_credential_store
+from ..common.crl_cache import CrlCache
 from ..common.exceptions import FileTransferNotSuccesfullCustomException
+from ..common.tsa_client import TimestampingClient
 from ..database.archived_file import ArchivedFile
 from ..database.file_package import FilePackage
 
@@ -26,17 +32,44 @@ class Archiver:
 
     on init it needs database library object and
     configuration file. Example could be found
-    in example_config and it needs archiving_system_info part
+    in example_config and it needs archiving_system_info part.
+    TSA client and CRL cache shared by worker can be given,
+    otherwise new ones are created
     """
 
-    def __init__(self, db_handler, config: dict):
+    def __init__(
+        self,
+        db_handler,
+        config: dict,
+        tsa_client: TimestampingClient = None,
+        crl_cache: CrlCache = None,
+    ):
         self.db_handler = db_handler
         self.archiving_config = config
+        self.tsa_client = tsa_client or TimestampingClient(
+            self.archiving_config["TSA_info"]
+        )
+        self.crl_cache = crl_cache or CrlCache(
+            self.archiving_config.get("crl_cache")
+        )
+        self.credential_store = get_credential_store()
         self.archived_file_rec = ArchivedFile()
         self.file_pack_record = FilePackage()
         self.archiving_storage_path = self.archiving_config.get(
             "archiving_storage_path"
         )
+        self.verify_data_transfer = self.archiving_config.get(
+            "verify_data_transfer", False
+        )
+        self.remote_fetch_mode = self.archiving_config.get(
+            "remote_fetch_mode", "single_pass"
+        )
+        self.transfer_backend = self.archiving_config.get(
+            "transfer_backend", "stream"
+        )
+        self.additional_hash_algorithms = self.archiving_config.get(
+            "additional_hash_algorithms", []
+        )
 
     def archive(self, file_path, owner):
         """
@@ -68,6 +101,59 @@ class Archiver:
 
         return "OK"  # or exception
 
+    def prepare_batch_member(self, file_path, owner):
+        """
+        First step of batch archiving (see BatchArchiver), file
+        is transfered to archiving storage. Returns file hash
+        which will be timestamped together with other files
+        """
+        self._assign_basic_info(file_path, owner)
+        self._validate_certificates()
+        self._assign_tsa_info()
+        self._transfer_file(file_path)
+        return self.archived_file_rec.OriginFileHashSha512
+
+    def sign_batch_member(self, ts0, proof0):
+        """
+        Second step of batch archiving, it needs timestamp0 of
+        merkle root and inclusion proof of file hash. Returns
+        signature hash which will be timestamped together
+        with other signatures
+        """
+        self._store_batch_timestamp(
+            ts0, proof0, "timestamp0", "inclusion_proof0"
+        )
+        self.archived_file_rec.TimeOfFirstTS = rfc3161ng.get_timestamp(ts0)
+        self._make_package0()
+        self._sign_package()
+        return self.archived_file_rec.SignatureHashSha512
+
+    def finish_batch_member(self, ts1, proof1):
+        """
+        Last step of batch archiving, it needs timestamp1 of
+        merkle root and inclusion proof of signature hash
+        """
+        self._store_batch_timestamp(
+            ts1, proof1, "timestamp1", "inclusion_proof1"
+        )
+        self._assign_ts1_info(ts1)
+        self._store_used_cert_files()
+        self._make_final_package()
+
+    def get_db_records(self):
+        """
+        Returns tuple (ArchivedFile, FilePackage) of finished
+        batch member for database insert
+        """
+        return self.archived_file_rec, self.file_pack_record
+
+    def discard(self):
+        """
+        Deletes archiving directory of file if it was created
+        """
+        if self.archived_file_rec.PackageStoragePath:
+            common_utils.delete_file(self.archived_file_rec.PackageStoragePath)
+
     def _assign_basic_info(self, file_path, owner):
         logger.info("assigning file name, owner name and original file path")
         self.archived_file_rec.FileName = self._get_file_name(file_path)
@@ -79,11 +165,8 @@ class Archiver:
         # path_ca = self.archiving_config["signing_info"]["certificate_path"]
         # path_crl = self.archiving_config["signing_info"]["crl_path"]
         path_tsa_ca_pem = self.archiving_config["TSA_info"]["tsa_ca_pem"]
-        self.tsa_current_crl = common_utils.get_current_crl(
-            self.archiving_config["TSA_info"]["tsa_crl_url"]
-        )
-        common_utils.validate_certificate(
-            self.tsa_current_crl, path_tsa_ca_pem
+        self.tsa_current_crl = self.crl_cache.get_validated_crl(
+            self.archiving_config["TSA_info"]["tsa_crl_url"], path_tsa_ca_pem
         )
         logger.info("TSA cert is valid")
         # with open(  # used for own CRL validation
@@ -100,32 +183,70 @@ class Archiver:
         self.file_pack_record.TimeStampingAuthority = self.archiving_config[
             "TSA_info"
         ]["tsa_tsr_url"]
-        cert = common_utils.get_certificate(
-            self.archiving_config["TSA_info"]["tsa_cert_path"]
-        )
         self.file_pack_record.TsaCert = base64.b64encode(
-            cert.public_bytes(Encoding.PEM)
+            self.tsa_client.get_certificate_pem()
         )
 
     def _transfer_file(self, file_path):
+        # additional digests are computed from the same data as sha512
+        additional_hashes = {
+            name: hashlib.new(name) for name in self.additional_hash_algorithms
+        }
         if self.archiving_config["remote_access"] is False:
+            # file is hashed while copied, validation of data transfer
+            # is done during copying only if verify_data_transfer is set
             logger.info("transfering local file to archiving storage")
             (
                 self.dst_file_path,
                 self.archived_file_rec.PackageStoragePath,
                 self.archived_file_rec.OriginFileHashSha512,
-            ) = self._transfer_local_file_to_archiving_storage(file_path)
+            ) = self._transfer_local_file_to_archiving_storage(
+                file_path, additional_hashes
+            )
         else:
             logger.info("transfer remote file to archiving storage")
             (
                 self.dst_file_path,
                 self.archived_file_rec.PackageStoragePath,
                 self.archived_file_rec.OriginFileHashSha512,
-            ) = self._transfer_remote_file_to_archiving_storage(file_path)
+            ) = self._transfer_remote_file_to_archiving_storage(
+                file_path, additional_hashes
+            )
+
+            # in single_pass mode downloaded bytes were hashed, so reading
+            # the copy again is only needed if verify_data_transfer is set
+            if (
+                self.remote_fetch_mode != "single_pass"
+                or self.verify_data_transfer
+            ):
+                logger.info("validating data transfer")
+                self._validate_data_transfer(
+                    self.archived_file_rec.OriginFileHashSha512,
+                    self.dst_file_path,
+                )
+
+        if additional_hashes:
+            self._store_additional_digests(additional_hashes)
 
-        logger.info("validating data transfer")
-        self._validate_data_transfer(
-            self.archived_file_rec.OriginFileHashSha512, self.dst_file_path
+    def _store_additional_digests(self, additional_hashes):
+        logger.info(
+            "storing additional digests of archived file: %s",
+            str(self.additional_hash_algorithms),
+        )
+        digests = {
+            name: file_hash.digest()
+            for name, file_hash in additional_hashes.items()
+        }
+        logger.debug("additional digests: %s", str(digests))
+        # stored next to the file, so digests end up in Package0
+        # and are covered by signature and both timestamps
+        common_utils.store_ts_data(
+            json.dumps(
+                {name: digest.hex() for name, digest in digests.items()},
+                indent=2,
+            ).encode(),
+            self.archived_file_rec.PackageStoragePath,
+            "file_digests.json",
         )
 
     def _make_ts0(self):
@@ -137,12 +258,12 @@ class Archiver:
 
     def _make_package0(self):
         logger.info("packing timestamp0 and file to tar package")
-        package0_tar_path = self._make_tar_package_from_dir_content(
+        (
+            _,
+            self.archived_file_rec.Package0HashSha512,
+        ) = self._make_tar_package_from_dir_content(
             self.archived_file_rec.PackageStoragePath, "Package0.tar"
         )
-        self.archived_file_rec.Package0HashSha512 = common_utils.get_file_hash(
-            sha512, package0_tar_path
-        )
 
     def _sign_package(self):
         logger.info("signing the hash of package0")
@@ -151,23 +272,28 @@ class Archiver:
         )
 
         logger.info("storing signature next to package0")
-        signature_file_path = common_utils.store_signature(
+        common_utils.store_signature(
             self.archived_file_rec.PackageStoragePath, b64signature
         )
-        self.archived_file_rec.SignatureHashSha512 = (
-            common_utils.get_file_hash(sha512, signature_file_path)
-        )
+        self.archived_file_rec.SignatureHashSha512 = sha512(
+            b64signature
+        ).digest()
 
         logger.info("obtaining signing certificate")
-        self.archived_file_rec.SigningCert = common_utils.get_certificate(
-            self.archiving_config["signing_info"]["certificate_path"]
-        ).public_bytes(Encoding.PEM)
+        self.archived_file_rec.SigningCert = (
+            self.credential_store.get_certificate_pem(
+                self.archiving_config["signing_info"]["certificate_path"]
+            )
+        )
 
     def _make_ts1(self):
         logger.info("creating timestamp1")
         ts1 = self._create_timestamp(
             self.archived_file_rec.SignatureHashSha512, "timestamp1"
         )
+        self._assign_ts1_info(ts1)
+
+    def _assign_ts1_info(self, ts1):
         self.file_pack_record.IssuingDate = rfc3161ng.get_timestamp(ts1)
         self.archived_file_rec.ExpirationDateTS = self._get_expiration_date(
             ts1
@@ -200,11 +326,16 @@ class Archiver:
 
     def _make_final_package(self):
         logger.info("creating final tar package")
-        final_tar_path = self._make_tar_package_from_dir_content(
+        (
+            tar_path,
+            self.file_pack_record.PackageHashSha512,
+        ) = self._make_tar_package_from_dir_content(
             self.archived_file_rec.PackageStoragePath, "Package1.tar"
         )
-        self.file_pack_record.PackageHashSha512 = common_utils.get_file_hash(
-            sha512, final_tar_path
+        logger.debug("storing index of final package")
+        package_index.store_index(
+            self.archived_file_rec.PackageStoragePath,
+            package_index.build_index(tar_path),
         )
 
     def _insert_db_record(self):
@@ -224,9 +355,7 @@ class Archiver:
 
     def _create_timestamp(self, fhash, ts_name):
         logger.debug("obtaining timestamp for file hash %s", str(fhash))
-        timestamp = common_utils.get_timestamp(
-            self.archiving_config["TSA_info"], fhash
-        )
+        timestamp = self.tsa_client.get_timestamp(fhash)
         logger.info(
             "copying %s to %s",
             ts_name,
@@ -237,9 +366,25 @@ class Archiver:
         )
         return timestamp
 
-    def _transfer_local_file_to_archiving_storage(self, file_path):
-        logger.debug("getting hash of file: %s", str(file_path))
-        origin_hash = common_utils.get_file_hash(sha512, file_path)
+    def _store_batch_timestamp(self, timestamp, proof, ts_name, proof_name):
+        logger.info(
+            "copying %s and %s to %s",
+            ts_name,
+            proof_name,
+            self.archived_file_rec.PackageStoragePath,
+        )
+        common_utils.store_ts_data(
+            timestamp, self.archived_file_rec.PackageStoragePath, ts_name
+        )
+        common_utils.store_ts_data(
+            merkle.dump_proof(proof),
+            self.archived_file_rec.PackageStoragePath,
+            proof_name,
+        )
+
+    def _transfer_local_file_to_archiving_storage(
+        self, file_path, additional_hashes
+    ):
         new_dir_path = common_utils.create_new_dir_in_location(
             self.archiving_storage_path, str(uuid4())
         )
@@ -247,13 +392,47 @@ class Archiver:
             "created archiving directory path: %s",
             str(new_dir_path),
         )
-        dst_file_path = common_utils.copy_file_to_dir(
-            file_path, new_dir_path, self.archived_file_rec.FileName
+        dst_file_path = os.path.join(
+            new_dir_path, self.archived_file_rec.FileName
         )
+        if self.transfer_backend == "kernel":
+            origin_hash = self._kernel_copy_local_file(
+                file_path, dst_file_path, additional_hashes
+            )
+        else:
+            logger.debug(
+                "copying and hashing file: %s, verification of copy: %s",
+                str(file_path),
+                str(self.verify_data_transfer),
+            )
+            origin_hash = common_utils.copy_file_with_hash(
+                sha512,
+                file_path,
+                dst_file_path,
+                self.verify_data_transfer,
+                additional_hashes,
+            )
         logger.debug("file copied, path: %s", str(dst_file_path))
         return dst_file_path, new_dir_path, origin_hash
 
-    def _transfer_remote_file_to_archiving_storage(self, file_path):
+    def _kernel_copy_local_file(
+        self, file_path, dst_file_path, additional_hashes
+    ):
+        logger.debug("copying file in kernel: %s", str(file_path))
+        method = common_utils.copy_file_kernel(file_path, dst_file_path)
+        logger.debug("file copied using method: %s", method)
+        # data did not pass through userspace, source is hashed, so
+        # the database hash attests original file as in stream backend
+        origin_hash = common_utils.get_file_hash(
+            sha512, file_path, additional_hashes
+        )
+        if self.verify_data_transfer:
+            self._validate_data_transfer(origin_hash, dst_file_path)
+        return origin_hash
+
+    def _transfer_remote_file_to_archiving_storage(
+        self, file_path, additional_hashes
+    ):
         logger.debug("trying to connect to remote storage")
         error_count = 0
         try:
@@ -263,9 +442,6 @@ class Archiver:
                 )
             ) as sftp_connection:
                 logger.info("sftp connection created")
-                origin_hash = common_utils.get_remote_hash(
-                    sftp_connection, file_path, sha512
-                )
                 copy_dir_path = common_utils.create_new_dir_in_location(
                     self.archiving_storage_path, str(uuid4())
                 )
@@ -274,9 +450,23 @@ class Archiver:
                     str(copy_dir_path),
                 )
 
-                dst_file_path = self._copy_remote_file_to_archive(
-                    sftp_connection, file_path, copy_dir_path
-                )
+                if self.remote_fetch_mode == "single_pass":
+                    (
+                        dst_file_path,
+                        origin_hash,
+                    ) = self._fetch_remote_file_to_archive(
+                        sftp_connection,
+                        file_path,
+                        copy_dir_path,
+                        additional_hashes,
+                    )
+                else:
+                    origin_hash = common_utils.get_remote_hash(
+                        sftp_connection, file_path, sha512, additional_hashes
+                    )
+                    dst_file_path = self._copy_remote_file_to_archive(
+                        sftp_connection, file_path, copy_dir_path
+                    )
                 logger.debug(
                     "remote file copied to destination archive: %s",
                     str(dst_file_path),
@@ -322,12 +512,13 @@ class Archiver:
             "creating tar package on path: %s",
             str(tar_path),
         )
-        common_utils.create_tar_file_from_dir(dir_path, tar_path)
-        return tar_path
+        return common_utils.create_tar_file_from_dir(
+            dir_path, tar_path, sha512
+        )
 
     def _make_b64signature(self, hash):
         logger.debug("getting private key")
-        pk = common_utils.get_private_key(
+        pk = self.credential_store.get_private_key(
             self.archiving_config["signing_info"]["private_key_path"],
             self.archiving_config["signing_info"]["pk_password"],
         )
@@ -343,6 +534,25 @@ class Archiver:
         logger.debug("copying finished")
         return dst
 
+    def _fetch_remote_file_to_archive(
+        self, connection_sftp, file_path_to_copy, dst_dir, additional_hashes
+    ):
+        dst = os.path.join(dst_dir, self.archived_file_rec.FileName)
+        logger.debug("downloading and hashing file from sftp storage")
+        start = time.perf_counter()
+        origin_hash = common_utils.get_remote_file_with_hash(
+            connection_sftp, file_path_to_copy, dst, sha512, additional_hashes
+        )
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(dst)
+        logger.debug(
+            "downloading finished, %s bytes in %.3f s (%.0f bytes/s)",
+            str(size),
+            elapsed,
+            size / elapsed if elapsed > 0 else 0,
+        )
+        return dst, origin_hash
+
     def _validate_data_transfer(self, hash_origin, dst_file_path):
         hash_copy = common_utils.get_file_hash(sha512, dst_file_path)
         logger.debug(
@@ -2,15 +2,22 @@ import json
 import logging
 
 # from contextlib import closing - was unused
+from ..common.credential_store import get_credential_store
+from ..common.crl_cache import CrlCache
 from ..common.exception_wrappers import task_exceptions_wrapper
 from ..common.exceptions import WrongTaskCustomException
+from ..common.hashing import configure_hashing
 from ..common.setup_logger import setup_logger
-from ..database.db_library import DatabaseHandler, MysqlConnection
+from ..common.tsa_client import TimestampingClient
+from ..database.connection_pool import MysqlConnectionPool
+from ..database.db_library import DatabaseHandler
 from ..rabbitmq_connection.task_consumer import (
     ConnectionMaker,
     TaskConsumer,
+    get_tasks_in_flight,
 )
 from .archiver import Archiver
+from .batch_archiver import BatchArchiver
 
 logger = logging.getLogger("archiving_system_logging")
 
@@ -22,20 +29,44 @@ class ArchivingWorker:
     It will set callback function to consumer before
     starting him.
     All exceptions known possible exceptions are catched
-    in exception wrappers
+    in exception wrappers.
+    With execution_mode: process in rabbitmq_info, tasks are
+    executed in worker processes, each of them has its own
+    ArchivingWorker (see _init_worker_process)
     """
 
     def __init__(self, config: dict):
+        self.config = config
         self.db_config = config.get("db_config")
-        self.rabbitmq_connection = config.get("rabbitmq_connection")
-        self.connection = ConnectionMaker(self.rabbitmq_connection)
-        self.task_consumer = TaskConsumer(
-            self.connection, config.get("rabbitmq_info")
+        self.db_pool = MysqlConnectionPool(
+            self.db_config,
+            config.get("db_pool"),
+            get_tasks_in_flight(config.get("rabbitmq_info")),
         )
-        self.task_consumer.set_callback(self.archive)
+        self.rabbitmq_connection = config.get("rabbitmq_connection")
         self.archiving_config = config.get("archiving_system_info")
+        self.tsa_client = TimestampingClient(self.archiving_config["TSA_info"])
+        self.crl_cache = CrlCache(self.archiving_config.get("crl_cache"))
+        logger.info("loading signing credentials")
+        get_credential_store().load_signing_credentials(
+            self.archiving_config["signing_info"]
+        )
 
     def run(self):
+        rabbitmq_info = self.config.get("rabbitmq_info")
+        self.connection = ConnectionMaker(self.rabbitmq_connection)
+        self.task_consumer = TaskConsumer(self.connection, rabbitmq_info)
+        if rabbitmq_info.get("execution_mode", "thread") == "process":
+            self.task_consumer.set_callback(
+                _archive_in_worker_process,
+                process_initializer=_init_worker_process,
+                initargs=(self.config,),
+            )
+        else:
+            self.task_consumer.set_callback(self.archive)
+            self.task_consumer.add_metrics_source(
+                "db_pool", self.db_pool.get_metrics
+            )
         logger.info("starting archiving task consumer")
         self.task_consumer.start()
 
@@ -48,11 +79,20 @@ class ArchivingWorker:
         """
         logger.debug("recieved task with body: %s", str(jbody))
 
-        logger.info("creating database connection")
-        with MysqlConnection(self.db_config) as db_connection:
+        logger.info("getting database connection from pool")
+        with self.db_pool.connection() as db_connection:
             db_handler = DatabaseHandler(db_connection)
-            archiver = Archiver(db_handler, self.archiving_config)
-            file_path, owner = self._parse_message_body(jbody)
+            body = self._parse_message_body(jbody)
+            if body.get("task") == "archive_batch":
+                return self._archive_batch(db_handler, body.get("files"))
+
+            archiver = Archiver(
+                db_handler,
+                self.archiving_config,
+                self.tsa_client,
+                self.crl_cache,
+            )
+            file_path, owner = body.get("file_path"), body.get("owner_name")
 
             logger.debug(
                 "executing archiving of file id and owner: %s and %s",
@@ -62,9 +102,23 @@ class ArchivingWorker:
             result = archiver.archive(file_path, owner)
         return result
 
+    def _archive_batch(self, db_handler, files):
+        if not files:
+            raise WrongTaskCustomException("batch task without files")
+        batch_archiver = BatchArchiver(
+            db_handler,
+            self.archiving_config,
+            self.tsa_client,
+            self.crl_cache,
+        )
+        logger.debug("executing archiving of batch: %s", str(files))
+        return batch_archiver.archive_batch(
+            [(f.get("file_path"), f.get("owner_name")) for f in files]
+        )
+
     def _parse_message_body(self, jbody):
         body = json.loads(jbody)
-        if not body.get("task") == "archive":
+        if body.get("task") not in ("archive", "archive_batch"):
             logger.error(
                 "incorrect task for archiving worker: task=%s",
                 str(body.get("task")),
@@ -74,7 +128,22 @@ class ArchivingWorker:
                     str(body.get("task"))
                 ),
             )
-        return body.get("file_path"), body.get("owner_name")
+        return body
+
+
+# worker of current process in process execution mode
+_process_worker = None
+
+
+def _init_worker_process(config):
+    global _process_worker
+    setup_logger(config.get("rabbitmq_logging"))
+    configure_hashing(config.get("hashing"))
+    _process_worker = ArchivingWorker(config)
+
+
+def _archive_in_worker_process(jbody):
+    return _process_worker.archive(jbody)
 
 
 def run_worker(config):
@@ -82,5 +151,6 @@ def run_worker(config):
     This function will setup logger and execute worker
     """
     setup_logger(config.get("rabbitmq_logging"))
+    configure_hashing(config.get("hashing"))
     arch_worker = ArchivingWorker(config)
     arch_worker.run()
@@ -0,0 +1,108 @@
+import logging
+
+from ..common.crl_cache import CrlCache
+from ..common.merkle import MerkleTree
+from ..common.tsa_client import TimestampingClient
+from .archiver import Archiver
+
+logger = logging.getLogger("archiving_system_logging")
+
+
+class BatchArchiver:
+    """
+    BatchArchiver is archiving more files at once with only
+    two timestamps for whole batch. Hashes of all files are
+    aggregated to merkle tree and only its root is timestamped
+    (timestamp0), the same is done with signature hashes
+    (timestamp1). Every package stores shared timestamp and
+    inclusion proof of its own hash (inclusion_proof0 and
+    inclusion_proof1 files next to timestamp0 and timestamp1).
+
+    Batch is archived as a whole, database records of all
+    files are written in one transaction. If any file or the
+    database insert fails, all created archived files are
+    deleted.
+
+    on init it needs database library object and
+    configuration file with archiving_system_info part.
+    """
+
+    def __init__(
+        self,
+        db_handler,
+        config: dict,
+        tsa_client: TimestampingClient = None,
+        crl_cache: CrlCache = None,
+    ):
+        self.db_handler = db_handler
+        self.archiving_config = config
+        self.tsa_client = tsa_client or TimestampingClient(
+            self.archiving_config["TSA_info"]
+        )
+        self.crl_cache = crl_cache or CrlCache(
+            self.archiving_config.get("crl_cache")
+        )
+
+    def archive_batch(self, files):
+        """
+        It needs list of tuples (file path, owner name) of files
+        which will be archived
+        """
+        logger.info("archiving batch of %s files", str(len(files)))
+        archivers = [
+            Archiver(
+                self.db_handler,
+                self.archiving_config,
+                self.tsa_client,
+                self.crl_cache,
+            )
+            for _ in files
+        ]
+        try:
+            file_hashes = [
+                archiver.prepare_batch_member(file_path, owner)
+                for archiver, (file_path, owner) in zip(archivers, files)
+            ]
+            ts0, proofs0 = self._timestamp_batch(file_hashes, "timestamp0")
+            signature_hashes = [
+                archiver.sign_batch_member(ts0, proof)
+                for archiver, proof in zip(archivers, proofs0)
+            ]
+            ts1, proofs1 = self._timestamp_batch(
+                signature_hashes, "timestamp1"
+            )
+            for archiver, proof in zip(archivers, proofs1):
+                archiver.finish_batch_member(ts1, proof)
+        except Exception as e:
+            logger.info(
+                "batch archiving failed, deleting created archived files"
+            )
+            for archiver in archivers:
+                archiver.discard()
+            raise e
+
+        logger.info("writing results of batch to the database")
+        try:
+            self.db_handler.add_full_records_bulk(
+                [archiver.get_db_records() for archiver in archivers]
+            )
+        except Exception as e:
+            logger.info(
+                "unable to write database records of batch, deleting"
+                " created archived files"
+            )
+            for archiver in archivers:
+                archiver.discard()
+            raise e
+        return "OK"  # or exception
+
+    def _timestamp_batch(self, hashes, ts_name):
+        tree = MerkleTree(hashes)
+        logger.info(
+            "creating %s of merkle root for %s hashes",
+            ts_name,
+            str(len(hashes)),
+        )
+        logger.debug("merkle root: %s", tree.root.hex())
+        timestamp = self.tsa_client.get_timestamp(tree.root)
+        return timestamp, [tree.get_proof(i) for i in range(len(hashes))]
@@ -0,0 +1,136 @@
+import datetime
+import logging
+import os
+import threading
+
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+from .exceptions import CertificateNotValidCustomException
+
+logger = logging.getLogger("archiving_system_logging")
+
+
+class CredentialStore:
+    """
+    Process-wide store of loaded private keys and certificates.
+    Every credential is read, decrypted and parsed only once,
+    entry is loaded again only when mtime or size of its file
+    changes. It is safe to share between threads.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_private_key(self, path, password):
+        """
+        Returns private key loaded from PEM file on path
+        and decrypted with password
+        """
+        return self._get(
+            ("private_key", path),
+            path,
+            lambda data: serialization.load_pem_private_key(
+                data, password=password.encode(), backend=default_backend()
+            ),
+        )
+
+    def get_certificate(self, path):
+        """
+        Returns x509 object with PEM certificate from path
+        """
+        return self._get(
+            ("certificate", path),
+            path,
+            lambda data: x509.load_pem_x509_certificate(
+                data, default_backend()
+            ),
+        )
+
+    def get_certificate_pem(self, path):
+        """
+        Returns PEM bytes of certificate from path
+        """
+        return self.get_certificate(path).public_bytes(Encoding.PEM)
+
+    def load_signing_credentials(self, signing_info):
+        """
+        Loads and validates signing certificate and private key,
+        it should be called at worker start so wrong credentials
+        are found before first task. Certificate has to be
+        currently valid and has to match the private key.
+        It needs dictionary with signing information:
+        signing_info: {
+            certificate_path: '/home/server/certs/myCert.crt'
+            private_key_path: '/home/server/certs/myCert.key'
+            pk_password: 'cert_pass'
+        }
+        """
+        certificate = self.get_certificate(signing_info["certificate_path"])
+        private_key = self.get_private_key(
+            signing_info["private_key_path"], signing_info["pk_password"]
+        )
+        validate_certificate_validity(certificate)
+        if _public_bytes(private_key.public_key()) != _public_bytes(
+            certificate.public_key()
+        ):
+            raise CertificateNotValidCustomException(
+                "signing certificate does not match private key"
+            )
+        logger.info(
+            "signing credentials loaded, certificate valid until %s",
+            str(certificate.not_valid_after),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get(self, key, path, loader):
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+            if entry is not None:
+                logger.info("credential file %s changed, reloading", path)
+            else:
+                logger.debug("loading credential file %s", path)
+            with open(path, "rb") as f:
+                value = loader(f.read())
+            self._entries[key] = (version, value)
+            return value
+
+
+def validate_certificate_validity(certificate):
+    """
+    Raises CertificateNotValid exception if x509 certificate
+    is expired or not yet valid
+    """
+    now = datetime.datetime.utcnow()
+    if now < certificate.not_valid_before:
+        raise CertificateNotValidCustomException(
+            "certificate is not valid yet"
+        )
+    if now > certificate.not_valid_after:
+        raise CertificateNotValidCustomException("certificate has expired")
+
+
+def _public_bytes(public_key):
+    return public_key.public_bytes(
+        Encoding.PEM, PublicFormat.SubjectPublicKeyInfo
+    )
+
+
+_credential_store = CredentialStore()
+
+
+def get_credential_store():
+    """
+    Returns credential store shared by whole process
+    """
+    return _credential_store
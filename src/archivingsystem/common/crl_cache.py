@@ -0,0 +1,199 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from calendar import timegm
+
+import requests
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+
+from .utils import load_data, validate_certificate_with_crl
+
+logger = logging.getLogger("archiving_system_logging")
+
+# how long to wait before asking again for CRL whose nextUpdate passed
+STALE_CRL_RETRY_SECONDS = 300
+
+
+class CrlEntry:
+    """
+    Downloaded CRL with its parsed form and HTTP validators
+    """
+
+    def __init__(self, content, etag=None, last_modified=None):
+        self.content = content
+        self.crl = parse_crl(content)
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.time()
+        # paths of CA certificates already validated against this CRL
+        self.validated_certificates = set()
+
+    def get_next_update(self):
+        # next_update_utc is available since cryptography 42
+        if hasattr(self.crl, "next_update_utc"):
+            next_update = self.crl.next_update_utc
+        else:
+            next_update = self.crl.next_update
+        if next_update is None:
+            return None
+        return timegm(next_update.utctimetuple())
+
+
+class CrlCache:
+    """
+    Cache of certificate revocation lists keyed by URL.
+    CRLs are held in memory (bytes and parsed object) and
+    optionaly on disk, so they survive worker restart.
+    Cached CRL is downloaded again only when its nextUpdate
+    passes or when it is older than configured ttl, the
+    download is conditional (ETag / If-Modified-Since).
+    It needs dictionary with config (all values optional):
+    crl_cache: {
+        cache_dir: '/var/cache/archivingsystem/crl'
+        ttl: 3600 (seconds)
+        timeout: 10 (seconds)
+    }
+    """
+
+    def __init__(self, crl_cache_info: dict = None):
+        crl_cache_info = crl_cache_info or {}
+        self.cache_dir = crl_cache_info.get("cache_dir")
+        self.ttl = crl_cache_info.get("ttl")
+        self.timeout = crl_cache_info.get("timeout", 10)
+        self.session = requests.Session()
+        self._entries = {}
+        self._lock = threading.Lock()
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get_crl(self, url):
+        """
+        Returns bytes of current CRL from url and parsed
+        x509.CertificateRevocationList
+        """
+        entry = self._get_entry(url)
+        return entry.content, entry.crl
+
+    def get_validated_crl(self, url, ca_file_path):
+        """
+        Returns bytes of current CRL from url after validating
+        certificate from ca_file_path with it. Validation is
+        done only once for every downloaded CRL
+        """
+        entry = self._get_entry(url)
+        with self._lock:
+            if ca_file_path not in entry.validated_certificates:
+                ca_cert = x509.load_pem_x509_certificate(
+                    load_data(ca_file_path), default_backend()
+                )
+                validate_certificate_with_crl(entry.crl, ca_cert)
+                entry.validated_certificates.add(ca_file_path)
+                logger.debug(
+                    "certificate %s validated with crl from %s",
+                    ca_file_path,
+                    url,
+                )
+        return entry.content
+
+    def _get_entry(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                entry = self._load_from_disk(url)
+            if entry is None or self._is_expired(entry):
+                entry = self._download(url, entry)
+            self._entries[url] = entry
+            return entry
+
+    def _is_expired(self, entry):
+        now = time.time()
+        if self.ttl is not None and now - entry.fetched_at >= self.ttl:
+            return True
+        next_update = entry.get_next_update()
+        if next_update is None:
+            return self.ttl is None
+        if next_update <= entry.fetched_at:
+            # CRL was already stale when downloaded, dont ask every time
+            return now - entry.fetched_at >= STALE_CRL_RETRY_SECONDS
+        return now >= next_update
+
+    def _download(self, url, entry):
+        headers = {}
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        logger.info("downloading crl from %s", url)
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and entry is not None:
+            logger.debug("crl from %s was not modified", url)
+            entry.fetched_at = time.time()
+            self._store_to_disk(url, entry)
+            return entry
+        response.raise_for_status()
+        entry = CrlEntry(
+            response.content,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+        self._store_to_disk(url, entry)
+        return entry
+
+    def _get_cache_path(self, url):
+        return os.path.join(
+            self.cache_dir, hashlib.sha256(url.encode()).hexdigest()
+        )
+
+    def _load_from_disk(self, url):
+        if not self.cache_dir:
+            return None
+        path = self._get_cache_path(url)
+        if not (
+            os.path.isfile(path + ".crl") and os.path.isfile(path + ".json")
+        ):
+            return None
+        try:
+            with open(path + ".json", "r") as f:
+                metadata = json.load(f)
+            entry = CrlEntry(
+                load_data(path + ".crl"),
+                metadata.get("etag"),
+                metadata.get("last_modified"),
+            )
+            entry.fetched_at = metadata["fetched_at"]
+        except (ValueError, KeyError):
+            logger.warning("cached crl for %s is corrupted", url)
+            return None
+        logger.debug("crl for %s loaded from disk cache", url)
+        return entry
+
+    def _store_to_disk(self, url, entry):
+        if not self.cache_dir:
+            return
+        path = self._get_cache_path(url)
+        metadata = {
+            "url": url,
+            "etag": entry.etag,
+            "last_modified": entry.last_modified,
+            "fetched_at": entry.fetched_at,
+        }
+        for suffix, data in (
+            (".crl", entry.content),
+            (".json", json.dumps(metadata).encode()),
+        ):
+            with open(path + suffix + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + suffix + ".tmp", path + suffix)
+
+
+def parse_crl(content):
+    """
+    Parses CRL in PEM or DER format
+    """
+    if b"-----BEGIN" in content:
+        return x509.load_pem_x509_crl(content, default_backend())
+    return x509.load_der_x509_crl(content, default_backend())
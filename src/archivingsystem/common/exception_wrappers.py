@@ -1,4 +1,6 @@
+import inspect
 import logging
+from contextlib import contextmanager
 from functools import wraps
 
 from mysql.connector import errors as mysql_errors
@@ -7,6 +9,7 @@ from .exceptions import (
     ArchivingOperationCustomException,
     CertificateNotValidCustomException,
     DatabaseErrorCustomException,
+    DatabasePoolTimeoutCustomException,
     DatabaseSyntaxErrorCustomException,
     RecordCanNotBeInsertedCustomException,
     RecordDoesNotExistCustomException,
@@ -21,46 +24,67 @@ logger = logging.getLogger("archiving_system_logging")
 
 
 def db_handler_exception_wrapper(function):
+    """
+    Translates mysql exceptions to custom exceptions, it works
+    also for generator functions (exceptions raised while
+    results are iterated)
+    """
+    if inspect.isgeneratorfunction(function):
+
+        @wraps(function)
+        def generator_wrapper(*args, **kwargs):
+            with _translated_db_exceptions():
+                yield from function(*args, **kwargs)
+
+        return generator_wrapper
+
     @wraps(function)
     def wrapper(*args, **kwargs):
-        try:
+        with _translated_db_exceptions():
             return function(*args, **kwargs)
-        except (mysql_errors.ProgrammingError) as e:
-            logger.exception(
-                "Wrong SQL syntax probably",
-                exc_info=True,
-                stack_info=True,
-            )
-            raise DatabaseSyntaxErrorCustomException(e) from e
-        except (mysql_errors.IntegrityError) as e:
-            logger.exception(
-                "Record probably exist or other constraint failed",
-                exc_info=True,
-                stack_info=True,
-            )
-            raise RecordCanNotBeInsertedCustomException(e) from e
-        except (
-            RecordDoesNotExistCustomException,
-            WrongRecordFormatCustomException,
-        ) as e:
-            logger.error("Incorrect use of db")
-            raise e
-        except (mysql_errors.Error) as e:
-            logger.exception(
-                "Some unhandled exception appeared in mysql.connector module",
-                exc_info=True,
-                stack_info=True,
-            )
-            raise DatabaseErrorCustomException(e) from e
 
     return wrapper
 
 
+@contextmanager
+def _translated_db_exceptions():
+    try:
+        yield
+    except (mysql_errors.ProgrammingError) as e:
+        logger.exception(
+            "Wrong SQL syntax probably",
+            exc_info=True,
+            stack_info=True,
+        )
+        raise DatabaseSyntaxErrorCustomException(e) from e
+    except (mysql_errors.IntegrityError) as e:
+        logger.exception(
+            "Record probably exist or other constraint failed",
+            exc_info=True,
+            stack_info=True,
+        )
+        raise RecordCanNotBeInsertedCustomException(e) from e
+    except (
+        RecordDoesNotExistCustomException,
+        WrongRecordFormatCustomException,
+    ) as e:
+        logger.error("Incorrect use of db")
+        raise e
+    except (mysql_errors.Error) as e:
+        logger.exception(
+            "Some unhandled exception appeared in mysql.connector module",
+            exc_info=True,
+            stack_info=True,
+        )
+        raise DatabaseErrorCustomException(e) from e
+
+
 def task_exceptions_wrapper(function):
     """
     Catches exceptions after which task should be acknowledged
     and not repeated since there is not issue with worker
-    but with input values
+    but with input values. Task which did not get database
+    connection in time is returned to the queue (RETRY)
     """
 
     @wraps(function)
@@ -103,6 +127,12 @@ def task_exceptions_wrapper(function):
                 stack_info=True,
             )
             result = "FAILED"
+        except (DatabasePoolTimeoutCustomException):
+            logger.warning(
+                "No free database connection, task will be repeated",
+                exc_info=True,
+            )
+            result = "RETRY"
         return result
 
     return wrapper
@@ -40,6 +40,15 @@ class WrongRecordFormatCustomException(DbHandlerCustomException):
     pass
 
 
+class DatabasePoolTimeoutCustomException(DbHandlerCustomException):
+    """
+    Raised when there is no free connection in connection pool,
+    task is returned to the queue and repeated
+    """
+
+    pass
+
+
 class WorkerCustomException(Exception):
     """
     Wrapps all exceptions from workers
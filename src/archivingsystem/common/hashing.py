@@ -0,0 +1,175 @@
+import logging
+import mmap
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("archiving_system_logging")
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+# local files at least this big are hashed through mmap, 0 disables mmap
+DEFAULT_MMAP_THRESHOLD = 64 * 1024 * 1024
+# threads updating additional hash objects, hashlib releases GIL
+DEFAULT_HASH_THREADS = os.cpu_count() or 1
+
+_settings = {
+    "block_size": DEFAULT_BLOCK_SIZE,
+    "mmap_threshold": DEFAULT_MMAP_THRESHOLD,
+    "hash_threads": DEFAULT_HASH_THREADS,
+}
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def configure_hashing(hashing_info: dict = None):
+    """
+    Function for setting block size, mmap threshold and
+    number of threads for additional hashes used by all
+    hashing functions in this process.
+    Missing values are set to defaults.
+    dictionary example:
+    hashing: {
+        block_size: 1048576
+        mmap_threshold: 67108864
+        hash_threads: 4
+    }
+    """
+    global _executor
+    hashing_info = hashing_info or {}
+    _settings["block_size"] = int(
+        hashing_info.get("block_size", DEFAULT_BLOCK_SIZE)
+    )
+    _settings["mmap_threshold"] = int(
+        hashing_info.get("mmap_threshold", DEFAULT_MMAP_THRESHOLD)
+    )
+    _settings["hash_threads"] = int(
+        hashing_info.get("hash_threads", DEFAULT_HASH_THREADS)
+    )
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+    logger.debug(
+        "hashing configured with block size: %s, mmap threshold: %s,"
+        " hash threads: %s",
+        str(_settings["block_size"]),
+        str(_settings["mmap_threshold"]),
+        str(_settings["hash_threads"]),
+    )
+
+
+def get_block_size():
+    """
+    Returns block size used for reading and writing data
+    """
+    return _settings["block_size"]
+
+
+def hash_file(hash, file_path, extra_hashes=None):
+    """
+    Function for hashing local file on given path with
+    given hash function (example hashlib.sha512).
+    Files bigger than mmap threshold are mapped to memory,
+    other files are read in blocks into one buffer.
+    Hash objects in extra_hashes (dictionary of hashlib
+    objects) are updated with the same data on hashing threads.
+    Returning bytes with digest
+    """
+    extra_hashes = extra_hashes or {}
+    size = os.path.getsize(file_path)
+    threshold = _settings["mmap_threshold"]
+    if not threshold or size < threshold:
+        with open(file_path, "rb", buffering=0) as f:
+            return hash_stream(
+                hash, f, name=file_path, extra_hashes=extra_hashes
+            )
+
+    start = time.perf_counter()
+    file_hash = hash()
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            updates = _start_updates(extra_hashes.values(), mm)
+            file_hash.update(mm)
+            _wait_for_updates(updates)
+    _log_throughput(file_path, size, time.perf_counter() - start, "mmap")
+    return file_hash.digest()
+
+
+def hash_stream(hash, stream, sink=None, name=None, extra_hashes=None):
+    """
+    Function for hashing data from opened binary file object.
+    Data are read with readinto into one preallocated buffer.
+    If sink file object is given, all read data are written
+    to it, so data can be copied and hashed in one pass.
+    Hash objects in extra_hashes (dictionary of hashlib
+    objects) are updated with the same data on hashing threads
+    while main hash is updated and data are written to sink,
+    next block is read after all updates finished.
+    Returning bytes with digest
+    """
+    extra_hashes = list((extra_hashes or {}).values())
+    start = time.perf_counter()
+    file_hash = hash()
+    buffer = bytearray(_settings["block_size"])
+    view = memoryview(buffer)
+    size = 0
+    read = stream.readinto(buffer)
+    while read:
+        updates = _start_updates(extra_hashes, view[:read])
+        file_hash.update(view[:read])
+        if sink is not None:
+            sink.write(view[:read])
+        # buffer is reused by next read
+        _wait_for_updates(updates)
+        size += read
+        read = stream.readinto(buffer)
+    view.release()
+    _log_throughput(name, size, time.perf_counter() - start, "readinto")
+    return file_hash.digest()
+
+
+def _start_updates(hashes, data):
+    """
+    Starts updates of hash objects with data on hashing threads,
+    returns futures which have to finish before data are changed.
+    Without hashing threads hash objects are updated at once
+    """
+    if not hashes:
+        return []
+    if not _settings["hash_threads"]:
+        for file_hash in hashes:
+            file_hash.update(data)
+        return []
+    executor = _get_executor()
+    return [executor.submit(file_hash.update, data) for file_hash in hashes]
+
+
+def _wait_for_updates(updates):
+    for update in updates:
+        update.result()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_settings["hash_threads"],
+                thread_name_prefix="hashing",
+            )
+        return _executor
+
+
+def _log_throughput(name, size, elapsed, mode):
+    logger.debug(
+        "hashed %s bytes of %s in %.3f s (%.1f MB/s, %s, block size %s)",
+        str(size),
+        str(name),
+        elapsed,
+        size / elapsed / 1000000 if elapsed > 0 else 0,
+        mode,
+        str(_settings["block_size"]),
+    )
@@ -0,0 +1,90 @@
+import json
+from hashlib import sha512
+
+# prefixes separating leaf and inner node hashes, so inner node
+# can not be presented as leaf (second preimage attack)
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+def hash_leaf(data):
+    return sha512(LEAF_PREFIX + data).digest()
+
+
+def hash_node(left, right):
+    return sha512(NODE_PREFIX + left + right).digest()
+
+
+class MerkleTree:
+    """
+    Merkle tree built from list of byte strings (file hashes
+    or signature hashes). Only root of the tree is timestamped,
+    every leaf gets inclusion proof which leads from the leaf
+    to the root. Node without sibling is moved to upper level
+    unchanged, so no leaf is duplicated.
+    """
+
+    def __init__(self, leaves: list):
+        if not leaves:
+            raise ValueError("merkle tree needs at least one leaf")
+        self.levels = [[hash_leaf(leaf) for leaf in leaves]]
+        while len(self.levels[-1]) > 1:
+            level = self.levels[-1]
+            upper_level = [
+                hash_node(level[i], level[i + 1])
+                for i in range(0, len(level) - 1, 2)
+            ]
+            if len(level) % 2:
+                upper_level.append(level[-1])
+            self.levels.append(upper_level)
+
+    @property
+    def root(self):
+        return self.levels[-1][0]
+
+    def get_proof(self, index):
+        """
+        Returns inclusion proof of leaf on given index as
+        dictionary with list of sibling hashes from the leaf
+        up to the root
+        """
+        leaf_index = index
+        path = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                position = "left" if sibling < index else "right"
+                path.append([position, level[sibling].hex()])
+            index //= 2
+        return {
+            "hash_algorithm": "sha512",
+            "leaf_index": leaf_index,
+            "leaf_count": len(self.levels[0]),
+            "path": path,
+        }
+
+
+def compute_root(data, proof):
+    """
+    Computes merkle root from leaf data and its inclusion proof
+    """
+    if proof.get("hash_algorithm") != "sha512":
+        raise ValueError("unsupported hash algorithm of inclusion proof")
+    node = hash_leaf(data)
+    for position, sibling_hex in proof["path"]:
+        sibling = bytes.fromhex(sibling_hex)
+        if position == "left":
+            node = hash_node(sibling, node)
+        elif position == "right":
+            node = hash_node(node, sibling)
+        else:
+            raise ValueError("unknown position in inclusion proof")
+    return node
+
+
+def dump_proof(proof):
+    return json.dumps(proof, indent=2).encode()
+
+
+def load_proof(data):
+    return json.loads(data)
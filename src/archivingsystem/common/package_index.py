@@ -0,0 +1,284 @@
+import io
+import json
+import logging
+import os
+import tarfile
+
+logger = logging.getLogger("archiving_system_logging")
+
+INDEX_FILE_NAME = "package_index.json"
+INDEX_VERSION = 2
+
+
+def build_index(tar_path, previous_index=None):
+    """
+    Creates index of members of every layer of package on tar_path.
+    Index holds absolute offset and size of every file member of
+    every layer (outer package, package inside it, ...) in the
+    outermost tar file. If index of wrapped package is given, only
+    the outer layer is read and previous layers are shifted,
+    otherwise nested layers are scanned.
+    index: {
+        version: 2
+        package: 'PackageF12.tar'
+        size: size of tar file in bytes
+        mtime_ns: time of last modification of tar file
+        layers: [
+            {name: 'PackageF12.tar', members: {name: [offset, size]}}
+            {name: 'Package1.tar', members: {...}}
+            ...
+        ]
+    }
+    """
+    package_name = os.path.basename(tar_path)
+    with tarfile.open(tar_path, "r:") as tarf:
+        layers = [_get_layer(tarf, package_name, 0)]
+        inner = _get_inner_package(tarf, package_name)
+        if (
+            inner is not None
+            and previous_index is not None
+            and previous_index["package"] == inner.name
+            and previous_index["size"] == inner.size
+        ):
+            logger.debug("extending index of package %s", inner.name)
+            layers.extend(
+                _shift_layer(layer, inner.offset_data)
+                for layer in previous_index["layers"]
+            )
+        elif inner is not None:
+            logger.debug("scanning nested layers of %s", package_name)
+            layers.extend(
+                _scan_layers(
+                    tarf.extractfile(inner), inner.name, inner.offset_data
+                )
+            )
+    stat = os.stat(tar_path)
+    return {
+        "version": INDEX_VERSION,
+        "package": package_name,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "layers": layers,
+    }
+
+
+def store_index(dir_path, index):
+    """
+    Stores index next to the package, it has to be removed
+    before directory is packed to next layer
+    """
+    path = os.path.join(dir_path, INDEX_FILE_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(path + ".tmp", path)
+    logger.debug(
+        "index of %s layers stored to %s", str(len(index["layers"])), path
+    )
+
+
+def remove_index(dir_path):
+    path = os.path.join(dir_path, INDEX_FILE_NAME)
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+def load_index(dir_path):
+    """
+    Returns index stored in directory of package or None if
+    there is no index or it does not match the package (then
+    package has to be read by scanning tar headers). Package
+    changed after index was built is detected by its size and
+    time of modification
+    """
+    path = os.path.join(dir_path, INDEX_FILE_NAME)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            index = json.load(f)
+        if index["version"] != INDEX_VERSION:
+            return None
+        stat = os.stat(os.path.join(dir_path, index["package"]))
+        if (
+            stat.st_size != index["size"]
+            or stat.st_mtime_ns != index["mtime_ns"]
+            or not _is_consistent(index)
+        ):
+            logger.warning("package index %s does not match package", path)
+            return None
+    except (ValueError, KeyError, TypeError, OSError):
+        logger.warning("package index %s is corrupted", path)
+        return None
+    return index
+
+
+class IndexedMember:
+    """
+    Member of package layer from index
+    """
+
+    def __init__(self, name, offset, size):
+        self.name = name
+        self.offset = offset
+        self.size = size
+
+    def isfile(self):
+        return True
+
+
+class IndexedTarFile:
+    """
+    Read-only tarfile-like view of one layer of package backed
+    by package index (getmembers, getmember, getnames and
+    extractfile). Members are read by pread on their absolute
+    offsets in the outermost tar file, so no tar header of any
+    layer is parsed and access to any layer costs the same.
+    Views of inner layers share file descriptor of the
+    outermost one and are valid only while it is open.
+    """
+
+    def __init__(self, fd, index, layer_number=0, owns_fd=True):
+        self.fd = fd
+        self.index = index
+        self.layer_number = layer_number
+        self.owns_fd = owns_fd
+        layer = index["layers"][layer_number]
+        self.name = layer["name"]
+        self.members = {
+            name: IndexedMember(name, offset, size)
+            for name, (offset, size) in layer["members"].items()
+        }
+
+    @classmethod
+    def open(cls, tar_path, index):
+        return cls(os.open(tar_path, os.O_RDONLY), index)
+
+    def getmembers(self):
+        return list(self.members.values())
+
+    def getmember(self, name):
+        return self.members[name]
+
+    def getnames(self):
+        return list(self.members)
+
+    def extractfile(self, member):
+        if isinstance(member, str):
+            member = self.getmember(member)
+        return io.BufferedReader(
+            _MemberFile(self.fd, member.offset, member.size)
+        )
+
+    def open_inner(self, member):
+        """
+        Returns view of layer stored in given member
+        """
+        layers = self.index["layers"]
+        if (
+            self.layer_number + 1 >= len(layers)
+            or layers[self.layer_number + 1]["name"] != member.name
+        ):
+            raise KeyError("{} is not indexed layer".format(member.name))
+        return IndexedTarFile(
+            self.fd, self.index, self.layer_number + 1, owns_fd=False
+        )
+
+    def close(self):
+        if self.owns_fd and self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class _MemberFile(io.RawIOBase):
+    """
+    Raw file object reading range of file descriptor with pread,
+    position is kept here so views can be used from more threads
+    """
+
+    def __init__(self, fd, offset, size):
+        self.fd = fd
+        self.offset = offset
+        self.size = size
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        length = min(len(buffer), self.size - self.position)
+        if length <= 0:
+            return 0
+        data = os.pread(self.fd, length, self.offset + self.position)
+        buffer[: len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+def _get_layer(tarf, name, base):
+    return {
+        "name": name,
+        "members": {
+            member.name: [base + member.offset_data, member.size]
+            for member in tarf.getmembers()
+            if member.isfile()
+        },
+    }
+
+
+def _get_inner_package(tarf, name):
+    # Package0 holds archived file, which can be tar named Package*
+    if name == "Package0.tar":
+        return None
+    for member in tarf.getmembers():
+        if (
+            member.isfile()
+            and "/" not in member.name
+            and member.name.startswith("Package")
+            and member.name.endswith(".tar")
+        ):
+            return member
+    return None
+
+
+def _scan_layers(fileobj, name, base):
+    with tarfile.open(fileobj=fileobj, mode="r:") as tarf:
+        layers = [_get_layer(tarf, name, base)]
+        inner = _get_inner_package(tarf, name)
+        if inner is not None:
+            layers.extend(
+                _scan_layers(
+                    tarf.extractfile(inner),
+                    inner.name,
+                    base + inner.offset_data,
+                )
+            )
+    return layers
+
+
+def _shift_layer(layer, shift):
+    return {
+        "name": layer["name"],
+        "members": {
+            name: [offset + shift, size]
+            for name, (offset, size) in layer["members"].items()
+        },
+    }
+
+
+def _is_consistent(index):
+    layers = index["layers"]
+    if not layers or layers[0]["name"] != index["package"]:
+        return False
+    for number, layer in enumerate(layers):
+        for offset, size in layer["members"].values():
+            if offset < 0 or size < 0 or offset + size > index["size"]:
+                return False
+        if number and layer["name"] not in layers[number - 1]["members"]:
+            return False
+    return True
@@ -0,0 +1,214 @@
+import functools
+import hashlib
+import logging
+from datetime import timezone
+
+import rfc3161ng
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.x509.oid import ExtendedKeyUsageOID
+from pyasn1.codec.der import decoder, encoder
+from pyasn1.error import PyAsn1Error
+from pyasn1.type import univ
+
+logger = logging.getLogger("archiving_system_logging")
+
+# number of parsed certificates and verified chains kept in memory
+CERTIFICATE_CACHE_SIZE = 256
+
+ID_ATTRIBUTE_CONTENT_TYPE = univ.ObjectIdentifier((1, 2, 840, 113549, 1, 9, 3))
+ID_ATTRIBUTE_MESSAGE_DIGEST = univ.ObjectIdentifier(
+    (1, 2, 840, 113549, 1, 9, 4)
+)
+
+
+class TimestampVerifier:
+    """
+    Local verifier of RFC 3161 timestamp tokens, no request is
+    sent to TSA. Token is verified with TSA certificate and CA
+    certificate stored in package (certificate_files):
+    message imprint of data, content type and digest in signed
+    attributes, CMS
+    signature made by TSA certificate, TSA certificate issued
+    by CA (signature and time stamping key usage) and time of
+    timestamp within validity of TSA certificate.
+    Parsed certificates and verified chains are cached by their
+    bytes, certificates shared by packages are parsed and
+    verified only once per process.
+    """
+
+    def __init__(self, hashname="sha512"):
+        self.hashname = hashname
+
+    def verify(self, ts, data, tsa_cert, ca_cert):
+        """
+        Returns true if timestamp token (DER bytes) of data
+        is valid, tsa_cert and ca_cert are bytes of certificates
+        in PEM or DER format
+        """
+        try:
+            tst = self._decode_token(ts)
+            self._check_message_imprint(tst, data)
+            certificate = load_certificate(tsa_cert)
+            check_certificate_chain(tsa_cert, ca_cert)
+            self._check_signature(tst, certificate)
+            self._check_time(tst, certificate)
+        except (
+            ValueError,
+            KeyError,
+            IndexError,
+            PyAsn1Error,
+            InvalidSignature,
+        ) as e:
+            logger.warning("timestamp token is invalid: %s", repr(e))
+            return False
+        return True
+
+    def _decode_token(self, ts):
+        tst, rest = decoder.decode(ts, asn1Spec=rfc3161ng.TimeStampToken())
+        if rest:
+            raise ValueError("extra data after timestamp token")
+        return tst
+
+    def _check_message_imprint(self, tst, data):
+        imprint = tst.tst_info.message_imprint
+        if imprint.hash_algorithm[0] != rfc3161ng.get_hash_oid(self.hashname):
+            raise ValueError("unexpected hash algorithm of message imprint")
+        digest = hashlib.new(self.hashname, data).digest()
+        if bytes(imprint.hashed_message) != digest:
+            raise ValueError("message imprint does not match data")
+
+    def _check_signature(self, tst, certificate):
+        signed_data = tst.content
+        if (
+            signed_data["contentInfo"]["contentType"]
+            != rfc3161ng.id_ct_TSTInfo
+        ):
+            raise ValueError("signed content is not TSTInfo")
+        if not len(signed_data["signerInfos"]):
+            raise ValueError("timestamp token is not signed")
+        signer_info = signed_data["signerInfos"][0]
+        hash_name = _get_hash_name(signer_info["digestAlgorithm"]["algorithm"])
+        content = bytes(
+            decoder.decode(
+                bytes(signed_data["contentInfo"]["content"]),
+                asn1Spec=univ.OctetString(),
+            )[0]
+        )
+        attributes = signer_info["authenticatedAttributes"]
+        if len(attributes):
+            # signed attributes hold type and digest of content,
+            # they are signed instead of content
+            signed_type = self._get_signed_attribute(
+                attributes, ID_ATTRIBUTE_CONTENT_TYPE, univ.ObjectIdentifier()
+            )
+            if signed_type != rfc3161ng.id_ct_TSTInfo:
+                raise ValueError("signed content type is not TSTInfo")
+            signed_digest = self._get_signed_attribute(
+                attributes, ID_ATTRIBUTE_MESSAGE_DIGEST, univ.OctetString()
+            )
+            if (
+                bytes(signed_digest)
+                != hashlib.new(hash_name, content).digest()
+            ):
+                raise ValueError("content digest does not match signed one")
+            signed_attributes = univ.SetOf()
+            for i, attribute in enumerate(attributes):
+                signed_attributes.setComponentByPosition(i, attribute)
+            content = encoder.encode(signed_attributes)
+        verify_with_public_key(
+            certificate.public_key(),
+            bytes(signer_info["encryptedDigest"]),
+            content,
+            getattr(hashes, hash_name.upper())(),
+        )
+
+    def _get_signed_attribute(self, attributes, oid, asn1_spec):
+        for attribute in attributes:
+            if attribute[0] == oid:
+                return decoder.decode(
+                    bytes(attribute[1][0]), asn1Spec=asn1_spec
+                )[0]
+        raise ValueError("no attribute {} in signed attributes".format(oid))
+
+    def _check_time(self, tst, certificate):
+        time = rfc3161ng.get_timestamp(tst, naive=False)
+        # *_utc properties are available since cryptography 42
+        if hasattr(certificate, "not_valid_before_utc"):
+            not_before = certificate.not_valid_before_utc
+            not_after = certificate.not_valid_after_utc
+        else:
+            not_before = certificate.not_valid_before.replace(
+                tzinfo=timezone.utc
+            )
+            not_after = certificate.not_valid_after.replace(
+                tzinfo=timezone.utc
+            )
+        if not (not_before <= time <= not_after):
+            raise ValueError(
+                "time of timestamp {} is out of validity of TSA"
+                " certificate".format(str(time))
+            )
+
+
+@functools.lru_cache(maxsize=CERTIFICATE_CACHE_SIZE)
+def load_certificate(content):
+    """
+    Parses certificate in PEM or DER format, parsed
+    certificates are cached
+    """
+    if b"-----BEGIN" in content:
+        return x509.load_pem_x509_certificate(content, default_backend())
+    return x509.load_der_x509_certificate(content, default_backend())
+
+
+@functools.lru_cache(maxsize=CERTIFICATE_CACHE_SIZE)
+def check_certificate_chain(tsa_cert, ca_cert):
+    """
+    Checks that TSA certificate is issued by CA and it is
+    meant for timestamping, raises ValueError or
+    InvalidSignature otherwise. Successful checks are cached
+    """
+    certificate = load_certificate(tsa_cert)
+    ca = load_certificate(ca_cert)
+    if certificate.issuer != ca.subject:
+        raise ValueError("TSA certificate is not issued by given CA")
+    verify_with_public_key(
+        ca.public_key(),
+        certificate.signature,
+        certificate.tbs_certificate_bytes,
+        certificate.signature_hash_algorithm,
+    )
+    try:
+        key_usage = certificate.extensions.get_extension_for_class(
+            x509.ExtendedKeyUsage
+        ).value
+    except x509.ExtensionNotFound:
+        raise ValueError("TSA certificate has no extended key usage")
+    if ExtendedKeyUsageOID.TIME_STAMPING not in key_usage:
+        raise ValueError("TSA certificate is not meant for timestamping")
+    logger.debug("chain of TSA certificate %s verified", certificate.subject)
+    return True
+
+
+def verify_with_public_key(public_key, signature, data, hash_algorithm):
+    """
+    Verifies PKCS#1 v1.5 (RSA) or ECDSA signature of data,
+    raises InvalidSignature if it is not valid
+    """
+    if isinstance(public_key, rsa.RSAPublicKey):
+        public_key.verify(signature, data, padding.PKCS1v15(), hash_algorithm)
+    elif isinstance(public_key, ec.EllipticCurvePublicKey):
+        public_key.verify(signature, data, ec.ECDSA(hash_algorithm))
+    else:
+        raise ValueError("unsupported type of public key")
+
+
+def _get_hash_name(oid):
+    hash_name = rfc3161ng.oid_to_hash.get(oid)
+    if hash_name is None:
+        raise ValueError("unsupported hash algorithm {}".format(str(oid)))
+    return hash_name
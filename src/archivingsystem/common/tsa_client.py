@@ -0,0 +1,90 @@
+import logging
+from hashlib import sha512
+
+import requests
+import rfc3161ng
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.serialization import Encoding
+from pyasn1.codec.der import encoder
+from requests.adapters import HTTPAdapter
+
+from .exceptions import RemoteTimemperCustomException
+from .utils import load_data
+
+logger = logging.getLogger("archiving_system_logging")
+
+
+class TimestampingClient:
+    """
+    Long-lived client of remote timestamping authority.
+    It holds loaded TSA certificate and requests session
+    with connection pool, so https connection to TSA is kept
+    alive and reused across tasks. One instance should be
+    created by worker and shared by all its tasks.
+    It needs dictionary with TSA information:
+    TSA_info: {
+        tsa_tsr_url: 'https://freetsa.org/tsr'
+        tsa_cert_path: '/home/server/Downloads/tsa.crt'
+        connection_pool_size: 10 (optional)
+        timeout: 10 (optional, seconds)
+    }
+    """
+
+    def __init__(self, tsa_info: dict):
+        self.url = tsa_info["tsa_tsr_url"]
+        self.timeout = tsa_info.get("timeout", 10)
+        self.certificate = load_data(tsa_info["tsa_cert_path"])
+        self.x509_certificate = x509.load_pem_x509_certificate(
+            self.certificate, default_backend()
+        )
+        self.remote_tsa = rfc3161ng.RemoteTimestamper(
+            url=self.url, certificate=self.certificate, hashname="sha512"
+        )
+        pool_size = tsa_info.get("connection_pool_size", 10)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        logger.debug(
+            "TSA client created for %s with connection pool size %s",
+            self.url,
+            str(pool_size),
+        )
+
+    def get_timestamp(self, data):
+        """
+        Gets timestamp for bytes of data (hash of file) from
+        TSA over kept-alive connection, timestamped digest is
+        sha512 of data.
+        Returns bytes with timestamp token
+        """
+        digest = sha512(data).digest()
+        request = rfc3161ng.make_timestamp_request(
+            digest=digest, hashname="sha512"
+        )
+        try:
+            response = self.session.post(
+                self.url,
+                data=rfc3161ng.encode_timestamp_request(request),
+                headers={"Content-Type": "application/timestamp-query"},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.exception("Unable to get timestamp from %s", self.url)
+            raise RemoteTimemperCustomException(
+                "Unable to get timestamp from {}".format(self.url)
+            ) from e
+        tsr = rfc3161ng.decode_timestamp_response(response.content)
+        self.remote_tsa.check_response(tsr, digest)
+        return encoder.encode(tsr.time_stamp_token)
+
+    def get_certificate_pem(self):
+        """
+        Returns loaded TSA certificate in PEM format
+        """
+        return self.x509_certificate.public_bytes(Encoding.PEM)
+
+    def close(self):
+        self.session.close()
@@ -1,18 +1,43 @@
+import errno
+import functools
+import hashlib
 import os
 import tarfile
-from shutil import copy2, rmtree
+from shutil import copy2, copyfileobj, copystat, rmtree
 
 import paramiko
 import requests
-import rfc3161ng
 from cryptography import x509
 
 # from cryptography.exceptions import InvalidSignature - was unused
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import asymmetric, hashes, serialization
-from OpenSSL import crypto
 
-from .exceptions import CertificateNotValidCustomException
+from . import hashing
+from .exceptions import (
+    CertificateNotValidCustomException,
+    FileTransferNotSuccesfullCustomException,
+)
+from .timestamp_verifier import TimestampVerifier
+
+try:
+    import fcntl
+except ImportError:  # not available on windows
+    fcntl = None
+
+# ioctl request number of FICLONE (linux/fs.h), used for reflink copies
+FICLONE = 0x40049409
+
+# errors after which next kernel copy method should be tried
+KERNEL_COPY_FALLBACK_ERRNOS = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EBADF,
+    errno.EPERM,
+}
 
 
 def store_ts_data(data, path, name):
@@ -34,46 +59,24 @@ def load_data(path):
     return data
 
 
-def get_timestamp(tsa_info: dict, file_hash):
-    """
-    Function responsible for getting timstamp
-    for bits of data. It is creating connection to
-    remote timestamping authority.
-    It needs hash data or bytes of small object
-    and it needs dictionary with information to
-    create connection.
-    dictionary example:
-    TSA_info: {
-        tsa_tsr_url: 'https://freetsa.org/tsr'
-        tsa_cert_path: '/home/server/Downloads/tsa.crt'
-    }
-    Returns bytes with timestamp tsr
-    """
-    tsa_cert = load_data(tsa_info["tsa_cert_path"])
-    remote_tsa = rfc3161ng.RemoteTimestamper(
-        url=tsa_info["tsa_tsr_url"], certificate=tsa_cert, hashname="sha512"
-    )
-    data_ts = remote_tsa(file_hash)
-    return data_ts
-
-
 def verify_timestamp(ts, data, info: dict):
     """
     Function for verifying timestamp respones.
-    It will create connection to timestamping authority
-    which need dictionary like this
+    Timestamp is verified locally (see TimestampVerifier),
+    it needs dictionary with certificates of TSA like this
     TSA_info: {
-        tsa_tsr_url: 'https://freetsa.org/tsr'
         tsa_cert_path: '/home/server/Downloads/tsa.crt'
+        tsa_ca_pem: '/home/server/Downloads/cacert.pem'
     }
     It need data that was timestamped and bytes with ts
     returns true or false if timestamp is corect
     """
-    tsa_cert = load_data(info["tsa_cert_path"])
-    remote_tsa = rfc3161ng.RemoteTimestamper(
-        url=info["tsa_tsr_url"], certificate=tsa_cert, hashname="sha512"
+    return TimestampVerifier().verify(
+        ts,
+        data,
+        load_data(info["tsa_cert_path"]),
+        load_data(info["tsa_ca_pem"]),
     )
-    return remote_tsa.check(ts, data)
 
 
 def sign_data(data, private_key):
@@ -160,19 +163,48 @@ def validate_signature(data, signature, public_key):
     return True
 
 
-def create_tar_file_from_dir(dir_path, tar_path):
+class HashingWriter:
+    """
+    File-like object which passes written data to
+    underlying file object and updates hash with them
+    on the way, so written data dont have to be read
+    again to get their digest
+    """
+
+    def __init__(self, fileobj, hash):
+        self.fileobj = fileobj
+        self.file_hash = hash()
+
+    def write(self, data):
+        self.file_hash.update(data)
+        return self.fileobj.write(data)
+
+    def tell(self):
+        return self.fileobj.tell()
+
+    def digest(self):
+        return self.file_hash.digest()
+
+
+def create_tar_file_from_dir(dir_path, tar_path, hash):
     """
     This will create tar archive, without any compression,
     from files within directory and deletes original files
-    to remove duplicits. It will returns path to created
-    tar archive
-    """
-    with tarfile.open(tar_path, "w:") as tarf:  # uncompressed mode
-        for f in os.listdir(dir_path):
-            fp = os.path.join(dir_path, f)
-            if not fp == tar_path:
-                tarf.add(fp, arcname=f)
-                delete_file(fp)
+    to remove duplicits. Archive is hashed while it is written
+    with given hash function (example hashlib.sha512).
+    It will return path to created tar archive and bytes
+    with its digest
+    """
+    with open(tar_path, "wb") as tar_file:
+        sink = HashingWriter(tar_file, hash)
+        # uncompressed mode
+        with tarfile.open(fileobj=sink, mode="w:") as tarf:
+            for f in os.listdir(dir_path):
+                fp = os.path.join(dir_path, f)
+                if not fp == tar_path:
+                    tarf.add(fp, arcname=f)
+                    delete_file(fp)
+    return tar_path, sink.digest()
 
 
 def delete_file(path):
@@ -186,39 +218,80 @@ def delete_file(path):
         os.remove(path)
 
 
-def get_file_hash(hash, file_path):
+def get_file_hash(hash, file_path, extra_hashes=None):
     """
     Function for hashing file on given path.
     It needs to get specify hash function which
     will be applied (example haslib.sha512)
     It will hash even big files without killing
     ram memmory since it uses buffering.
+    Optional extra_hashes (dictionary of hashlib objects,
+    example {"sha3_512": hashlib.sha3_512()}) are updated
+    with the same data, file is read only once.
     Returning bytes with digest
     """
-    file_hash = hash()
-    with open(file_path, "rb") as f:
-        buffer = f.read(8192)
-        while buffer != b"":
-            file_hash.update(buffer)
-            buffer = f.read(8192)
-    return file_hash.digest()
+    return hashing.hash_file(hash, file_path, extra_hashes)
+
+
+def hash_file_multi(file_path, algorithms):
+    """
+    Function for hashing file on given path with several
+    hashlib algorithms (example ["sha512", "sha3_512"]),
+    file is read only once and hash objects are updated
+    on hashing threads (see common hashing).
+    Returning dictionary algorithm: bytes with digest
+    """
+    first, *others = algorithms
+    extra_hashes = {name: hashlib.new(name) for name in others}
+    digests = {
+        first: hashing.hash_file(
+            functools.partial(hashlib.new, first), file_path, extra_hashes
+        )
+    }
+    for name, file_hash in extra_hashes.items():
+        digests[name] = file_hash.digest()
+    return digests
 
 
-def get_remote_hash(connection_sftp, path, hash):
+def get_remote_hash(connection_sftp, path, hash, extra_hashes=None):
     """
     Function for getting file hash from remote sftp
     storage withou moving file.
     It needs sftp connection from paramiko.SFTPClient
     Path to file on remote storage and hash function
     wich will be applied (hashlib.sha512)
+    Optional extra_hashes are updated with the same data
+    (see get_file_hash)
     """
     with connection_sftp.open(path, "rb") as f:
-        file_hash = hash()
-        buffer = f.read(8192)
-        while buffer != b"":
-            file_hash.update(buffer)
-            buffer = f.read(8192)
-    return file_hash.digest()
+        f.prefetch()
+        return hashing.hash_stream(
+            hash, f, name=path, extra_hashes=extra_hashes
+        )
+
+
+def get_remote_file_with_hash(
+    connection_sftp, remote_path, local_path, hash, extra_hashes=None
+):
+    """
+    Function for downloading file from remote sftp
+    storage while hashing it, so file is transferred
+    only once. Reads are pipelined (prefetched) so many
+    requests are in flight at once.
+    It needs sftp connection from paramiko.SFTPClient,
+    path to file on remote storage, local destination path
+    and hash function which will be applied (hashlib.sha512)
+    Optional extra_hashes are updated with the same data
+    (see get_file_hash)
+    Returning bytes with digest of downloaded data
+    """
+    with connection_sftp.open(remote_path, "rb") as src, open(
+        local_path, "wb"
+    ) as dst:
+        src.prefetch()
+        return hashing.hash_stream(
+            hash, src, sink=dst, name=remote_path, extra_hashes=extra_hashes
+        )
 
 
 def get_sftp_connection(config: dict):
@@ -235,6 +308,8 @@ def get_sftp_connection(config: dict):
             username: ''
             password: '' password to key
             key_filepath: ''
+        window_size: optional, ssh channel window size in bytes
+        max_packet_size: optional, max ssh packet size in bytes
     }
     """
 
@@ -249,31 +324,22 @@ def get_sftp_connection(config: dict):
 
     transport.connect(username=username, pkey=key)
 
-    return paramiko.SFTPClient.from_transport(transport)
+    return paramiko.SFTPClient.from_transport(
+        transport,
+        window_size=config.get("window_size"),
+        max_packet_size=config.get("max_packet_size"),
+    )
 
 
-def validate_certificate(crl_content, ca_file_path):
+def validate_certificate_with_crl(crl, ca):
     """
     Function for validating if certificate was correct
-    at given time. It is validating it with its crl content
-    It need crl bytes and path to certificate
-    return true if valid
+    at given time. It is validating it with its crl, it
+    needs parsed x509.CertificateRevocationList and
+    x509.Certificate, exception is raised if it is not valid
     """
-    crl = crypto.load_crl(crypto.FILETYPE_PEM, crl_content)
-
-    crl_crypto = crl.to_cryptography()
-
-    with open(ca_file_path, "rb") as f:
-        ca_cert = f.read()
-
-    ca = crypto.load_certificate(crypto.FILETYPE_PEM, ca_cert)
-
-    valid = crl_crypto.is_signature_valid(
-        ca.get_pubkey().to_cryptography_key()
-    )
-    revoked = crl_crypto.get_revoked_certificate_by_serial_number(
-        ca.get_serial_number()
-    )
+    valid = crl.is_signature_valid(ca.public_key())
+    revoked = crl.get_revoked_certificate_by_serial_number(ca.serial_number)
     if revoked:
         raise CertificateNotValidCustomException("certificate was revoked")
     if not (valid):
@@ -303,6 +369,100 @@ def copy_file_to_dir(file_path_to_copy, dst_dir, name):
     return dst
 
 
+def copy_file_with_hash(
+    hash, src_path, dst_path, verify=False, extra_hashes=None
+):
+    """
+    Function for copying file to destination path while
+    hashing it, so the source is read only once.
+    It needs hash function which will be applied
+    (example hashlib.sha512), path to source file and
+    destination path. Metadata are copied like with copy2.
+    If verify is True, destination is read again and its
+    hash is compared with hash of source, exception
+    is raised if they do not match.
+    Optional extra_hashes are updated with the same data
+    (see get_file_hash)
+    Returning bytes with digest of source file
+    """
+    with open(src_path, "rb", buffering=0) as src, open(dst_path, "wb") as dst:
+        digest = hashing.hash_stream(
+            hash, src, sink=dst, name=src_path, extra_hashes=extra_hashes
+        )
+    copystat(src_path, dst_path)
+    if verify and get_file_hash(hash, dst_path) != digest:
+        raise FileTransferNotSuccesfullCustomException(
+            "hashes of original and copied file do not match"
+        )
+    return digest
+
+
+def copy_file_kernel(src_path, dst_path):
+    """
+    Function for copying file without moving its data
+    through userspace. It tries FICLONE reflink (copy on
+    write filesystems like btrfs or xfs), then
+    os.copy_file_range and os.sendfile. If none of them
+    is available or supported for given files it will
+    fall back to userspace copy. Metadata are copied like
+    with copy2.
+    Returning name of method which was used for copying
+    """
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        src_fd = src.fileno()
+        dst_fd = dst.fileno()
+        size = os.fstat(src_fd).st_size
+        method = None
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst_fd, FICLONE, src_fd)
+                method = "reflink"
+            except OSError as e:
+                if e.errno not in KERNEL_COPY_FALLBACK_ERRNOS:
+                    raise
+        if method is None and hasattr(os, "copy_file_range"):
+            if _copy_with_kernel_function(
+                os.copy_file_range, src_fd, dst_fd, size
+            ):
+                method = "copy_file_range"
+        if method is None and hasattr(os, "sendfile"):
+            if _copy_with_kernel_function(_sendfile, src_fd, dst_fd, size):
+                method = "sendfile"
+        if method is None:
+            copyfileobj(src, dst, hashing.get_block_size())
+            method = "userspace"
+    copystat(src_path, dst_path)
+    return method
+
+
+def _sendfile(src_fd, dst_fd, count, offset_src):
+    return os.sendfile(dst_fd, src_fd, offset_src, count)
+
+
+def _copy_with_kernel_function(function, src_fd, dst_fd, size):
+    """
+    Copies size bytes from src_fd to dst_fd with given
+    function. Returns False if function is not supported
+    for given files and nothing was copied yet
+    """
+    offset = 0
+    while offset < size:
+        try:
+            copied = function(
+                src_fd, dst_fd, min(size - offset, 2**30), offset_src=offset
+            )
+        except OSError as e:
+            if offset == 0 and e.errno in KERNEL_COPY_FALLBACK_ERRNOS:
+                return False
+            raise
+        if copied == 0:
+            if offset == 0:
+                return False
+            break
+        offset += copied
+    return True
+
+
 def create_new_dir_in_location(new_dir_path, name):
     """
     Function for creating new directory in given
@@ -0,0 +1,203 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from mysql.connector import MySQLConnection
+from mysql.connector import errors as mysql_errors
+
+from ..common.exceptions import DatabasePoolTimeoutCustomException
+
+logger = logging.getLogger("archiving_system_logging")
+
+DEFAULT_POOL_SIZE = 10
+
+
+class MysqlConnectionPool:
+    """
+    Pool of database connections shared by all tasks of worker.
+    Connections are created lazily up to pool_size and reused,
+    so TCP, TLS and authentication handshake is not repeated
+    for every task. Connection idle longer than ping_interval
+    is checked by ping before it is handed out, broken connection
+    is replaced by new one. Transaction left open by task is
+    rolled back when connection returns to the pool.
+    It needs db_config (see MysqlConnection) and optional
+    dictionary with pool configuration:
+    db_pool: {
+        pool_size: 10
+        acquire_timeout: 30 (seconds to wait for free connection)
+        ping_interval: 30 (seconds)
+    }
+    Every running task holds one connection, so pool is at least
+    as big as number of tasks running at once (tasks_in_flight),
+    smaller configured pool_size is rejected
+    """
+
+    def __init__(
+        self, db_config: dict, pool_info: dict = None, tasks_in_flight=1
+    ):
+        pool_info = pool_info or {}
+        self.db_config = db_config
+        self.pool_size = pool_info.get(
+            "pool_size", max(DEFAULT_POOL_SIZE, tasks_in_flight)
+        )
+        if self.pool_size < tasks_in_flight:
+            raise ValueError(
+                "db_pool pool_size {} is smaller than number of tasks"
+                " running at once {} (worker_pool_size), every task holds"
+                " one connection".format(self.pool_size, tasks_in_flight)
+            )
+        self.acquire_timeout = pool_info.get("acquire_timeout", 30)
+        self.ping_interval = pool_info.get("ping_interval", 30)
+        # idle connections as tuples (connection, time of return)
+        self._idle = []
+        self._size = 0
+        self._waiting = 0
+        self._condition = threading.Condition()
+        self._stats = {
+            "acquired": 0,
+            "created": 0,
+            "discarded": 0,
+            "timeouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager which lends pooled connection,
+        it can be used instead of MysqlConnection
+        """
+        db_connection = self.acquire()
+        try:
+            yield db_connection
+        finally:
+            self.release(db_connection)
+
+    def acquire(self):
+        """
+        Returns healthy connection from pool, waits up to
+        acquire_timeout for free one if all are in use
+        """
+        start = time.monotonic()
+        deadline = start + self.acquire_timeout
+        with self._condition:
+            self._waiting += 1
+            try:
+                while not self._idle and self._size >= self.pool_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        logger.error(
+                            "no free database connection in %s seconds",
+                            str(self.acquire_timeout),
+                        )
+                        raise DatabasePoolTimeoutCustomException(
+                            "no free database connection in {} seconds".format(
+                                self.acquire_timeout
+                            )
+                        )
+                    self._condition.wait(remaining)
+                if self._idle:
+                    db_connection, returned_at = self._idle.pop()
+                else:
+                    db_connection, returned_at = None, None
+                    # place is reserved, connection is created outside lock
+                    self._size += 1
+            finally:
+                self._waiting -= 1
+            wait_time = time.monotonic() - start
+            self._stats["acquired"] += 1
+            self._stats["wait_time_total"] += wait_time
+            self._stats["wait_time_max"] = max(
+                self._stats["wait_time_max"], wait_time
+            )
+
+        if db_connection is not None and self._is_healthy(
+            db_connection, returned_at
+        ):
+            return db_connection
+        if db_connection is not None:
+            self._close(db_connection)
+        try:
+            return self._create_connection()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, db_connection):
+        """
+        Returns connection to the pool
+        """
+        try:
+            if db_connection.in_transaction:
+                db_connection.rollback()
+        except mysql_errors.Error:
+            logger.warning("unable to reset database connection, closing it")
+            self._close(db_connection)
+            with self._condition:
+                self._size -= 1
+                self._stats["discarded"] += 1
+                self._condition.notify()
+            return
+        with self._condition:
+            self._idle.append((db_connection, time.monotonic()))
+            self._condition.notify()
+
+    def close(self):
+        """
+        Closes all idle connections
+        """
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for db_connection, _ in idle:
+            self._close(db_connection)
+
+    def get_metrics(self):
+        """
+        Returns dictionary with pool size, number of connections
+        in use, idle and waiting threads and wait time statistics
+        """
+        with self._condition:
+            metrics = dict(self._stats)
+            metrics["pool_size"] = self.pool_size
+            metrics["size"] = self._size
+            metrics["idle"] = len(self._idle)
+            metrics["in_use"] = self._size - len(self._idle)
+            metrics["waiting"] = self._waiting
+        metrics["wait_time_avg"] = (
+            metrics["wait_time_total"] / metrics["acquired"]
+            if metrics["acquired"]
+            else 0.0
+        )
+        return metrics
+
+    def _create_connection(self):
+        logger.debug("creating new pooled database connection")
+        db_connection = MySQLConnection(**self.db_config)
+        with self._condition:
+            self._stats["created"] += 1
+        return db_connection
+
+    def _is_healthy(self, db_connection, returned_at):
+        if time.monotonic() - returned_at < self.ping_interval:
+            return True
+        try:
+            db_connection.ping(reconnect=False)
+            return True
+        except mysql_errors.Error:
+            logger.info("pooled database connection is broken, replacing it")
+            with self._condition:
+                self._stats["discarded"] += 1
+            return False
+
+    def _close(self, db_connection):
+        try:
+            db_connection.close()
+        except mysql_errors.Error:
+            logger.debug("closing of broken database connection failed")
@@ -1,5 +1,6 @@
-import base64
-from contextlib import closing
+import threading
+import weakref
+from contextlib import closing, contextmanager
 from datetime import datetime
 
 from mysql.connector import MySQLConnection
@@ -9,18 +10,43 @@ from ..common.exceptions import RecordDoesNotExistCustomException
 from .archived_file import ArchivedFile
 from .file_package import FilePackage
 from .sql_queries import (
+    QUERY_ALL_COLUMNS_ON_BULKVALIDATIONID_BULK_VALIDATIONS,
     QUERY_ALL_COLUMNS_ON_FILEID_ARCHIVED_FILES,
     QUERY_ALL_COLUMNS_ON_FILEID_FILE_PACKAGES,
     QUERY_ALL_COLUMNS_ON_FILEID_FILE_PACKAGES_TOP1,
+    QUERY_ALL_COLUMNS_ON_FILEIDS_ARCHIVED_FILES,
+    QUERY_ALL_COLUMNS_ON_FILEIDS_FILE_PACKAGES,
+    QUERY_CLAIM_RETIMESTAMP_LEASE,
+    QUERY_DELETE_RETIMESTAMP_LEASE,
+    QUERY_UNLEASED_FILEID_EXPIRING_BEFORE_AFTER_KEY_ARCHIVED_FILES,
+    QUERY_UNLEASED_FILEID_EXPIRING_BEFORE_ARCHIVED_FILES,
+    QUERY_FILEID_NOT_VALIDATED_SINCE_PAGE_ARCHIVED_FILES,
     QUERY_FILEID_ON_FILENAME_OWNER_ARCHIVED_FILES,
+    QUERY_FILEID_ON_FILENAMES_OWNERS_ARCHIVED_FILES,
+    QUERY_FILEID_OWNER_PAGE_ARCHIVED_FILES,
+    QUERY_FILEID_RANGE_PAGE_ARCHIVED_FILES,
     QUERY_INSERT_INTO_ARCHIVED_FILES,
+    QUERY_INSERT_INTO_BULK_VALIDATIONS,
     QUERY_INSERT_INTO_FILE_PACKAGES,
+    QUERY_INSERT_INTO_FILE_VALIDATIONS,
+    QUERY_INSERT_INTO_RETIMESTAMP_LEASES,
+    QUERY_NOT_VALID_ON_BULKVALIDATIONID_FILE_VALIDATIONS,
     QUERY_SELECT_FILEID,
     QUERY_UPDATE_EXPIRATION_DATE_TS_ARCHIVED_FILES,
+    QUERY_UPDATE_PROGRESS_BULK_VALIDATIONS,
+    QUERY_VALUES_FILE_VALIDATION,
+    QUERY_VALUES_FILEID,
+    QUERY_VALUES_FILENAME_OWNER,
+    QUERY_VALUES_RETIMESTAMP_LEASE,
 )
 
 # from typing import overload - was unusedw
 
+# prepared cursors of every connection keyed by query, statement is
+# prepared once per connection and freed by server when it is closed
+_prepared_cursors = weakref.WeakKeyDictionary()
+_prepared_cursors_lock = threading.Lock()
+
 
 class MysqlConnection:
     """
@@ -54,6 +80,8 @@ class DatabaseHandler:
     database api library, responsible for querying and
     formating data from/to DB
     requires on initialization Mysql_connection
+    All queries are prepared statements with bound parameters,
+    hashes and certificates are transferred as raw bytes
     """
 
     def __init__(self, db_connection: MysqlConnection):
@@ -73,6 +101,314 @@ class DatabaseHandler:
             id_list.append(id[0])
         return id_list
 
+    @db_handler_exception_wrapper
+    def get_unleased_files_expiring_before(
+        self, expiration_date: datetime, page_size: int = 1000
+    ):
+        """
+        Generator of tuples (FileID, ExpirationDateTS) of files
+        whose timestamp expires before given date and which have
+        no active lease in RetimestampLeases, ordered by
+        ExpirationDateTS. Rows are read in pages of page_size
+        by range queries on indexed column, every next page
+        continues after (ExpirationDateTS, FileID) of last row
+        (keyset pagination), so memory usage and cost of one
+        query do not depend on number of due files
+        """
+        yield from self._get_files_expiring_before(
+            QUERY_UNLEASED_FILEID_EXPIRING_BEFORE_ARCHIVED_FILES,
+            QUERY_UNLEASED_FILEID_EXPIRING_BEFORE_AFTER_KEY_ARCHIVED_FILES,
+            (datetime.now(),),
+            expiration_date,
+            page_size,
+        )
+
+    def _get_files_expiring_before(
+        self, query, query_after_key, params, expiration_date, page_size
+    ):
+        rows = self._execute_select_query(
+            query, params + (expiration_date, page_size)
+        )
+        while rows:
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last_id, last_date = rows[-1]
+            rows = self._execute_select_query(
+                query_after_key,
+                params
+                + (expiration_date, last_date, last_date, last_id, page_size),
+            )
+
+    @db_handler_exception_wrapper
+    def create_retimestamp_leases(
+        self, file_ids: list, lease_id: str, leased_until: datetime
+    ):
+        """
+        Creates lease of published retimestamping task for every
+        file id in one query, expired leases of these files
+        are replaced
+        """
+        if not file_ids:
+            return
+        # number of rows differs between calls, so statement is not
+        # prepared, values are still bound by client
+        params = []
+        for file_id in file_ids:
+            params.extend((int(file_id), lease_id, leased_until))
+        with closing(self.db_connecton.cursor()) as cursor:
+            cursor.execute(
+                QUERY_INSERT_INTO_RETIMESTAMP_LEASES.format(
+                    ", ".join([QUERY_VALUES_RETIMESTAMP_LEASE] * len(file_ids))
+                ),
+                params,
+            )
+            self.db_connecton.commit()
+
+    @db_handler_exception_wrapper
+    def claim_retimestamp_lease(
+        self,
+        file_id: int,
+        lease_id: str,
+        new_lease_id: str,
+        leased_until: datetime,
+    ):
+        """
+        Takes over lease of retimestamping task with given lease
+        id, lease gets new id and expiration. Expired lease is
+        taken over too, task could wait in queue longer than lease
+        timeout. Returns False if there is no such lease (task is
+        duplicate, lease was claimed by other task, released or
+        replaced by next checker run)
+        """
+        return (
+            self._execute_update_query(
+                QUERY_CLAIM_RETIMESTAMP_LEASE,
+                (
+                    new_lease_id,
+                    leased_until,
+                    file_id,
+                    lease_id,
+                ),
+            )
+            == 1
+        )
+
+    @db_handler_exception_wrapper
+    def release_retimestamp_lease(self, file_id: int, lease_id: str):
+        """
+        Deletes lease of finished retimestamping task
+        """
+        self._execute_update_query(
+            QUERY_DELETE_RETIMESTAMP_LEASE, (file_id, lease_id)
+        )
+
+    @db_handler_exception_wrapper
+    def get_file_id_pages_in_range(
+        self,
+        first_id: int,
+        last_id: int,
+        page_size: int = 1000,
+        after_id: int = 0,
+    ):
+        """
+        Generator of lists of FileIDs between first_id and last_id
+        (both included), see _get_file_id_pages
+        """
+        yield from self._get_file_id_pages(
+            QUERY_FILEID_RANGE_PAGE_ARCHIVED_FILES,
+            (int(first_id), int(last_id)),
+            page_size,
+            after_id,
+        )
+
+    @db_handler_exception_wrapper
+    def get_file_id_pages_of_owner(
+        self, owner_name: str, page_size: int = 1000, after_id: int = 0
+    ):
+        """
+        Generator of lists of FileIDs of files of given owner,
+        see _get_file_id_pages
+        """
+        yield from self._get_file_id_pages(
+            QUERY_FILEID_OWNER_PAGE_ARCHIVED_FILES,
+            (owner_name,),
+            page_size,
+            after_id,
+        )
+
+    @db_handler_exception_wrapper
+    def get_file_id_pages_not_validated_since(
+        self,
+        validated_since: datetime,
+        page_size: int = 1000,
+        after_id: int = 0,
+    ):
+        """
+        Generator of lists of FileIDs of files which were never
+        validated or whose last validation is older than
+        validated_since, see _get_file_id_pages
+        """
+        yield from self._get_file_id_pages(
+            QUERY_FILEID_NOT_VALIDATED_SINCE_PAGE_ARCHIVED_FILES,
+            (validated_since,),
+            page_size,
+            after_id,
+        )
+
+    @db_handler_exception_wrapper
+    def get_archived_file_records_by_file_ids(self, file_ids: list):
+        """
+        Returns dictionary FileID: ArchivedFile of given files
+        read by one query, missing files are left out
+        """
+        if not file_ids:
+            return {}
+        records = self.__get_archived_files(
+            self._execute_in_query(
+                QUERY_ALL_COLUMNS_ON_FILEIDS_ARCHIVED_FILES, file_ids
+            )
+        )
+        return {record.FileID: record for record in records}
+
+    @db_handler_exception_wrapper
+    def get_file_package_records_by_file_ids(self, file_ids: list):
+        """
+        Returns dictionary FileID: list of FilePackage records
+        (newest first) of given files read by one query, files
+        without records are left out
+        """
+        file_packages = {}
+        if not file_ids:
+            return file_packages
+        records = self.__get_file_packages(
+            self._execute_in_query(
+                QUERY_ALL_COLUMNS_ON_FILEIDS_FILE_PACKAGES, file_ids
+            )
+        )
+        for record in records:
+            file_packages.setdefault(record.ArchivedFileID, []).append(record)
+        return file_packages
+
+    @db_handler_exception_wrapper
+    def set_validation_results(
+        self,
+        results: list,
+        validated_at: datetime,
+        bulk_validation_id: str = None,
+    ):
+        """
+        Stores time and result of validation of files in one
+        query, it needs list of tuples (FileID, result) where
+        result is True for valid file, otherwise message of
+        validation. Files of bulk validation are stored with its id
+        """
+        if not results:
+            return
+        params = []
+        for file_id, result in results:
+            is_valid = result is True
+            params.extend(
+                (
+                    int(file_id),
+                    validated_at,
+                    is_valid,
+                    bulk_validation_id,
+                    None if is_valid else str(result),
+                )
+            )
+        with closing(self.db_connecton.cursor()) as cursor:
+            cursor.execute(
+                QUERY_INSERT_INTO_FILE_VALIDATIONS.format(
+                    ", ".join([QUERY_VALUES_FILE_VALIDATION] * len(results))
+                ),
+                params,
+            )
+            self.db_connecton.commit()
+
+    @db_handler_exception_wrapper
+    def create_bulk_validation(
+        self, bulk_validation_id: str, started_at: datetime
+    ):
+        """
+        Creates job of bulk validation, existing job is not
+        changed (task of first page was repeated)
+        """
+        self._execute_insert_query(
+            QUERY_INSERT_INTO_BULK_VALIDATIONS,
+            (bulk_validation_id, started_at),
+        )
+
+    @db_handler_exception_wrapper
+    def get_bulk_validation(self, bulk_validation_id: str):
+        """
+        Returns dictionary with columns of job of bulk validation,
+        None if there is no such job
+        """
+        rows = self._execute_select_query(
+            QUERY_ALL_COLUMNS_ON_BULKVALIDATIONID_BULK_VALIDATIONS,
+            (bulk_validation_id,),
+        )
+        if not rows:
+            return None
+        return dict(
+            zip(
+                (
+                    "BulkValidationID",
+                    "LastFileID",
+                    "ValidatedCount",
+                    "NotValidCount",
+                    "StartedAt",
+                    "FinishedAt",
+                ),
+                rows[0],
+            )
+        )
+
+    @db_handler_exception_wrapper
+    def update_bulk_validation_progress(
+        self,
+        bulk_validation_id: str,
+        last_file_id: int,
+        new_last_file_id: int,
+        validated: int,
+        not_valid: int,
+        finished_at: datetime = None,
+    ):
+        """
+        Moves job of bulk validation from last_file_id to
+        new_last_file_id and adds counts of files of validated
+        page, finished_at is given for last page. Returns False
+        if job does not continue after last_file_id (page was
+        stored by duplicate task or job is finished)
+        """
+        return (
+            self._execute_update_query(
+                QUERY_UPDATE_PROGRESS_BULK_VALIDATIONS,
+                (
+                    int(new_last_file_id),
+                    validated,
+                    not_valid,
+                    finished_at,
+                    bulk_validation_id,
+                    int(last_file_id),
+                ),
+            )
+            == 1
+        )
+
+    @db_handler_exception_wrapper
+    def get_not_valid_files_of_bulk_validation(self, bulk_validation_id: str):
+        """
+        Returns list of tuples (FileID, FileName, OwnerName, result
+        of validation) of files which were not valid in given bulk
+        validation
+        """
+        return self._execute_select_query(
+            QUERY_NOT_VALID_ON_BULKVALIDATIONID_FILE_VALIDATIONS,
+            (bulk_validation_id,),
+        )
+
     @db_handler_exception_wrapper
     def update_expiration_date_ts(self, file_id: int, new_date: datetime):
         """
@@ -80,9 +416,7 @@ class DatabaseHandler:
         table archived files
         """
         self._execute_insert_query(
-            self._get_formated_query_update_expiration_date_ts(
-                file_id, new_date.strftime("%Y-%m-%d %H:%M:%S")
-            )
+            QUERY_UPDATE_EXPIRATION_DATE_TS_ARCHIVED_FILES, (new_date, file_id)
         )
 
     @db_handler_exception_wrapper
@@ -91,13 +425,74 @@ class DatabaseHandler:
     ):
         """
         This function is responsible for creating records of
-        archived file in database
+        archived file in database. Both records are inserted in
+        one transaction, FileID of new archived file is taken
+        from lastrowid and set to both objects
         """
-        self.create_new_record_archived_file(archf_data)
-        filep_data.ArchivedFileID = self.get_file_id_archived_file_rec(
-            archf_data.FileName, archf_data.OwnerName
-        )
-        self.create_new_record_file_package(filep_data)
+        with self._transaction():
+            cursor = self._get_prepared_cursor(
+                QUERY_INSERT_INTO_ARCHIVED_FILES
+            )
+            cursor.execute(
+                QUERY_INSERT_INTO_ARCHIVED_FILES,
+                self._get_insert_params_archived_files(archf_data),
+            )
+            archf_data.FileID = cursor.lastrowid
+            filep_data.ArchivedFileID = archf_data.FileID
+            self._get_prepared_cursor(QUERY_INSERT_INTO_FILE_PACKAGES).execute(
+                QUERY_INSERT_INTO_FILE_PACKAGES,
+                self._get_insert_params_file_packages(filep_data),
+            )
+
+    @db_handler_exception_wrapper
+    def add_full_records_bulk(self, records: list):
+        """
+        Creates records of many archived files in one transaction.
+        It needs list of tuples (ArchivedFile, FilePackage),
+        archived files are inserted by one executemany, their
+        FileIDs are read back by unique key (FileName, OwnerName)
+        in one query and file packages are inserted by second
+        executemany
+        """
+        if not records:
+            return
+        archived_files_params = [
+            self._get_insert_params_archived_files(archf_data)
+            for archf_data, _ in records
+        ]
+        with self._transaction(), closing(
+            self.db_connecton.cursor()
+        ) as cursor:
+            # not prepared, connector sends executemany of insert
+            # as one multi-row statement
+            cursor.executemany(
+                QUERY_INSERT_INTO_ARCHIVED_FILES, archived_files_params
+            )
+            params = []
+            for archf_data, _ in records:
+                params.extend((archf_data.FileName, archf_data.OwnerName))
+            cursor.execute(
+                QUERY_FILEID_ON_FILENAMES_OWNERS_ARCHIVED_FILES.format(
+                    ", ".join([QUERY_VALUES_FILENAME_OWNER] * len(records))
+                ),
+                params,
+            )
+            file_ids = {
+                (file_name, owner_name): file_id
+                for file_id, file_name, owner_name in cursor.fetchall()
+            }
+            for archf_data, filep_data in records:
+                archf_data.FileID = file_ids[
+                    (archf_data.FileName, archf_data.OwnerName)
+                ]
+                filep_data.ArchivedFileID = archf_data.FileID
+            cursor.executemany(
+                QUERY_INSERT_INTO_FILE_PACKAGES,
+                [
+                    self._get_insert_params_file_packages(filep_data)
+                    for _, filep_data in records
+                ],
+            )
 
     @db_handler_exception_wrapper
     def create_new_record_archived_file(self, archf_data: ArchivedFile):
@@ -105,7 +500,8 @@ class DatabaseHandler:
         This will create new record in database for table ArchivedFiles
         """
         self._execute_insert_query(
-            self._get_formated_insert_query_archived_files(archf_data)
+            QUERY_INSERT_INTO_ARCHIVED_FILES,
+            self._get_insert_params_archived_files(archf_data),
         )
 
     @db_handler_exception_wrapper
@@ -114,7 +510,8 @@ class DatabaseHandler:
         This will create new record in database for table FilePackages.
         """
         self._execute_insert_query(
-            self._get_formated_query_insert_file_packages(filep_data)
+            QUERY_INSERT_INTO_FILE_PACKAGES,
+            self._get_insert_params_file_packages(filep_data),
         )
 
     @db_handler_exception_wrapper
@@ -141,7 +538,7 @@ class DatabaseHandler:
         """
 
         record_values = self._execute_select_query(
-            self._get_formated_query_record_archived_files_by_file_id(file_id)
+            QUERY_ALL_COLUMNS_ON_FILEID_ARCHIVED_FILES, (file_id,)
         )
         if len(record_values) == 0:
             raise RecordDoesNotExistCustomException(
@@ -160,11 +557,11 @@ class DatabaseHandler:
         """
 
         if latest:
-            query_f = self._get_formated_query_select_all_c_file_package_top_1
+            query = QUERY_ALL_COLUMNS_ON_FILEID_FILE_PACKAGES_TOP1
         else:
-            query_f = self._get_formated_query_select_all_c_file_package
+            query = QUERY_ALL_COLUMNS_ON_FILEID_FILE_PACKAGES
 
-        records_values = self._execute_select_query(query_f(archived_file_id))
+        records_values = self._execute_select_query(query, (archived_file_id,))
         if len(records_values) == 0:
             raise Exception(
                 "NO FILE PACKAGE RECORDS EXISTS FOR GIVEN ARCHIVED_FILE ID"
@@ -179,70 +576,111 @@ class DatabaseHandler:
         This will return FileID of file that matches owner_name and file_name
         """
         results = self._execute_select_query(
-            self._get_formated_query_based_on_filename_owner(
-                file_name, owner_name
-            )
+            QUERY_FILEID_ON_FILENAME_OWNER_ARCHIVED_FILES,
+            (file_name, owner_name),
         )
         if len(results) == 0:
             raise Exception("NO RECORDS MATCHING GIVEN PARAMERTERS")
         return results[0][0]
 
-    def _get_formated_insert_query_archived_files(self, arch_f: ArchivedFile):
+    def _get_insert_params_archived_files(self, arch_f: ArchivedFile):
         arch_f.validate_columns()
-        return QUERY_INSERT_INTO_ARCHIVED_FILES.format(
+        return (
             arch_f.FileName,
             arch_f.OwnerName,
             arch_f.OriginalFilePath,
             arch_f.PackageStoragePath,
-            repr(base64.b64encode(arch_f.OriginFileHashSha512).decode()),
-            arch_f.TimeOfFirstTS.strftime("%Y-%m-%d %H:%M:%S"),
-            repr(base64.b64encode(arch_f.SigningCert).decode()),
-            repr(base64.b64encode(arch_f.SignatureHashSha512).decode()),
-            repr(base64.b64encode(arch_f.Package0HashSha512).decode()),
-            arch_f.ExpirationDateTS.strftime("%Y-%m-%d %H:%M:%S"),
-        )
-
-    def _get_formated_query_based_on_filename_owner(
-        self, file_name, owner_name
-    ):
-        return QUERY_FILEID_ON_FILENAME_OWNER_ARCHIVED_FILES.format(
-            file_name,
-            owner_name,
+            arch_f.OriginFileHashSha512,
+            arch_f.TimeOfFirstTS,
+            arch_f.SigningCert,
+            arch_f.SignatureHashSha512,
+            arch_f.Package0HashSha512,
+            arch_f.ExpirationDateTS,
         )
 
-    def _get_formated_query_record_archived_files_by_file_id(self, file_id):
-        return QUERY_ALL_COLUMNS_ON_FILEID_ARCHIVED_FILES.format(file_id)
-
-    def _get_formated_query_update_expiration_date_ts(self, file_id, date):
-        return QUERY_UPDATE_EXPIRATION_DATE_TS_ARCHIVED_FILES.format(
-            date, file_id
-        )
-
-    def _get_formated_query_insert_file_packages(self, file_p: FilePackage):
+    def _get_insert_params_file_packages(self, file_p: FilePackage):
         file_p.validate_columns()
-        return QUERY_INSERT_INTO_FILE_PACKAGES.format(
+        return (
             file_p.ArchivedFileID,
             file_p.TimeStampingAuthority,
-            file_p.IssuingDate.strftime("%Y-%m-%d %H:%M:%S"),
-            repr(base64.b64encode(file_p.TsaCert).decode()),
-            repr(base64.b64encode(file_p.PackageHashSha512).decode()),
+            file_p.IssuingDate,
+            file_p.TsaCert,
+            file_p.PackageHashSha512,
         )
 
-    def _get_formated_query_select_all_c_file_package(self, file_id):
-        return QUERY_ALL_COLUMNS_ON_FILEID_FILE_PACKAGES.format(file_id)
-
-    def _get_formated_query_select_all_c_file_package_top_1(self, file_id):
-        return QUERY_ALL_COLUMNS_ON_FILEID_FILE_PACKAGES_TOP1.format(file_id)
+    def _get_prepared_cursor(self, query):
+        """
+        Returns prepared cursor of current connection for query,
+        statement is prepared on server only by first execution
+        """
+        with _prepared_cursors_lock:
+            cursors = _prepared_cursors.setdefault(self.db_connecton, {})
+        cursor = cursors.get(query)
+        if cursor is None:
+            cursor = self.db_connecton.cursor(prepared=True)
+            cursors[query] = cursor
+        return cursor
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Commits all statements executed inside once at the end,
+        rolls them back on exception
+        """
+        try:
+            yield
+            self.db_connecton.commit()
+        except BaseException:
+            self.db_connecton.rollback()
+            raise
 
-    def _execute_select_query(self, query):
+    def _get_file_id_pages(self, query, params, page_size, after_id=0):
+        """
+        Generator of lists of FileIDs greater than after_id read
+        by query in pages of page_size ordered by FileID, every
+        next page continues after FileID of last row (keyset
+        pagination), query takes params followed by last FileID
+        and page size
+        """
+        last_id = int(after_id)
+        while True:
+            page = [
+                row[0]
+                for row in self._execute_select_query(
+                    query, tuple(params) + (last_id, page_size)
+                )
+            ]
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            last_id = page[-1]
+
+    def _execute_in_query(self, query, values):
+        # number of values differs between calls, so statement is not
+        # prepared, values are still bound by client
         with closing(self.db_connecton.cursor()) as cursor:
-            cursor.execute(query)
+            cursor.execute(
+                query.format(", ".join([QUERY_VALUES_FILEID] * len(values))),
+                [int(value) for value in values],
+            )
             return cursor.fetchall()
 
-    def _execute_insert_query(self, query):
-        with closing(self.db_connecton.cursor()) as cursor:
-            cursor.execute(query)
-            self.db_connecton.commit()
+    def _execute_select_query(self, query, params=()):
+        cursor = self._get_prepared_cursor(query)
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+    def _execute_insert_query(self, query, params=()):
+        cursor = self._get_prepared_cursor(query)
+        cursor.execute(query, params)
+        self.db_connecton.commit()
+
+    def _execute_update_query(self, query, params=()):
+        cursor = self._get_prepared_cursor(query)
+        cursor.execute(query, params)
+        self.db_connecton.commit()
+        return cursor.rowcount
 
     def __get_file_packages(self, data):
         list_file_packages = list()
@@ -271,11 +709,11 @@ class DatabaseHandler:
             "OwnerName": column_data[2],
             "OriginalFilePath": column_data[3],
             "PackageStoragePath": column_data[4],
-            "OriginFileHashSha512": column_data[5],
+            "OriginFileHashSha512": bytes(column_data[5]),
             "TimeOfFirstTS": column_data[6],
-            "SigningCert": column_data[7],
-            "SignatureHashSha512": column_data[8],
-            "Package0HashSha512": column_data[9],
+            "SigningCert": bytes(column_data[7]),
+            "SignatureHashSha512": bytes(column_data[8]),
+            "Package0HashSha512": bytes(column_data[9]),
             "ExpirationDateTS": column_data[10],
         }
 
@@ -285,6 +723,6 @@ class DatabaseHandler:
             "ArchivedFileID": column_data[1],
             "TimeStampingAuthority": column_data[2],
             "IssuingDate": column_data[3],
-            "TsaCert": column_data[4],
-            "PackageHashSha512": column_data[5],
+            "TsaCert": bytes(column_data[4]),
+            "PackageHashSha512": bytes(column_data[5]),
         }
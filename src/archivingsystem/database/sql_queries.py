@@ -1,40 +1,170 @@
+# all queries are executed as prepared statements with bound
+# parameters (%s), values must not be formatted into query strings
+
 QUERY_ALL_COLUMNS_ON_FILEID_ARCHIVED_FILES = (
-    "select * from ArchivedFiles where FileID = {};"
+    "select * from ArchivedFiles where FileID = %s;"
 )
 
 
+# uses unique key ArchivedFilesUN (FileName, OwnerName)
 QUERY_FILEID_ON_FILENAME_OWNER_ARCHIVED_FILES = (
     "select FileID from ArchivedFiles "
-    "where FileName = '{}' and OwnerName like '{}';"
+    "where FileName = %s and OwnerName = %s;"
+)
+
+# {} is replaced by QUERY_VALUES_FILENAME_OWNER joined for every file
+QUERY_FILEID_ON_FILENAMES_OWNERS_ARCHIVED_FILES = (
+    "select FileID, FileName, OwnerName from ArchivedFiles "
+    "where (FileName, OwnerName) in ({});"
 )
 
+QUERY_VALUES_FILENAME_OWNER = "(%s, %s)"
+
 QUERY_ALL_COLUMNS_ON_FILEID_FILE_PACKAGES = (
     "select * from FilePackages "
-    "where ArchivedFileID = '{}' order by IssuingDate desc;"
+    "where ArchivedFileID = %s order by IssuingDate desc;"
 )
 
 QUERY_ALL_COLUMNS_ON_FILEID_FILE_PACKAGES_TOP1 = (
     "select * from FilePackages "
-    "where ArchivedFileID = {} order by IssuingDate desc "
+    "where ArchivedFileID = %s order by IssuingDate desc "
     "limit 1;"
 )
 
 QUERY_UPDATE_EXPIRATION_DATE_TS_ARCHIVED_FILES = (
-    "UPDATE ArchivedFiles SET ExpirationDateTS = '{}' WHERE FileID = {};"
+    "UPDATE ArchivedFiles SET ExpirationDateTS = %s WHERE FileID = %s;"
 )
 
+# hashes and certificates are bound as raw bytes (data/sqlscripts/00005.sql)
 QUERY_INSERT_INTO_ARCHIVED_FILES = (
     "INSERT into ArchivedFiles(FileName, OwnerName, OriginalFilePath,"
     " PackageStoragePath, OriginFileHashSha512, TimeOfFirstTS, SigningCert,"
-    " SignatureHashSha512, Package0HashSha512, ExpirationDateTS) Values('{}',"
-    " '{}', '{}', '{}', {}, '{}', {}, {}, {},'{}');"
+    " SignatureHashSha512, Package0HashSha512, ExpirationDateTS) Values(%s,"
+    " %s, %s, %s, %s, %s, %s, %s, %s, %s);"
 )
 
 QUERY_INSERT_INTO_FILE_PACKAGES = (
     "INSERT into FilePackages(ArchivedFileID, TimeStampingAuthority,"
-    " IssuingDate, TsaCert, PackageHashSha512) Values( '{}', '{}', '{}', {},"
-    " {});"
+    " IssuingDate, TsaCert, PackageHashSha512) Values(%s, %s, %s, %s, %s);"
 )
 
 
 QUERY_SELECT_FILEID = "select FileID from ArchivedFiles"
+
+# files expiring before given date for retimestamping checker, files
+# with active lease in RetimestampLeases are skipped, uses index
+# ArchivedFilesIX_ExpirationDateTS (data/sqlscripts/00003.sql)
+QUERY_UNLEASED_FILEID_EXPIRING_BEFORE_ARCHIVED_FILES = (
+    "select a.FileID, a.ExpirationDateTS from ArchivedFiles a "
+    "left join RetimestampLeases l "
+    "on l.FileID = a.FileID and l.LeasedUntil > %s "
+    "where l.FileID is null and a.ExpirationDateTS < %s "
+    "order by a.ExpirationDateTS, a.FileID limit %s;"
+)
+
+# next page of query above, keyset is (ExpirationDateTS, FileID) of last row
+QUERY_UNLEASED_FILEID_EXPIRING_BEFORE_AFTER_KEY_ARCHIVED_FILES = (
+    "select a.FileID, a.ExpirationDateTS from ArchivedFiles a "
+    "left join RetimestampLeases l "
+    "on l.FileID = a.FileID and l.LeasedUntil > %s "
+    "where l.FileID is null and a.ExpirationDateTS < %s "
+    "and (a.ExpirationDateTS > %s "
+    "or (a.ExpirationDateTS = %s and a.FileID > %s)) "
+    "order by a.ExpirationDateTS, a.FileID limit %s;"
+)
+
+# {} is replaced by QUERY_VALUES_RETIMESTAMP_LEASE joined for every lease
+QUERY_INSERT_INTO_RETIMESTAMP_LEASES = (
+    "INSERT into RetimestampLeases(FileID, LeaseID, LeasedUntil) Values {}"
+    " ON DUPLICATE KEY UPDATE LeaseID = VALUES(LeaseID),"
+    " LeasedUntil = VALUES(LeasedUntil);"
+)
+
+QUERY_VALUES_RETIMESTAMP_LEASE = "(%s, %s, %s)"
+
+# expired lease can be claimed too, until next checker run replaces it
+QUERY_CLAIM_RETIMESTAMP_LEASE = (
+    "UPDATE RetimestampLeases SET LeaseID = %s, LeasedUntil = %s "
+    "WHERE FileID = %s and LeaseID = %s;"
+)
+
+QUERY_DELETE_RETIMESTAMP_LEASE = (
+    "DELETE from RetimestampLeases WHERE FileID = %s and LeaseID = %s;"
+)
+
+# file ids selected for bulk validation are read in pages ordered by
+# FileID, every next page continues after FileID of last row (%s before
+# limit), filters are in the same order as in where clause
+QUERY_FILEID_RANGE_PAGE_ARCHIVED_FILES = (
+    "select FileID from ArchivedFiles "
+    "where FileID >= %s and FileID <= %s and FileID > %s "
+    "order by FileID limit %s;"
+)
+
+QUERY_FILEID_OWNER_PAGE_ARCHIVED_FILES = (
+    "select FileID from ArchivedFiles "
+    "where OwnerName = %s and FileID > %s "
+    "order by FileID limit %s;"
+)
+
+# files never validated or validated before given date
+# (data/sqlscripts/00006.sql)
+QUERY_FILEID_NOT_VALIDATED_SINCE_PAGE_ARCHIVED_FILES = (
+    "select a.FileID from ArchivedFiles a "
+    "left join FileValidations v on v.FileID = a.FileID "
+    "where (v.FileID is null or v.ValidatedAt < %s) and a.FileID > %s "
+    "order by a.FileID limit %s;"
+)
+
+# {} is replaced by QUERY_VALUES_FILEID joined for every file
+QUERY_ALL_COLUMNS_ON_FILEIDS_ARCHIVED_FILES = (
+    "select * from ArchivedFiles where FileID in ({});"
+)
+
+QUERY_ALL_COLUMNS_ON_FILEIDS_FILE_PACKAGES = (
+    "select * from FilePackages where ArchivedFileID in ({}) "
+    "order by ArchivedFileID, IssuingDate desc;"
+)
+
+QUERY_VALUES_FILEID = "%s"
+
+# {} is replaced by QUERY_VALUES_FILE_VALIDATION joined for every file
+# (BulkValidationID and Result are in data/sqlscripts/00007.sql)
+QUERY_INSERT_INTO_FILE_VALIDATIONS = (
+    "INSERT into FileValidations(FileID, ValidatedAt, IsValid,"
+    " BulkValidationID, Result) Values {}"
+    " ON DUPLICATE KEY UPDATE ValidatedAt = VALUES(ValidatedAt),"
+    " IsValid = VALUES(IsValid), BulkValidationID = VALUES(BulkValidationID),"
+    " Result = VALUES(Result);"
+)
+
+QUERY_VALUES_FILE_VALIDATION = "(%s, %s, %s, %s, %s)"
+
+# files which were not valid in given bulk validation
+QUERY_NOT_VALID_ON_BULKVALIDATIONID_FILE_VALIDATIONS = (
+    "select a.FileID, a.FileName, a.OwnerName, v.Result "
+    "from FileValidations v join ArchivedFiles a on a.FileID = v.FileID "
+    "where v.BulkValidationID = %s and v.IsValid = 0 order by v.FileID;"
+)
+
+# job of bulk validation (data/sqlscripts/00007.sql), task of first
+# page creates it, duplicate of the task does not change it
+QUERY_INSERT_INTO_BULK_VALIDATIONS = (
+    "INSERT IGNORE into BulkValidations(BulkValidationID, LastFileID,"
+    " ValidatedCount, NotValidCount, StartedAt) Values (%s, 0, 0, 0, %s);"
+)
+
+QUERY_ALL_COLUMNS_ON_BULKVALIDATIONID_BULK_VALIDATIONS = (
+    "select BulkValidationID, LastFileID, ValidatedCount, NotValidCount,"
+    " StartedAt, FinishedAt from BulkValidations"
+    " where BulkValidationID = %s;"
+)
+
+# progress is stored only by task which continues after LastFileID
+QUERY_UPDATE_PROGRESS_BULK_VALIDATIONS = (
+    "UPDATE BulkValidations SET LastFileID = %s,"
+    " ValidatedCount = ValidatedCount + %s,"
+    " NotValidCount = NotValidCount + %s, FinishedAt = %s"
+    " WHERE BulkValidationID = %s and LastFileID = %s"
+    " and FinishedAt is null;"
+)
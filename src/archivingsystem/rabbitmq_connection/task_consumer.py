@@ -1,13 +1,99 @@
 import functools
 import logging
+import multiprocessing
 import ssl
 import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from uuid import uuid4
 
 import pika
 
 logger = logging.getLogger("archiving_system_logging")
 
+DEFAULT_WORKER_POOL_SIZE = 4
+DEFAULT_METRICS_INTERVAL = 60
+# task with RETRY result is published again after retry_delay seconds,
+# delay is doubled with every retry up to MAX_RETRY_DELAY
+DEFAULT_RETRY_DELAY = 5
+DEFAULT_MAX_RETRIES = 5
+MAX_RETRY_DELAY = 300
+# header of republished task with number of its retries
+RETRIES_HEADER = "x-retries"
+# seconds between checks of running tasks while consumer is closing
+CLOSE_POLL_INTERVAL = 0.5
+
+
+def get_tasks_in_flight(channel_config: dict):
+    """
+    Returns number of tasks running at once in one process
+    of worker, it is worker_pool_size in thread mode and one
+    in process mode (every process runs one task)
+    """
+    if channel_config.get("execution_mode", "thread") == "process":
+        return 1
+    return channel_config.get("worker_pool_size", DEFAULT_WORKER_POOL_SIZE)
+
+
+class ConsumerMetrics:
+    """
+    Thread-safe counters of task consumer for back-pressure
+    monitoring:
+    queued - delivered tasks waiting for free worker thread
+    active - tasks being executed
+    completed - tasks finished with OK or KNOWN_ERROR
+    failed - tasks which failed and were sent to failed_tasks
+    requeued - tasks which finished with RETRY and were
+        returned to the queue after delay (or sent to
+        failed_tasks after max_retries)
+    rejected - deliveries which could not be submitted to pool
+        and were returned to the queue
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.requeued = 0
+        self.rejected = 0
+
+    def task_queued(self):
+        with self._lock:
+            self.queued += 1
+
+    def task_rejected(self):
+        with self._lock:
+            self.queued -= 1
+            self.rejected += 1
+
+    def task_started(self):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+
+    def task_finished(self, success, requeued=False):
+        with self._lock:
+            self.active -= 1
+            if requeued:
+                self.requeued += 1
+            elif success:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "failed": self.failed,
+                "requeued": self.requeued,
+                "rejected": self.rejected,
+            }
+
 
 class ConnectionMaker:
     """
@@ -76,30 +162,77 @@ class ConnectionMaker:
             ssl_context, self.__enable_ssl.get("Server_name_id")
         )
 
-    def make_connection(self):
+    def get_connection_parameters(self):
         """
-        Method that will create rabbitmq connection
+        Returns pika connection parameters from config
         """
-        logger.info("attempting to create connection to rabbitmq")
         self._set_config_values()
-        connection_values = pika.ConnectionParameters(
+        return pika.ConnectionParameters(
             host=self.__host,
             port=self.__port,
             virtual_host=self.__virtual_host,
             credentials=self.__get_credentials(),
             ssl_options=self.__setup_ssl() if self.__enable_ssl else None,
         )
+
+    def make_connection(self):
+        """
+        Method that will create rabbitmq connection
+        """
+        logger.info("attempting to create connection to rabbitmq")
+        connection_values = self.get_connection_parameters()
         logger.info("creating blocking connection")
         return pika.BlockingConnection(connection_values)
 
 
+def publish_task(rabbitmq_connection: ConnectionMaker, queue, task_message):
+    """
+    Publishes one task over its own connection, so it can be
+    called from worker threads and processes (channel of consumer
+    is not thread-safe). Channel is in publisher confirms mode,
+    pika.exceptions.NackError or UnroutableError is raised if
+    task was not accepted by queue
+    """
+    connection = rabbitmq_connection.make_connection()
+    try:
+        channel = connection.channel()
+        channel.confirm_delivery()
+        channel.basic_publish(
+            exchange="",
+            routing_key=queue,
+            properties=pika.BasicProperties(correlation_id=str(uuid4())),
+            body=task_message,
+            mandatory=True,
+        )
+    finally:
+        connection.close()
+
+
 class TaskConsumer:
     """
     Task consumer is responsible for listning on rabbitmq
     queue in channel for possible tasks. If task is recieved
     it  has to execute callback function which must be set
-    before starting consuming. It will execute task in separated
-    thread
+    before starting consuming. Tasks are executed in fixed-size
+    pool of worker threads, broker delivers at most prefetch_count
+    unacknowledged tasks, so pool queue is bounded.
+    If callback is set with process initializer (process mode),
+    every worker thread hands its task to pool of worker processes
+    and waits for result, connection and acks stay in this process.
+    Task with RETRY result stays unacknowledged for retry_delay
+    (doubled with every retry), so it holds its prefetch slot and
+    worker takes fewer new tasks while resources are missing,
+    then it is published again to the end of the queue with
+    number of retries in header, after max_retries it is sent
+    to failed_tasks.
+    channel_config: {
+        task_queue: 'archiving'
+        worker_pool_size: 4 (optional)
+        prefetch_count: 4 (optional, default is worker_pool_size)
+        metrics_interval: 60 (optional, seconds, 0 disables logging)
+        retry_delay: 5 (optional, seconds)
+        max_retries: 5 (optional)
+    }
     """
 
     def __init__(
@@ -111,6 +244,34 @@ class TaskConsumer:
         self.task_queue = channel_config["task_queue"]
         # self.control_exchange = channel_config["control_exchange"]
         self.callback_setup = False
+        self.pool_size = channel_config.get(
+            "worker_pool_size", DEFAULT_WORKER_POOL_SIZE
+        )
+        self.prefetch_count = channel_config.get(
+            "prefetch_count", self.pool_size
+        )
+        self.metrics_interval = channel_config.get(
+            "metrics_interval", DEFAULT_METRICS_INTERVAL
+        )
+        self.retry_delay = channel_config.get(
+            "retry_delay", DEFAULT_RETRY_DELAY
+        )
+        self.max_retries = channel_config.get(
+            "max_retries", DEFAULT_MAX_RETRIES
+        )
+        self.metrics = ConsumerMetrics()
+        self.metrics_sources = {}
+        self.process_executor = None
+        self.process_executor_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.pool_size, thread_name_prefix="task_worker"
+        )
+        logger.debug(
+            "[consumer] worker pool size: %s, prefetch count: %s",
+            str(self.pool_size),
+            str(self.prefetch_count),
+        )
+        self.rabbitmq_channel.basic_qos(prefetch_count=self.prefetch_count)
 
     def _setup_control_channel(self):
         logger.debug("[consumer] setting control exchange")
@@ -126,12 +287,22 @@ class TaskConsumer:
             queue=self.consumer_ID, on_message_callback=self.__control_close
         )
 
-    def set_callback(self, callback_function):
+    def set_callback(
+        self, callback_function, process_initializer=None, initargs=()
+    ):
         """
-        Function for setting callback function
+        Function for setting callback function.
+        If process_initializer is given, callback function is executed
+        in pool of worker_pool_size processes, every process is
+        prepared by process_initializer(*initargs). Both functions
+        have to be picklable (module-level functions)
         """
         logger.debug("[consumer] setting function to execute for given task")
         self.main_function = callback_function
+        if process_initializer is not None:
+            self.process_initializer = process_initializer
+            self.process_initargs = initargs
+            self.process_executor = self.__make_process_executor()
         logger.debug("[consumer] setting task queue and callback function")
         self.rabbitmq_channel.basic_consume(
             queue=self.task_queue, on_message_callback=self.__callback_func
@@ -151,13 +322,65 @@ class TaskConsumer:
             )
             raise Exception("Function for task has not been set up")
         logger.info("[consumer] Starting to consume on channel")
+        if self.metrics_interval:
+            self.connection.call_later(
+                self.metrics_interval, self.__log_metrics
+            )
         self.rabbitmq_channel.start_consuming()
 
     def close(self):
+        """
+        Stops consuming and waits until submitted tasks finish.
+        Acks of tasks are sent by connection IO loop, so events
+        are processed while waiting, channel is closed after
+        all acks are sent
+        """
         logger.info("[consumer] closing consumer")
         self.rabbitmq_channel.stop_consuming()
+        self.executor.shutdown(wait=False)
+        while self.__tasks_in_flight():
+            self.connection.process_data_events(time_limit=CLOSE_POLL_INTERVAL)
+        # acks added by last finished tasks
+        self.connection.process_data_events(time_limit=0)
+        if self.process_executor is not None:
+            self.process_executor.shutdown(wait=True)
         self.rabbitmq_channel.close()
 
+    def add_metrics_source(self, name, get_metrics_function):
+        """
+        Adds metrics of other component (e.g. database pool),
+        they are logged with consumer metrics under given name
+        """
+        self.metrics_sources[name] = get_metrics_function
+
+    def get_metrics(self):
+        """
+        Returns dictionary with current back-pressure metrics,
+        see ConsumerMetrics
+        """
+        metrics = self.metrics.snapshot()
+        metrics["pool_size"] = self.pool_size
+        metrics["prefetch_count"] = self.prefetch_count
+        for name, get_source_metrics in self.metrics_sources.items():
+            metrics[name] = get_source_metrics()
+        return metrics
+
+    def __tasks_in_flight(self):
+        metrics = self.metrics.snapshot()
+        return metrics["queued"] + metrics["active"]
+
+    def __log_metrics(self):
+        metrics = self.get_metrics()
+        try:
+            # number of tasks waiting in broker queue
+            metrics["queue_depth"] = self.rabbitmq_channel.queue_declare(
+                queue=self.task_queue, passive=True
+            ).method.message_count
+        except pika.exceptions.AMQPError:
+            metrics["queue_depth"] = None
+        logger.info("[consumer] metrics: %s", str(metrics))
+        self.connection.call_later(self.metrics_interval, self.__log_metrics)
+
     def __control_close(self, ch, method, properties, body):
         """
         body should contain shutdown command
@@ -173,13 +396,19 @@ class TaskConsumer:
             logger.warning("[consumer] unknown control command")
 
     def __callback_func(self, ch, method, properties, body):
-        threaded_job = threading.Thread(
-            target=self.__threaded_func, args=(ch, method, body), daemon=True
-        )
-        logger.info("[consumer] creating thread for callback function")
-        threaded_job.start()
+        logger.info("[consumer] submitting callback function to worker pool")
+        self.metrics.task_queued()
+        try:
+            self.executor.submit(
+                self.__threaded_func, ch, method, properties, body
+            )
+        except RuntimeError:
+            # pool was shut down, task is returned to the queue
+            logger.warning("[consumer] worker pool is closed, task rejected")
+            self.metrics.task_rejected()
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
 
-    def __threaded_func(self, ch, method, body):
+    def __threaded_func(self, ch, method, properties, body):
         """
         Function where callback function is executed
         It cathes unknown exceptions and logging them
@@ -188,12 +417,15 @@ class TaskConsumer:
         it will send task acknowledgment. If there will
         be exception that is caused by worker task wont
         be acknowledge and it will be consumed again by
-        another worker
+        another worker. Task with RETRY result (temporary
+        lack of resources or broken process pool) is returned
+        to the queue after delay
         """
         logger.info("[consumer] executing callback function")
+        self.metrics.task_started()
         result = None
         try:
-            result = self.main_function(body)
+            result = self.__execute_main_function(body, method.redelivered)
         except Exception:  # as e: - was unused
             logger.exception(
                 "Exception occured in worker, not fault by task",
@@ -202,12 +434,23 @@ class TaskConsumer:
             )
             result = None
         logger.info("[consumer] callback function finished")
+        success = result == "OK" or result == "KNOWN_ERROR"
         logger.info("[consumer] sending task acknowledgment")
-        if result == "OK" or result == "KNOWN_ERROR":
+        if success:
             ack_callback = functools.partial(
                 self.__send_ack_threadsafe, ch, method.delivery_tag
             )
             self.connection.add_callback_threadsafe(ack_callback)
+        elif result == "RETRY":
+            logger.info("[consumer] returning task to the queue")
+            retry_callback = functools.partial(
+                self.__schedule_retry_threadsafe,
+                ch,
+                method.delivery_tag,
+                properties,
+                body,
+            )
+            self.connection.add_callback_threadsafe(retry_callback)
         else:
             logger.warning("[consumer] Operation failed")
             nack_callback = functools.partial(
@@ -215,12 +458,103 @@ class TaskConsumer:
             )
             logger.info("[consumer] rejecting task")
             self.connection.add_callback_threadsafe(nack_callback)
-            return
+        # counted after ack is scheduled, so close() does not miss it
+        self.metrics.task_finished(success, result == "RETRY")
+
+    def __make_process_executor(self):
+        logger.info(
+            "[consumer] creating pool of %s worker processes",
+            str(self.pool_size),
+        )
+        # spawn is used, forked process would share rabbitmq socket
+        return ProcessPoolExecutor(
+            max_workers=self.pool_size,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=self.process_initializer,
+            initargs=self.process_initargs,
+        )
+
+    def __execute_main_function(self, body, redelivered=False):
+        """
+        Executes callback function in this thread or in pool of
+        worker processes. If worker process dies, all tasks running
+        in the pool fail, pool is replaced and tasks are returned
+        to the queue (RETRY). Task which was already redelivered
+        is not returned again, it could be the one killing the pool
+        """
+        if self.process_executor is None:
+            return self.main_function(body)
+        process_executor = self.process_executor
+        try:
+            return process_executor.submit(self.main_function, body).result()
+        except BrokenProcessPool:
+            # worker process died, pool is replaced for next tasks
+            with self.process_executor_lock:
+                if self.process_executor is process_executor:
+                    logger.error("[consumer] process pool broken, recreating")
+                    self.process_executor = self.__make_process_executor()
+            if redelivered:
+                logger.error(
+                    "[consumer] redelivered task failed in broken process"
+                    " pool, task is not returned to the queue"
+                )
+                raise
+            return "RETRY"
 
     def __send_ack_threadsafe(self, channel, delivery_tag):
         if channel.is_open and delivery_tag is not None:
             channel.basic_ack(delivery_tag=delivery_tag)
 
+    def __schedule_retry_threadsafe(
+        self, channel, delivery_tag, properties, body
+    ):
+        retries = self.__get_retries(properties)
+        delay = min(self.retry_delay * 2**retries, MAX_RETRY_DELAY)
+        logger.info(
+            "[consumer] task will be retried in %s s (retry %s of %s)",
+            str(delay),
+            str(retries + 1),
+            str(self.max_retries),
+        )
+        self.connection.call_later(
+            delay,
+            functools.partial(
+                self.__send_retry, channel, delivery_tag, properties, body
+            ),
+        )
+
+    def __send_retry(self, channel, delivery_tag, properties, body):
+        # unacknowledged task is redelivered by broker if channel
+        # was closed in the meantime
+        if not channel.is_open or delivery_tag is None:
+            return
+        retries = self.__get_retries(properties)
+        if retries >= self.max_retries:
+            logger.error(
+                "[consumer] task was retried %s times, rejecting task",
+                str(retries),
+            )
+            self.__send_nack_threadsafe(channel, delivery_tag, body)
+            return
+        headers = dict(properties.headers or {})
+        headers[RETRIES_HEADER] = retries + 1
+        channel.basic_publish(
+            exchange="",
+            routing_key=self.task_queue,
+            properties=pika.BasicProperties(
+                correlation_id=properties.correlation_id or str(uuid4()),
+                delivery_mode=properties.delivery_mode,
+                headers=headers,
+            ),
+            body=body,
+        )
+        channel.basic_ack(delivery_tag=delivery_tag)
+
+    def __get_retries(self, properties):
+        if not properties.headers:
+            return 0
+        return int(properties.headers.get(RETRIES_HEADER, 0))
+
     def __send_nack_threadsafe(self, channel, delivery_tag, body):
         if channel.is_open and delivery_tag is not None:
             channel.basic_publish(
@@ -2,17 +2,22 @@ import base64
 import logging
 import os
 import tarfile
+from datetime import datetime, timedelta
 from hashlib import sha512
+from uuid import uuid4
 
 import rfc3161ng
-from cryptography.hazmat.primitives.serialization import Encoding
 
+from ..common import hashing, merkle, package_index
 from ..common import utils as common_utils
+from ..common.crl_cache import CrlCache
 from ..common.exceptions import (
     DigestsNotMatchedCustomException,
     FileNotInDirectoryCustomException,
     TimestampInvalidCustomException,
 )
+from ..common.timestamp_verifier import TimestampVerifier
+from ..common.tsa_client import TimestampingClient
 from ..database.file_package import FilePackage
 
 logger = logging.getLogger("archiving_system_logging")
@@ -26,19 +31,44 @@ class Retimestamper:
 
     on init it needs database library object and
     configuration file. Example could be found
-    in example_config and it retimestamping_info part
+    in example_config and it retimestamping_info part.
+    TSA client and CRL cache shared by worker can be given,
+    otherwise new ones are created
+    Latest timestamp is verified locally with TSA certificates
+    stored in the package
     """
 
-    def __init__(self, db_handler, config: dict):
+    def __init__(
+        self,
+        db_handler,
+        config: dict,
+        tsa_client: TimestampingClient = None,
+        crl_cache: CrlCache = None,
+    ):
         self.db_handler = db_handler
         self.config = config
+        self.tsa_client = tsa_client or TimestampingClient(
+            self.config["TSA_info"]
+        )
+        self.crl_cache = crl_cache or CrlCache(self.config.get("crl_cache"))
+        self.ts_verifier = TimestampVerifier()
         self.file_pack_record = FilePackage()
 
-    def retimestamp(self, file_id):
+    def retimestamp(self, file_id, lease_id=None):
         """
         Retimestamp function need file id from database
-        of archived file which will be retimestamped
+        of archived file which will be retimestamped.
+        If task has lease id from retimestamping checker,
+        the lease is claimed first and duplicate task (lease
+        already claimed, released or replaced by next checker
+        run) is skipped
         """
+        claim_id = None
+        if lease_id is not None:
+            claim_id = self._claim_lease(file_id, lease_id)
+            if claim_id is None:
+                return "OK"
+
         (
             archiving_storage_path,
             current_package_hash,
@@ -50,11 +80,19 @@ class Retimestamper:
         tar_path = os.path.join(
             archiving_storage_path, "PackageF{}.tar".format(package_id)
         )
-        common_utils.create_tar_file_from_dir(
+        # index must not be packed, layers of wrapped package are reused
+        previous_index = package_index.load_index(archiving_storage_path)
+        package_index.remove_index(archiving_storage_path)
+        _, tar_hash = common_utils.create_tar_file_from_dir(
             archiving_storage_path,
             tar_path,
+            sha512,
+        )
+        package_index.store_index(
+            archiving_storage_path,
+            package_index.build_index(tar_path, previous_index),
         )
-        self._fill_package_record(file_id, new_timestamp, tar_path)
+        self._fill_package_record(file_id, new_timestamp, tar_hash)
 
         logger.info("updating archived record with latest expiration date")
         self.db_handler.update_expiration_date_ts(
@@ -63,8 +101,29 @@ class Retimestamper:
 
         logger.info("inserting file package record into database")
         self.db_handler.create_new_record_file_package(self.file_pack_record)
+
+        if claim_id is not None:
+            logger.debug("releasing lease of file %s", str(file_id))
+            self.db_handler.release_retimestamp_lease(file_id, claim_id)
         return "OK"  # or exception
 
+    def _claim_lease(self, file_id, lease_id):
+        claim_id = str(uuid4())
+        leased_until = datetime.now() + timedelta(
+            minutes=self.config.get("lease_timeout_minutes", 60)
+        )
+        if not self.db_handler.claim_retimestamp_lease(
+            file_id, lease_id, claim_id, leased_until
+        ):
+            logger.info(
+                "lease %s of file %s was already claimed or replaced,"
+                " skipping duplicate retimestamping task",
+                str(lease_id),
+                str(file_id),
+            )
+            return None
+        return claim_id
+
     def _verify_existing_package(self, file_id):
         logger.info("verifying last package timestamp")
 
@@ -85,6 +144,7 @@ class Retimestamper:
         (
             timestamp,
             timestamped_file_hash,
+            tsa_certs,
             tar_package_path,
         ) = self._get_ts_data_from_package(archiving_storage_path)
 
@@ -97,8 +157,8 @@ class Retimestamper:
         )
 
         logger.info("verifying latest timestamp")
-        verification_result = common_utils.verify_timestamp(
-            timestamp, timestamped_file_hash, self.config["TSA_info"]
+        verification_result = self.ts_verifier.verify(
+            timestamp, timestamped_file_hash, *tsa_certs
         )
         if verification_result is not True:
             logger.exception(
@@ -118,9 +178,7 @@ class Retimestamper:
         self, archiving_storage_path, current_package_hash
     ):
         logger.info("getting new package timestamp")
-        new_timestamp = common_utils.get_timestamp(
-            self.config["TSA_info"], current_package_hash
-        )
+        new_timestamp = self.tsa_client.get_timestamp(current_package_hash)
         logger.info("storing timestamp to storage directory..")
         common_utils.store_ts_data(
             new_timestamp, archiving_storage_path, "timestamp"
@@ -128,7 +186,7 @@ class Retimestamper:
         self._store_used_cert_files(archiving_storage_path)
         return new_timestamp
 
-    def _fill_package_record(self, file_id, new_timestamp, tar_path):
+    def _fill_package_record(self, file_id, new_timestamp, tar_hash):
         logger.info("Filling new file package record with gathered data")
         self.file_pack_record.ArchivedFileID = file_id
         self.file_pack_record.TimeStampingAuthority = self.config["TSA_info"][
@@ -137,15 +195,10 @@ class Retimestamper:
         self.file_pack_record.IssuingDate = rfc3161ng.get_timestamp(
             new_timestamp
         )
-        cert = common_utils.get_certificate(
-            self.config["TSA_info"]["tsa_cert_path"]
-        )
         self.file_pack_record.TsaCert = base64.b64encode(
-            cert.public_bytes(Encoding.PEM)
-        )
-        self.file_pack_record.PackageHashSha512 = common_utils.get_file_hash(
-            sha512, tar_path
+            self.tsa_client.get_certificate_pem()
         )
+        self.file_pack_record.PackageHashSha512 = tar_hash
         logger.info("File package record filled")
 
     def _get_ts_data_from_package(self, dir_path):
@@ -167,12 +220,19 @@ class Retimestamper:
             "getting data from tar file on path %s",
             str(tar_package_path),
         )
-        with tarfile.open(tar_package_path, "r:") as tarf:
+        index = package_index.load_index(dir_path)
+        if index is not None and index["package"] == package_name_list[0]:
+            tarf = package_index.IndexedTarFile.open(tar_package_path, index)
+        else:
+            tarf = tarfile.open(tar_package_path, "r:")
+        with tarf:
             file_names = tarf.getnames()
             timestamp = self._read_timestamp_from_tar(file_names, tarf)
             hash_f = self._get_timestamped_file_hash(sha512, tarf, file_names)
+            hash_f = self._get_merkle_root_if_batched(tarf, file_names, hash_f)
+            tsa_certs = self._read_tsa_certs_from_tar(tarf, file_names)
 
-        return timestamp, hash_f, tar_package_path
+        return timestamp, hash_f, tsa_certs, tar_package_path
 
     def _get_expiration_date(self, timestamp):
         years = self.config["validity_length_in_years"]
@@ -226,19 +286,38 @@ class Retimestamper:
         common_utils.copy_file_to_dir(
             path_tsa_ca_pem, dir_path, "tsa_ca_cert.pem"
         )
-        crl = common_utils.get_current_crl(tsa_crl_url)
-        common_utils.validate_certificate(crl, path_tsa_ca_pem)
+        crl = self.crl_cache.get_validated_crl(tsa_crl_url, path_tsa_ca_pem)
         common_utils.store_ts_data(crl, dir_path, "tsa_cert_crl.crl")
         logger.debug("certificate files stored in dir of new package")
 
     def _get_timestamped_file_hash(self, hash, tarf, file_names):
-        f = tarf.extractfile(self._get_timestamped_file_name(file_names))
-        file_hash = hash()
-        buffer = f.read(8192)
-        while buffer != b"":
-            file_hash.update(buffer)
-            buffer = f.read(8192)
-        return file_hash.digest()
+        file_name = self._get_timestamped_file_name(file_names)
+        f = tarf.extractfile(file_name)
+        return hashing.hash_stream(hash, f, name=file_name)
+
+    def _get_merkle_root_if_batched(self, tarf, file_names, data):
+        # package archived in batch has timestamp1 of merkle root
+        proof_name = list(
+            filter(lambda x: x.startswith("inclusion_proof"), file_names)
+        )
+        if len(proof_name) == 0:
+            return data
+        logger.info("computing merkle root from inclusion proof")
+        proof = merkle.load_proof(tarf.extractfile(proof_name[0]).read())
+        return merkle.compute_root(data, proof)
+
+    def _read_tsa_certs_from_tar(self, tarf, file_names):
+        # TSA certificate and CA certificate used for latest timestamp
+        certs = []
+        for name in ("tsa_cert.crt", "tsa_ca_cert.pem"):
+            path = "certificate_files/" + name
+            if path not in file_names:
+                logger.exception("unable to find %s in tarfile", path)
+                raise FileNotInDirectoryCustomException(
+                    "unable to find {} in tarfile".format(path)
+                )
+            certs.append(tarf.extractfile(path).read())
+        return tuple(certs)
 
     def _read_timestamp_from_tar(self, file_names, tarf):
         logger.info("trying to read timestamp from opened tar file")
@@ -259,7 +338,7 @@ class Retimestamper:
             str(hash_db),
             str(hash_pack),
         )
-        if hash_db != base64.b64encode(hash_pack):
+        if hash_db != hash_pack:
             logger.warning(
                 "hash from db and hash of package file do not match"
             )
@@ -1,84 +1,221 @@
 import json
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
+from itertools import chain, islice
 from uuid import uuid4
 
 import pika
 
-from ..database.archived_file import ArchivedFile
 from ..database.db_library import DatabaseHandler, MysqlConnection
 from ..rabbitmq_connection.task_consumer import ConnectionMaker
 
 # from common.exceptions import WrongRecordFormatCustomException - was unused
 
+# files are retimestamped when less than 2 days remain to expiration
+RETIMESTAMPING_PERIOD = timedelta(days=2)
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_PUBLISH_BATCH_SIZE = 500
+DEFAULT_HORIZON_DAYS = 14
+DEFAULT_LEASE_TIMEOUT_MINUTES = 60
+DEFAULT_MAX_TASKS_PER_MINUTE = 60
+# spread mode publishes within this part of interval between runs,
+# so run finishes before next one is started by scheduler
+PACING_WINDOW = 0.9
 
-def format_task_message(file_id: int):
+
+def format_task_message(file_id: int, lease_id: str = None):
     task_message = {
         "task": "retimestamp",
         "file_id": file_id,
     }
+    if lease_id is not None:
+        task_message["lease_id"] = lease_id
     return json.dumps(task_message)
 
 
-def make_task(channel, queue, task_message):
+def make_task(channel, queue, task_message, mandatory=False):
     channel.basic_publish(
         exchange="",
         routing_key=queue,
         properties=pika.BasicProperties(correlation_id=str(uuid4())),
         body=task_message,
+        mandatory=mandatory,
     )
 
 
-def publish_retimestamping_tasks(files_to_retimestamp: list, config: dict):
+def publish_retimestamping_tasks(
+    files_to_retimestamp,
+    config: dict,
+    batch_size=DEFAULT_PUBLISH_BATCH_SIZE,
+    max_tasks_per_minute=None,
+    lease_timeout=timedelta(minutes=DEFAULT_LEASE_TIMEOUT_MINUTES),
+):
+    """
+    Publishes task for every file id from iterable. Channel is in
+    publisher confirms mode, every task is confirmed by broker
+    (blocking channel waits for confirmation of each publish),
+    pika.exceptions.NackError or UnroutableError is raised if
+    task was not accepted by queue. Tasks are published in
+    batches, before batch is published, its files are leased in
+    database for lease_timeout, so next runs skip them until the
+    lease is released by worker or expires. If max_tasks_per_minute
+    is given, publishing is paced to not exceed this rate, database
+    connection is opened only for writing leases of batch, so it
+    is not held while publishing is paced.
+    Returns number of published tasks
+    """
     c_maker = ConnectionMaker(config.get("rabbitmq_connection"))
     connection = c_maker.make_connection()
     channel = connection.channel()
-
-    for file_to_retimestamp in files_to_retimestamp:
-        make_task(
-            channel,
-            config["rabbitmq_info"].get("task_queue"),
-            format_task_message(file_to_retimestamp),
-        )
+    channel.confirm_delivery()
+    if max_tasks_per_minute:
+        batch_size = max(1, min(batch_size, int(max_tasks_per_minute)))
+
+    start = time.monotonic()
+    published = 0
+    lease_id = str(uuid4())
+    files_to_retimestamp = iter(files_to_retimestamp)
+    batch = list(islice(files_to_retimestamp, batch_size))
+    while batch:
+        if max_tasks_per_minute:
+            # connection.sleep keeps heartbeats of connection running
+            delay = start + published * 60 / max_tasks_per_minute
+            connection.sleep(max(0, delay - time.monotonic()))
+        with MysqlConnection(config.get("db_config")) as db_connection:
+            DatabaseHandler(db_connection).create_retimestamp_leases(
+                batch, lease_id, datetime.now() + lease_timeout
+            )
+        for file_to_retimestamp in batch:
+            make_task(
+                channel,
+                config["rabbitmq_info"].get("task_queue"),
+                format_task_message(file_to_retimestamp, lease_id),
+                mandatory=True,
+            )
+        published += len(batch)
+        batch = list(islice(files_to_retimestamp, batch_size))
     channel.close()
     connection.close()
+    return published
 
 
-# This method can be done via 1 sql script
-def get_files_to_retimestamp(db_config):
-    files_to_retimestamp = set()
+def get_files_to_retimestamp(db_config, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Generator of file ids which should be retimestamped
+    """
+    with MysqlConnection(db_config) as db_connection:
+        db_handler = DatabaseHandler(db_connection)
+        for file_id, _ in db_handler.get_unleased_files_expiring_before(
+            datetime.now() + RETIMESTAMPING_PERIOD, page_size
+        ):
+            yield file_id
+
+
+def get_files_to_retimestamp_spread(
+    db_config, horizon: timedelta, budget: int, page_size=DEFAULT_PAGE_SIZE
+):
+    """
+    Generator of file ids for spread mode. Files expiring within
+    horizon are taken from the soonest expiring, at most budget
+    of them. Files which would otherwise be taken by deadline
+    mode (RETIMESTAMPING_PERIOD) are always taken, even over
+    the budget, so no timestamp expires
+    """
+    now = datetime.now()
+    deadline = now + RETIMESTAMPING_PERIOD
+    planned = 0
     with MysqlConnection(db_config) as db_connection:
         db_handler = DatabaseHandler(db_connection)
-        file_ids = db_handler.get_all_file_id()
-        for file_id in file_ids:
-            archived_file = (
-                db_handler.get_specific_archived_file_record_by_file_id(
-                    file_id
-                )
+        files = db_handler.get_unleased_files_expiring_before(
+            now + max(horizon, RETIMESTAMPING_PERIOD), page_size
+        )
+        for file_id, expiration_date in files:
+            if planned >= budget:
+                if expiration_date >= deadline:
+                    return
+                if planned == budget:
+                    print(
+                        "Warning: rate limit exceeded, more files expire"
+                        " within {} days than budget of {} tasks".format(
+                            RETIMESTAMPING_PERIOD.days, budget
+                        )
+                    )
+            planned += 1
+            yield file_id
+
+
+def run_checker_controller(config, run_interval_hours=1):
+    """
+    Finds files for retimestamping and publishes tasks for them.
+    Mode is taken from retimestamping_checker part of config:
+    deadline - all files expiring within RETIMESTAMPING_PERIOD
+    spread - files expiring within horizon_days, soonest first,
+        at most max_tasks_per_minute for every minute of
+        PACING_WINDOW part of interval until next run. All ids
+        are read before publishing (database connection is
+        closed) and tasks are published at this rate, faster
+        only if files expiring within RETIMESTAMPING_PERIOD do
+        not fit, so run finishes before next one
+    """
+    checker_config = config.get("retimestamping_checker") or {}
+    page_size = checker_config.get("page_size", DEFAULT_PAGE_SIZE)
+    max_tasks_per_minute = None
+    start = time.perf_counter()
+    print("Checking files to be retimestamped...")
+    if checker_config.get("mode", "deadline") == "spread":
+        max_tasks_per_minute = checker_config.get(
+            "max_tasks_per_minute", DEFAULT_MAX_TASKS_PER_MINUTE
+        )
+        if max_tasks_per_minute <= 0:
+            raise ValueError(
+                "retimestamping_checker max_tasks_per_minute has to be"
+                " positive, got {}".format(max_tasks_per_minute)
             )
-            if compare_expiration_date(archived_file):
-                files_to_retimestamp.add(file_id)
-    return list(files_to_retimestamp)
-
-
-def compare_expiration_date(file_rec: ArchivedFile):
-    difference = file_rec.ExpirationDateTS - datetime.now()
-    return difference.days < 2
+        window_minutes = run_interval_hours * 60 * PACING_WINDOW
+        budget = int(max_tasks_per_minute * window_minutes)
+        horizon = timedelta(
+            days=checker_config.get("horizon_days", DEFAULT_HORIZON_DAYS)
+        )
+        print(
+            "Spread mode: horizon {}, at most {} tasks".format(horizon, budget)
+        )
+        files_to_retimestamp = list(
+            get_files_to_retimestamp_spread(
+                config.get("db_config"), horizon, budget, page_size
+            )
+        )
+        # files which must not expire are published even over budget
+        max_tasks_per_minute = max(
+            max_tasks_per_minute, len(files_to_retimestamp) / window_minutes
+        )
+        files_to_retimestamp = iter(files_to_retimestamp)
+    else:
+        files_to_retimestamp = get_files_to_retimestamp(
+            config.get("db_config"), page_size
+        )
 
+    first_file = next(files_to_retimestamp, None)
+    if first_file is None:
+        print("Number of files to be retimestamped: ", 0)
+        print("Done in {:.3f} s".format(time.perf_counter() - start))
+        return
 
-def run_checker_controller(config):
-    print("Checking files to be validated...")
-    list_of_files_to_retimestamp = get_files_to_retimestamp(
-        config.get("db_config")
+    print("Publishing tasks...")
+    published = publish_retimestamping_tasks(
+        chain([first_file], files_to_retimestamp),
+        config,
+        checker_config.get("publish_batch_size", DEFAULT_PUBLISH_BATCH_SIZE),
+        max_tasks_per_minute,
+        timedelta(
+            minutes=checker_config.get(
+                "lease_timeout_minutes", DEFAULT_LEASE_TIMEOUT_MINUTES
+            )
+        ),
     )
-
+    elapsed = time.perf_counter() - start
+    print("Number of files to be retimestamped: ", published)
     print(
-        "Number of files to be retimestamped: ",
-        len(list_of_files_to_retimestamp),
+        "Done in {:.3f} s ({:.1f} tasks/s)".format(
+            elapsed, published / elapsed if elapsed > 0 else 0
+        )
     )
-    if len(list_of_files_to_retimestamp) == 0:
-        print("Done")
-        return
-
-    print("Publishing tasks...")
-    publish_retimestamping_tasks(list_of_files_to_retimestamp, config)
-    print("Done")
@@ -1,11 +1,19 @@
 import json
 import logging
 
+from ..common.crl_cache import CrlCache
 from ..common.exception_wrappers import task_exceptions_wrapper
 from ..common.exceptions import WrongTaskCustomException
+from ..common.hashing import configure_hashing
 from ..common.setup_logger import setup_logger
-from ..database.db_library import DatabaseHandler, MysqlConnection
-from ..rabbitmq_connection.task_consumer import ConnectionMaker, TaskConsumer
+from ..common.tsa_client import TimestampingClient
+from ..database.connection_pool import MysqlConnectionPool
+from ..database.db_library import DatabaseHandler
+from ..rabbitmq_connection.task_consumer import (
+    ConnectionMaker,
+    TaskConsumer,
+    get_tasks_in_flight,
+)
 from .retimestamper import Retimestamper
 
 # from contextlib import closing - was unused
@@ -26,13 +34,25 @@ class RetimestampingWorker:
 
     def __init__(self, config):
         self.db_config = config.get("db_config")
+        self.db_pool = MysqlConnectionPool(
+            self.db_config,
+            config.get("db_pool"),
+            get_tasks_in_flight(config.get("rabbitmq_info")),
+        )
         self.rmq_config = config.get("rabbitmq_connection")
         self.connection = ConnectionMaker(self.rmq_config)
         self.task_consumer = TaskConsumer(
             self.connection, config.get("rabbitmq_info")
         )
         self.task_consumer.set_callback(self.retimestamp)
+        self.task_consumer.add_metrics_source(
+            "db_pool", self.db_pool.get_metrics
+        )
         self.retimestamping_config = config.get("retimestamping_info")
+        self.tsa_client = TimestampingClient(
+            self.retimestamping_config["TSA_info"]
+        )
+        self.crl_cache = CrlCache(self.retimestamping_config.get("crl_cache"))
 
     def run(self):
         logger.info("starting retimestamping task consumer")
@@ -47,19 +67,22 @@ class RetimestampingWorker:
         """
         logger.debug("recieved task with body: %s", str(jbody))
 
-        logger.info("creating database connection")
-        with MysqlConnection(self.db_config) as db_connection:
+        logger.info("getting database connection from pool")
+        with self.db_pool.connection() as db_connection:
             db_handler = DatabaseHandler(db_connection)
             retimestamper = Retimestamper(
-                db_handler, self.retimestamping_config
+                db_handler,
+                self.retimestamping_config,
+                self.tsa_client,
+                self.crl_cache,
             )
-            file_id = self._parse_message_body(jbody)
+            file_id, lease_id = self._parse_message_body(jbody)
 
             logger.debug(
                 "executing retimestamping of file id: %s",
                 str(file_id),
             )
-            result = retimestamper.retimestamp(file_id)
+            result = retimestamper.retimestamp(file_id, lease_id)
         return result
 
     def _parse_message_body(self, body):
@@ -74,7 +97,7 @@ class RetimestampingWorker:
                     str(body.get("task"))
                 ),
             )
-        return body.get("file_id")
+        return body.get("file_id"), body.get("lease_id")
 
 
 def run_worker(config):
@@ -82,5 +105,6 @@ def run_worker(config):
     This function will setup logger and execute worker
     """
     setup_logger(config.get("rabbitmq_logging"))
+    configure_hashing(config.get("hashing"))
     arch_worker = RetimestampingWorker(config)
     arch_worker.run()
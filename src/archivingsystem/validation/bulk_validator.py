@@ -0,0 +1,299 @@
+import json
+import logging
+import smtplib
+import ssl
+from concurrent import futures
+from contextlib import closing
+from datetime import datetime
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from ..common.exceptions import WrongTaskCustomException
+from .validator import Validator
+
+logger = logging.getLogger("archiving_system_logging")
+
+DEFAULT_PAGE_SIZE = 500
+# max value of FileID column (INT)
+MAX_FILE_ID = 2147483647
+
+
+def format_bulk_task_message(
+    bulk_validation_id: str,
+    selection: dict,
+    recipients: list,
+    after_file_id: int = 0,
+):
+    task_message = {
+        "task": "validate_bulk",
+        "bulk_validation_id": bulk_validation_id,
+        "selection": selection,
+        "recipients": list(recipients),
+        "after_file_id": after_file_id,
+    }
+    return json.dumps(task_message)
+
+
+class BulkValidator:
+    """
+    BulkValidator validates many archived files as chain of
+    tasks, so no task stays unacknowledged for whole job.
+    Files are selected by FileID range, owner or time of last
+    validation, every task validates one page of bulk_page_size
+    files after FileID reached by previous task and publishes
+    task for next page. Records of the whole page (ArchivedFiles
+    and FilePackages) are read by two queries with IN (...) list,
+    files of the page are validated at once on executor shared
+    by worker and results are stored to FileValidations by one
+    query with id of job. Job in BulkValidations keeps FileID
+    of last validated page and counts of files, page is stored
+    only by task which continues after this FileID, so duplicate
+    tasks do not publish next page twice. If task fails after
+    its page was stored, job stays unfinished in BulkValidations.
+    Task of last page sends one report with results of all files
+    of job to every recipient.
+    selection (one of):
+        {file_id_from: 1, file_id_to: 1000}
+        {owner: 'user'}
+        {not_validated_since: '2026-01-01 00:00:00'}
+
+    on init it needs database library object, configuration
+    file with validation_info part, executor for files and
+    function which publishes message of next task, executor
+    for layers of packages can be given (see Validator)
+    """
+
+    def __init__(
+        self,
+        db_handler,
+        config: dict,
+        executor: futures.Executor,
+        publish_task,
+        layer_executor: futures.Executor = None,
+    ):
+        self.db_handler = db_handler
+        self.config = config
+        self.executor = executor
+        self.publish_task = publish_task
+        self.page_size = config.get("bulk_page_size", DEFAULT_PAGE_SIZE)
+        # records are prefetched here, validator does not use database
+        self.validator = Validator(None, config, layer_executor)
+
+    def validate_bulk(
+        self,
+        bulk_validation_id: str,
+        selection: dict,
+        recipients: list,
+        after_file_id: int = 0,
+    ):
+        """
+        Validates page of files matching selection after
+        after_file_id, publishes task for next page or sends
+        report of job to recipients after last page
+        """
+        logger.info(
+            "bulk validation %s of files: %s after FileID: %s",
+            bulk_validation_id,
+            str(selection),
+            str(after_file_id),
+        )
+        if not self._is_next_page(bulk_validation_id, after_file_id):
+            return "OK"
+        file_ids = self._get_file_id_page(selection, after_file_id)
+        validated, not_valid = self._validate_page(
+            bulk_validation_id, file_ids
+        )
+        last_page = len(file_ids) < self.page_size
+        last_file_id = file_ids[-1] if file_ids else after_file_id
+        if not self.db_handler.update_bulk_validation_progress(
+            bulk_validation_id,
+            after_file_id,
+            last_file_id,
+            validated,
+            not_valid,
+            datetime.now() if last_page else None,
+        ):
+            logger.warning(
+                "page of bulk validation %s after FileID: %s was stored by"
+                " other task",
+                bulk_validation_id,
+                str(after_file_id),
+            )
+            return "OK"
+        logger.info(
+            "bulk validation %s: %s files of page validated, %s not valid",
+            bulk_validation_id,
+            str(validated),
+            str(not_valid),
+        )
+        if last_page:
+            self._send_report(bulk_validation_id, selection, recipients)
+        else:
+            self.publish_task(
+                format_bulk_task_message(
+                    bulk_validation_id, selection, recipients, last_file_id
+                )
+            )
+        return "OK"
+
+    def _is_next_page(self, bulk_validation_id, after_file_id):
+        """
+        Returns true if job continues after after_file_id, task
+        of first page creates the job
+        """
+        if not after_file_id:
+            self.db_handler.create_bulk_validation(
+                bulk_validation_id, datetime.now()
+            )
+        job = self.db_handler.get_bulk_validation(bulk_validation_id)
+        if job is None:
+            logger.error("unknown bulk validation: %s", bulk_validation_id)
+            raise WrongTaskCustomException(
+                "unknown bulk validation: {}".format(bulk_validation_id)
+            )
+        if job["FinishedAt"] is not None or job["LastFileID"] != int(
+            after_file_id
+        ):
+            logger.warning(
+                "page of bulk validation %s after FileID: %s was already"
+                " validated, task is duplicate",
+                bulk_validation_id,
+                str(after_file_id),
+            )
+            return False
+        return True
+
+    def _get_file_id_page(self, selection, after_file_id):
+        with closing(
+            self._get_file_id_pages(selection, after_file_id)
+        ) as pages:
+            return next(pages, [])
+
+    def _get_file_id_pages(self, selection, after_file_id):
+        if "file_id_from" in selection or "file_id_to" in selection:
+            return self.db_handler.get_file_id_pages_in_range(
+                selection.get("file_id_from", 1),
+                selection.get("file_id_to", MAX_FILE_ID),
+                self.page_size,
+                after_file_id,
+            )
+        if "owner" in selection:
+            return self.db_handler.get_file_id_pages_of_owner(
+                selection["owner"], self.page_size, after_file_id
+            )
+        if "not_validated_since" in selection:
+            return self.db_handler.get_file_id_pages_not_validated_since(
+                datetime.fromisoformat(selection["not_validated_since"]),
+                self.page_size,
+                after_file_id,
+            )
+        logger.error("unknown selection of bulk validation: %s", selection)
+        raise WrongTaskCustomException(
+            "unknown selection of bulk validation: {}".format(selection)
+        )
+
+    def _validate_page(self, bulk_validation_id, file_ids):
+        """
+        Validates files of one page and stores their results,
+        returns number of validated files and number of files
+        which are not valid
+        """
+        if not file_ids:
+            return 0, 0
+        records = self.db_handler.get_archived_file_records_by_file_ids(
+            file_ids
+        )
+        file_packages = self.db_handler.get_file_package_records_by_file_ids(
+            file_ids
+        )
+        jobs = [
+            (
+                record,
+                self.executor.submit(
+                    self._validate_file,
+                    record,
+                    file_packages.get(record.FileID),
+                ),
+            )
+            for record in records.values()
+        ]
+        results = [(record.FileID, job.result()) for record, job in jobs]
+        self.db_handler.set_validation_results(
+            results, datetime.now(), bulk_validation_id
+        )
+        return len(results), sum(result is not True for _, result in results)
+
+    def _validate_file(self, archived_file_rec, file_packages):
+        # one broken file must not stop validation of others
+        if not file_packages:
+            return "archived file with id: {} has no file packages".format(
+                str(archived_file_rec.FileID)
+            )
+        try:
+            return self.validator.validate_record(
+                archived_file_rec, file_packages
+            )
+        except Exception as e:
+            logger.exception(
+                "validation of archived file with id: %s failed",
+                str(archived_file_rec.FileID),
+            )
+            return "validation of archived file with id: {} failed: {}".format(
+                str(archived_file_rec.FileID), str(e)
+            )
+
+    def _send_report(self, bulk_validation_id, selection, recipients):
+        job = self.db_handler.get_bulk_validation(bulk_validation_id)
+        not_valid_files = (
+            self.db_handler.get_not_valid_files_of_bulk_validation(
+                bulk_validation_id
+            )
+        )
+        contact = self.config["contact"]
+        sender_mail = contact["sender_email"]
+        text = """\
+        Result of bulk validation of archived files
+        Selection: {selection}
+        Started at: {started_at}, finished at: {finished_at}
+        Validated files: {validated}
+        Valid files: {valid}
+        Files which are not valid: {not_valid}
+        {failures}
+
+        If any file is not valid, please contact administrator.
+
+        DO NOT RESPOND TO THIS EMAIL! Contact details are below.
+
+        Contact details:
+        email: {email}
+        phone number: {phone}
+        """.format(
+            selection=selection,
+            started_at=job["StartedAt"].strftime("%Y-%m-%d %H:%M:%S"),
+            finished_at=job["FinishedAt"].strftime("%Y-%m-%d %H:%M:%S"),
+            validated=job["ValidatedCount"],
+            valid=job["ValidatedCount"] - job["NotValidCount"],
+            not_valid=job["NotValidCount"],
+            failures="\n        ".join(
+                "{} ({}): {}".format(file_name, owner_name, result)
+                for _, file_name, owner_name, result in not_valid_files
+            ),
+            email=contact["email"],
+            phone=contact["phone"],
+        )
+        logger.info(
+            "sending report of bulk validation to %s recipients",
+            str(len(recipients)),
+        )
+        context = ssl._create_unverified_context()
+        with smtplib.SMTP_SSL(
+            contact["email_server"], 465, context=context
+        ) as smtp_serv:
+            smtp_serv.login(sender_mail, contact["sender_password"])
+            for recipient in recipients:
+                msg = MIMEMultipart()
+                msg["Subject"] = "Bulk verification of validity of files"
+                msg["To"] = recipient
+                msg["From"] = sender_mail
+                msg.attach(MIMEText(text, "plain"))
+                smtp_serv.sendmail(sender_mail, [recipient], msg.as_string())
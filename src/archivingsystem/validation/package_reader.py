@@ -0,0 +1,146 @@
+import logging
+import os
+import tarfile
+from hashlib import sha512
+
+from ..common import hashing, package_index
+from ..common.exceptions import FileNotInDirectoryCustomException
+
+logger = logging.getLogger("archiving_system_logging")
+
+
+class PackageReader:
+    """
+    Read-only view of one layer of archived package, which is
+    uncompressed tar file on disk or tar member of outer layer.
+    Members are read as streams straight from the outermost
+    tar file (nested members are only seeked to), so nothing
+    is extracted and nothing is written to disk.
+    If package index is stored next to the package, layers are
+    read by IndexedTarFile and no tar header is parsed.
+    Reader of inner layer is valid only while readers of all
+    outer layers are open.
+    """
+
+    def __init__(self, tarf, name: str):
+        self.tarf = tarf
+        self.name = name
+
+    @classmethod
+    def open(cls, tar_path, name=None, index=None):
+        """
+        Opens tar file on disk as outermost layer, given index or
+        index stored next to the package is used if there is one
+        """
+        if index is None:
+            index = package_index.load_index(os.path.dirname(tar_path))
+        if index is not None and index["package"] == os.path.basename(
+            tar_path
+        ):
+            logger.debug("opening package %s by index", str(tar_path))
+            return cls(
+                package_index.IndexedTarFile.open(tar_path, index),
+                name or str(tar_path),
+            )
+        logger.debug("opening package %s", str(tar_path))
+        return cls(tarfile.open(tar_path, "r:"), name or str(tar_path))
+
+    def open_inner(self, member: tarfile.TarInfo):
+        """
+        Returns reader of tar member of this layer
+        """
+        logger.debug(
+            "opening inner package %s of %s", member.name, str(self.name)
+        )
+        if isinstance(self.tarf, package_index.IndexedTarFile):
+            return PackageReader(self.tarf.open_inner(member), member.name)
+        return PackageReader(
+            tarfile.open(fileobj=self._extractfile(member), mode="r:"),
+            member.name,
+        )
+
+    def find(self, name_part):
+        """
+        Returns first member in root of the layer whose name
+        contains name_part, same as searching in extracted
+        directory of the layer
+        """
+        for member in self.tarf.getmembers():
+            if "/" not in member.name and name_part in member.name:
+                return member
+        logger.error(
+            "no file with given file name: %s was found in package: %s",
+            str(name_part),
+            str(self.name),
+        )
+        raise FileNotInDirectoryCustomException(
+            "No files with given name in package. name: {}".format(name_part)
+        )
+
+    def get(self, name):
+        """
+        Returns member with exact name (path inside the layer)
+        or None if there is no such member
+        """
+        try:
+            return self.tarf.getmember(name)
+        except KeyError:
+            return None
+
+    def read(self, member: tarfile.TarInfo):
+        """
+        Returns bytes of small member (timestamp, signature,
+        certificate)
+        """
+        with self._extractfile(member) as f:
+            return f.read()
+
+    def get_file(self, name):
+        """
+        Returns member with exact name, raises FileNotInDirectory
+        exception if there is no such member
+        """
+        member = self.get(name)
+        if member is None:
+            logger.error(
+                "file %s was not found in package %s",
+                str(name),
+                str(self.name),
+            )
+            raise FileNotInDirectoryCustomException(
+                "No file in package. name: {}".format(name)
+            )
+        return member
+
+    def read_file(self, name):
+        """
+        Returns bytes of member with exact name
+        """
+        return self.read(self.get_file(name))
+
+    def hash_member(self, member: tarfile.TarInfo, hash=sha512):
+        """
+        Returns digest of member data, data are streamed through
+        hash function in blocks
+        """
+        with self._extractfile(member) as f:
+            return hashing.hash_stream(
+                hash, f, name="{}:{}".format(self.name, member.name)
+            )
+
+    def close(self):
+        self.tarf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _extractfile(self, member):
+        f = self.tarf.extractfile(member)
+        if f is None:
+            raise FileNotInDirectoryCustomException(
+                "Member of package is not a file. name: {}".format(member.name)
+            )
+        return f
@@ -1,11 +1,22 @@
+import functools
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
 
 from ..common.exception_wrappers import task_exceptions_wrapper
 from ..common.exceptions import WrongTaskCustomException
+from ..common.hashing import configure_hashing
 from ..common.setup_logger import setup_logger
-from ..database.db_library import DatabaseHandler, MysqlConnection
-from ..rabbitmq_connection.task_consumer import ConnectionMaker, TaskConsumer
+from ..database.connection_pool import MysqlConnectionPool
+from ..database.db_library import DatabaseHandler
+from ..rabbitmq_connection.task_consumer import (
+    ConnectionMaker,
+    TaskConsumer,
+    get_tasks_in_flight,
+    publish_task,
+)
+from .bulk_validator import BulkValidator
 from .validator import Validator
 
 # from contextlib import closing - was unused
@@ -21,20 +32,54 @@ class ValidationWorker:
     It will set callback function to consumer before
     starting him.
     All exceptions known possible exceptions are catched
-    in exception wrappers
+    in exception wrappers.
+    With execution_mode: process in rabbitmq_info, tasks are
+    executed in worker processes, each of them has its own
+    ValidationWorker (see _init_worker_process)
+    With layer_pool_size in validation_info, layers of packages
+    are validated in parallel on pool of threads shared by tasks
+    Files of validate_bulk task are validated on pool of
+    bulk_pool_size threads, task of every page publishes task
+    of next page to the task queue (see BulkValidator)
     """
 
     def __init__(self, config):
+        self.config = config
         self.db_config = config.get("db_config")
-        self.rmq_config = config.get("rabbitmq_connection")
-        self.connection = ConnectionMaker(self.rmq_config)
-        self.task_consumer = TaskConsumer(
-            self.connection, config.get("rabbitmq_info")
+        self.db_pool = MysqlConnectionPool(
+            self.db_config,
+            config.get("db_pool"),
+            get_tasks_in_flight(config.get("rabbitmq_info")),
         )
-        self.task_consumer.set_callback(self.validate)
+        self.rmq_config = config.get("rabbitmq_connection")
         self.validation_config = config.get("validation_info")
+        self.layer_executor = None
+        layer_pool_size = self.validation_config.get("layer_pool_size")
+        if layer_pool_size:
+            self.layer_executor = ThreadPoolExecutor(
+                max_workers=layer_pool_size,
+                thread_name_prefix="layer_validation",
+            )
+        self.bulk_executor = ThreadPoolExecutor(
+            max_workers=self.validation_config.get("bulk_pool_size", 4),
+            thread_name_prefix="bulk_validation",
+        )
 
     def run(self):
+        rabbitmq_info = self.config.get("rabbitmq_info")
+        self.connection = ConnectionMaker(self.rmq_config)
+        self.task_consumer = TaskConsumer(self.connection, rabbitmq_info)
+        if rabbitmq_info.get("execution_mode", "thread") == "process":
+            self.task_consumer.set_callback(
+                _validate_in_worker_process,
+                process_initializer=_init_worker_process,
+                initargs=(self.config,),
+            )
+        else:
+            self.task_consumer.set_callback(self.validate)
+            self.task_consumer.add_metrics_source(
+                "db_pool", self.db_pool.get_metrics
+            )
         logger.info("starting validation task consumer")
         self.task_consumer.start()
 
@@ -47,11 +92,20 @@ class ValidationWorker:
         """
         logger.debug("recieved task with body: %s", str(jbody))
 
-        logger.debug("creating database connection")
-        with MysqlConnection(self.db_config) as db_connection:
+        logger.debug("getting database connection from pool")
+        with self.db_pool.connection() as db_connection:
             db_handler = DatabaseHandler(db_connection)
-            validator = Validator(db_handler, self.validation_config)
-            files_info, recipients = self._parse_message_body(jbody)
+            body = self._parse_message_body(jbody)
+            recipients = body.get("recipients")
+            if body.get("task") == "validate_bulk":
+                return self._validate_bulk(db_handler, body, recipients)
+
+            validator = Validator(
+                db_handler,
+                self.validation_config,
+                self.layer_executor,
+            )
+            files_info = body.get("files_info")
 
             logger.debug(
                 "executing validation of these files: %s \nfor recipients: %s",
@@ -61,9 +115,32 @@ class ValidationWorker:
             result = validator.validate(files_info, recipients)
         return result
 
+    def _validate_bulk(self, db_handler, body, recipients):
+        selection = body.get("selection")
+        if not selection:
+            raise WrongTaskCustomException("bulk task without selection")
+        bulk_validator = BulkValidator(
+            db_handler,
+            self.validation_config,
+            self.bulk_executor,
+            functools.partial(
+                publish_task,
+                ConnectionMaker(self.rmq_config),
+                self.config.get("rabbitmq_info").get("task_queue"),
+            ),
+            self.layer_executor,
+        )
+        return bulk_validator.validate_bulk(
+            # task published before tasks were chained has no id
+            body.get("bulk_validation_id") or str(uuid4()),
+            selection,
+            recipients,
+            body.get("after_file_id", 0),
+        )
+
     def _parse_message_body(self, body):
         body = json.loads(body)
-        if not body.get("task") == "validate":
+        if body.get("task") not in ("validate", "validate_bulk"):
             logger.warning(
                 "incorrect task for validation worker, task: %s",
                 str(body.get("task")),
@@ -73,7 +150,22 @@ class ValidationWorker:
                     str(body.get("task"))
                 ),
             )
-        return body.get("files_info"), body.get("recipients")
+        return body
+
+
+# worker of current process in process execution mode
+_process_worker = None
+
+
+def _init_worker_process(config):
+    global _process_worker
+    setup_logger(config.get("rabbitmq_logging"))
+    configure_hashing(config.get("hashing"))
+    _process_worker = ValidationWorker(config)
+
+
+def _validate_in_worker_process(jbody):
+    return _process_worker.validate(jbody)
 
 
 def run_worker(config):
@@ -81,5 +173,6 @@ def run_worker(config):
     This function will setup logger and execute worker
     """
     setup_logger(config.get("rabbitmq_logging"))
+    configure_hashing(config.get("hashing"))
     arch_worker = ValidationWorker(config)
     arch_worker.run()
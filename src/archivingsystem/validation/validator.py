@@ -1,19 +1,22 @@
 import base64
 import logging
-import ntpath
 import os
 import smtplib
 import ssl
-import tarfile
-from contextlib import closing
+from concurrent import futures
+from contextlib import ExitStack, closing
+from datetime import datetime
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from hashlib import sha512
-from tempfile import TemporaryDirectory
 
+from cryptography import x509
 from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
 
+from ..common import merkle, package_index
 from ..common import utils as common_utils
+from ..common.crl_cache import parse_crl
 from ..common.exceptions import (
     ArchivedFileNotValidCustomException,
     CertificateNotValidCustomException,
@@ -25,6 +28,8 @@ from ..common.exceptions import (
     WrongPathToArchivedFileCustomException,
     WrongTaskCustomException,
 )
+from ..common.timestamp_verifier import TimestampVerifier
+from .package_reader import PackageReader
 
 logger = logging.getLogger("archiving_system_logging")
 
@@ -38,12 +43,26 @@ class Validator:
 
     on init it needs database library object and
     configuration file. Example could be found
-    in example_config and it needs validation_info part
+    in example_config and it needs validation_info part.
+    Timestamps are verified locally by TimestampVerifier with
+    TSA certificates stored in package, TSA is not contacted
+    Packages are not extracted, every layer is read by
+    PackageReader as stream of the outermost tar file
+    If executor (e.g. ThreadPoolExecutor shared by worker) is
+    given, layers are validated in parallel on it, see
+    _validate_packages_parallel
     """
 
-    def __init__(self, db_handler, config: dict):
+    def __init__(
+        self,
+        db_handler,
+        config: dict,
+        layer_executor: futures.Executor = None,
+    ):
         self.db_handler = db_handler
         self.config = config
+        self.ts_verifier = TimestampVerifier()
+        self.layer_executor = layer_executor
 
     def validate(self, file_info, recipients):
         """
@@ -57,18 +76,32 @@ class Validator:
         file_packages = self._get_all_sorted_filepackage_records(
             archived_file_rec.FileID
         )
+        result = self.validate_record(archived_file_rec, file_packages)
+        self.db_handler.set_validation_results(
+            [(archived_file_rec.FileID, result)], datetime.now()
+        )
+
+        self._send_results(result, recipients, archived_file_rec.FileName)
+        return "OK"
+
+    def validate_record(self, archived_file_rec, file_packages):
+        """
+        Validates package of archived file with its records from
+        database (file packages sorted from the newest).
+        Returns True if file is valid, otherwise message with
+        result of validation
+        """
         tar_path = self._get_file_path_from_dir(
             archived_file_rec.PackageStoragePath, "Package"
         )
+        if self.layer_executor is not None:
+            validate_packages = self._validate_packages_parallel
+        else:
+            validate_packages = self._validate_packages
         try:
-            with TemporaryDirectory() as temp_dir:
-                logger.debug(
-                    "temporary directory for verification created at: %s",
-                    str(temp_dir),
-                )
-                result = self._validate_packages(
-                    tar_path, temp_dir, file_packages, archived_file_rec
-                )
+            result = validate_packages(
+                tar_path, file_packages, archived_file_rec
+            )
         except OriginalFileNotValidError:
             result = (
                 "archived file with id: {} isnt valid in remote location,"
@@ -83,9 +116,7 @@ class Validator:
                 .format(str(archived_file_rec.FileID))
             )
             logger.warning(result)
-
-        self._send_results(result, recipients, archived_file_rec.FileName)
-        return "OK"
+        return result
 
     def _get_archive_record(self, file_info):
         logger.debug("getting archived file info: %s", str(file_info))
@@ -117,136 +148,243 @@ class Validator:
         file_recs.sort(key=lambda x: x.IssuingDate, reverse=True)
         return file_recs
 
-    def _validate_packages(
-        self, tar_path, temp_dir, file_packages, archived_file_rec
-    ):
+    def _validate_packages(self, tar_path, file_packages, archived_file_rec):
         num = 0
         validation_complete = False
         logger.info("validating archived file")
-        while validation_complete is not True:
-            logger.debug("validating package from path: %s", str(tar_path))
-            if "Package1.tar" in tar_path:
-                try:
-                    result = self._validate_initial_package(
-                        tar_path,
-                        temp_dir,
-                        file_packages[num],
-                        archived_file_rec,
+        with ExitStack() as layers:
+            package = layers.enter_context(PackageReader.open(tar_path))
+            package_hash = common_utils.get_file_hash(sha512, tar_path)
+            while validation_complete is not True:
+                logger.debug("validating package: %s", str(package.name))
+                if "Package1.tar" in package.name:
+                    try:
+                        result = self._validate_initial_package(
+                            package,
+                            package_hash,
+                            file_packages[num],
+                            archived_file_rec,
+                        )
+                        validation_complete = True
+                        logger.info("validation of initial package complete")
+                    except (
+                        TimestampInvalidCustomException,
+                        DigestsNotMatchedCustomException,
+                        InvalidSignature,
+                        FileNotInDirectoryCustomException,
+                        CertificateNotValidCustomException,
+                    ):
+                        logger.warning("package invalid")
+                        raise ArchivedFileNotValidCustomException(
+                            "package invalid"
+                        )
+                elif "PackageF" in package.name:
+                    try:
+                        inner_member, package_hash = self._validate_package(
+                            package, package_hash, file_packages[num]
+                        )
+                        package = layers.enter_context(
+                            package.open_inner(inner_member)
+                        )
+                        logger.info("validation of onion package complete")
+                    except (
+                        TimestampInvalidCustomException,
+                        DigestsNotMatchedCustomException,
+                        FileNotInDirectoryCustomException,
+                        CertificateNotValidCustomException,
+                    ):
+                        logger.exception(
+                            "package is invalid: %s", package.name
+                        )
+                        raise ArchivedFileNotValidCustomException(
+                            "package is invalid: {}".format(package.name)
+                        )
+                else:
+                    logger.exception(
+                        "Path to package for validation isnt correct: %s",
+                        package.name,
                     )
-                    validation_complete = True
-                    logger.info("validation of initial package complete")
-                except (
-                    TimestampInvalidCustomException,
-                    DigestsNotMatchedCustomException,
-                    InvalidSignature,
-                    FileNotInDirectoryCustomException,
-                    CertificateNotValidCustomException,
-                ):
-                    logger.warning("package invalid")
-                    raise ArchivedFileNotValidCustomException(
-                        "package invalid"
+                    raise WrongPathToArchivedFileCustomException(
+                        "Path to package for validation isnt correct: {}"
+                        .format(package.name)
+                    )
+                num += 1
+        return result
+
+    def _validate_packages_parallel(
+        self, tar_path, file_packages, archived_file_rec
+    ):
+        """
+        Builds chain of layers first and then verifies hashes,
+        timestamps and CRLs of all layers at once on layer_executor.
+        Hash of layer is checked against database when job of
+        outer layer (which hashes it as its member) is done,
+        results are combined from the outermost layer, so the
+        first error is the same as in _validate_packages.
+        Layers are read through package index (built in memory
+        if none is stored), its reads are safe from more threads
+        """
+        logger.info("validating archived file, layers in parallel")
+        index = package_index.load_index(os.path.dirname(tar_path))
+        if index is None or index["package"] != os.path.basename(tar_path):
+            index = package_index.build_index(tar_path)
+        with ExitStack() as layers:
+            chain, inner_members = self._open_layer_chain(
+                layers, PackageReader.open(tar_path, index=index)
+            )
+            jobs = []
+            try:
+                jobs.append(
+                    self.layer_executor.submit(
+                        common_utils.get_file_hash, sha512, tar_path
                     )
-            elif "PackageF" in tar_path:
-                try:
-                    tar_path = self._validate_package(
-                        tar_path, temp_dir, file_packages[num]
+                )
+                for package, inner_member in zip(chain, inner_members):
+                    jobs.append(
+                        self.layer_executor.submit(
+                            self._verify_onion_layer, package, inner_member
+                        )
                     )
-                    logger.info("validation of onion package complete")
-                except (
-                    TimestampInvalidCustomException,
-                    DigestsNotMatchedCustomException,
-                    FileNotInDirectoryCustomException,
-                    CertificateNotValidCustomException,
-                ):
-                    logger.exception("package is invalid: %s", tar_path)
-                    raise ArchivedFileNotValidCustomException(
-                        "package is invalid: {}".format(tar_path)
+                jobs.append(
+                    self.layer_executor.submit(
+                        self._verify_initial_layer,
+                        chain[-1],
+                        archived_file_rec,
                     )
-            else:
+                )
+                return self._combine_layer_results(
+                    chain, jobs, file_packages
+                )
+            finally:
+                # readers must stay open until all jobs are finished
+                for job in jobs:
+                    job.cancel()
+                futures.wait(jobs)
+
+    def _open_layer_chain(self, layers, package):
+        chain = [layers.enter_context(package)]
+        inner_members = []
+        while "Package1.tar" not in package.name:
+            if "PackageF" not in package.name:
                 logger.exception(
                     "Path to package for validation isnt correct: %s",
-                    tar_path,
+                    package.name,
                 )
                 raise WrongPathToArchivedFileCustomException(
-                    "Path to package for validation isnt correct: {}".format(
-                        tar_path
-                    )
+                    "Path to package for validation isnt correct: {}"
+                    .format(package.name)
                 )
-            num += 1
-        return result
-
-    def _validate_package(self, tar_path, temp_dir, file_package):
-        logger.debug("validating package %s hashes with db", str(tar_path))
-        self._verify_package_hashes(
-            file_package.PackageHashSha512,
-            common_utils.get_file_hash(sha512, tar_path),
-        )
-        temp_extracted_package_path = self._extract_tar_to_temp_dir(
-            tar_path, temp_dir
-        )
+            try:
+                inner_member = package.find("Package")
+            except FileNotInDirectoryCustomException:
+                logger.exception("package is invalid: %s", package.name)
+                raise ArchivedFileNotValidCustomException(
+                    "package is invalid: {}".format(package.name)
+                )
+            inner_members.append(inner_member)
+            package = layers.enter_context(package.open_inner(inner_member))
+            chain.append(package)
+        logger.debug("validating chain of %s packages", str(len(chain)))
+        return chain, inner_members
+
+    def _combine_layer_results(self, chain, jobs, file_packages):
+        package_hash = jobs[0].result()
+        for num, package in enumerate(chain):
+            initial = num == len(chain) - 1
+            try:
+                self._verify_package_hashes(
+                    file_packages[num].PackageHashSha512, package_hash
+                )
+                result = jobs[num + 1].result()
+            except (
+                TimestampInvalidCustomException,
+                DigestsNotMatchedCustomException,
+                InvalidSignature,
+                FileNotInDirectoryCustomException,
+                CertificateNotValidCustomException,
+            ):
+                logger.exception("package is invalid: %s", package.name)
+                raise ArchivedFileNotValidCustomException(
+                    "package is invalid: {}".format(package.name)
+                )
+            if initial:
+                logger.info("validation of initial package complete")
+                return result
+            logger.info("validation of onion package complete")
+            package_hash = result
 
+    def _verify_onion_layer(self, package, inner_member):
+        """
+        Verifies timestamp and CRL of PackageF layer and returns
+        hash of package wrapped in it
+        """
         logger.info("verifying timestamp and certificate")
-        self._verify_package_timestamp(temp_extracted_package_path)
+        inner_hash = package.hash_member(inner_member)
+        self._verify_timestamp(package, "timestamp", inner_hash)
         self._verify_certificate_with_crl(
-            temp_extracted_package_path, "tsa_cert_crl.crl", "tsa_ca_cert.pem"
+            package, "tsa_cert_crl.crl", "tsa_ca_cert.pem"
         )
-        return self._get_file_path_from_dir(
-            temp_extracted_package_path, "Package"
+        return inner_hash
+
+    def _validate_package(self, package, package_hash, file_package):
+        logger.debug("validating package %s hashes with db", package.name)
+        self._verify_package_hashes(
+            file_package.PackageHashSha512, package_hash
         )
+        inner_member = package.find("Package")
+        return inner_member, self._verify_onion_layer(package, inner_member)
 
     def _validate_initial_package(
-        self, package_path, temp_dir, file_package, archived_file_rec
+        self, package1, package1_hash, file_package, archived_file_rec
     ):
-        logger.info("getting package1 hash and verifing it")
-        package1_hash = common_utils.get_file_hash(sha512, package_path)
+        logger.info("verifying package1 hash")
         self._verify_package_hashes(
             file_package.PackageHashSha512, package1_hash
         )
+        return self._verify_initial_layer(package1, archived_file_rec)
 
-        logger.info("extracting package1")
-        extract_path = self._extract_tar_to_temp_dir(package_path, temp_dir)
-
+    def _verify_initial_layer(self, package1, archived_file_rec):
+        """
+        Verifies content of package1 (package0, signature, timestamps,
+        CRL and original file), hash of package1 itself is not checked
+        """
         logger.info("getting package0 hash and verifing it")
-        package0_path = self._get_file_path_from_dir(extract_path, "Package0")
-        package0_hash = common_utils.get_file_hash(sha512, package0_path)
+        package0_member = package1.find("Package0")
+        package0_hash = package1.hash_member(package0_member)
         self._verify_package_hashes(
             archived_file_rec.Package0HashSha512, package0_hash
         )
 
         logger.info("verifying signature and its timestamp")
         hash_signature = self._verify_signature(
-            extract_path,
+            package1,
             package0_hash,
             archived_file_rec.SignatureHashSha512,
         )
-        self._verify_timestamp(extract_path, "timestamp1", hash_signature)
-
-        logger.info("extracting package0")
-        extrack_pack0_path = self._extract_tar_to_temp_dir(
-            package0_path, "Package0", temp_dir
-        )
+        self._verify_timestamp(package1, "timestamp1", hash_signature)
 
-        logger.info(
-            "verifying archived file package hash with hash from database"
-        )
-        hash_archived_file = common_utils.get_file_hash(
-            sha512,
-            os.path.join(extrack_pack0_path, archived_file_rec.FileName),
-        )
-        self._verify_package_hashes(
-            archived_file_rec.OriginFileHashSha512, hash_archived_file
-        )
+        logger.info("reading package0")
+        with package1.open_inner(package0_member) as package0:
+            logger.info(
+                "verifying archived file package hash with hash from database"
+            )
+            hash_archived_file = package0.hash_member(
+                package0.get_file(archived_file_rec.FileName)
+            )
+            self._verify_package_hashes(
+                archived_file_rec.OriginFileHashSha512, hash_archived_file
+            )
 
-        self._verify_timestamp(
-            extrack_pack0_path, "timestamp0", hash_archived_file
-        )
+            self._verify_timestamp(
+                package0, "timestamp0", hash_archived_file, package1
+            )
 
         logger.info("verifying certificates")
         self._verify_certificate_with_crl(
-            extract_path, "tsa_cert_crl.crl", "tsa_ca_cert.pem"
+            package1, "tsa_cert_crl.crl", "tsa_ca_cert.pem"
         )
         # self._verify_certificate_with_crl( - to validate our own CRL
-        #     extract_path, "signing_cert_crl.crl", "signing_cert.pem"
+        #     package1, "signing_cert_crl.crl", "signing_cert.pem"
         # )
 
         logger.info(
@@ -296,25 +434,13 @@ class Validator:
             )
             smtp_serv.sendmail(sender_mail, recipients, msg.as_string())
 
-    def _extract_tar_to_temp_dir(self, tar_path, temp_dir_path):
-        tar_name = self.__get_file_name(tar_path)
-        extract_path = os.path.join(temp_dir_path, tar_name)
-        logger.debug(
-            "extracting tar package from path: %s to temp dir: %s",
-            tar_path,
-            extract_path,
-        )
-        with tarfile.open(tar_path, "r:") as tarf:
-            tarf.extractall(path=extract_path)
-        return extract_path
-
     def _verify_package_hashes(self, db_hash, package_hash):
         logger.debug(
             "hash from db: %s \n hash of package file: %s",
             str(db_hash),
             str(package_hash),
         )
-        if db_hash != base64.b64encode(package_hash):
+        if db_hash != package_hash:
             logger.exception(
                 "hash from db and hash of package file do not match"
             )
@@ -323,54 +449,62 @@ class Validator:
             )
         logger.info("hash from db and hash of package file matched")
 
-    def _verify_package_timestamp(self, pack_path):
-        data_path = self._get_file_path_from_dir(pack_path, "Package")
-        logger.debug(
-            "getting hash of package to verify from path %s",
-            str(data_path),
-        )
-        data = common_utils.get_file_hash(sha512, data_path)
-        logger.info("verifying package timestamp")
-        self._verify_timestamp(pack_path, "timestamp", data)
-
-    def _verify_signature(self, extract_path, signed_data, signature_hash_db):
-        signature_path = os.path.join(extract_path, "signature.sig")
-        logger.debug(
-            "getting hash of signature from path %s",
-            str(signature_path),
-        )
-        hash_signature = common_utils.get_file_hash(sha512, signature_path)
+    def _verify_signature(self, package, signed_data, signature_hash_db):
+        logger.debug("reading signature from package %s", package.name)
+        signature = package.read(package.find("signature.sig"))
+        hash_signature = sha512(signature).digest()
         self._verify_package_hashes(signature_hash_db, hash_signature)
 
-        signature = common_utils.load_data(signature_path)
-        certs_folder_path = os.path.join(extract_path, "certificate_files")
-        cert_path = self._get_file_path_from_dir(
-            certs_folder_path, "signing_cert.pem"
+        logger.debug("loading signing certificate from package")
+        cert = x509.load_pem_x509_certificate(
+            package.read_file("certificate_files/signing_cert.pem"),
+            default_backend(),
         )
-
-        logger.debug("loading certificate from path %s", str(cert_path))
-        cert = common_utils.get_certificate(cert_path)
         common_utils.validate_signature(
             signed_data, base64.b64decode(signature), cert.public_key()
         )
         return hash_signature
 
-    def _verify_timestamp(self, dir_path, file_name, data):
+    def _verify_timestamp(self, package, file_name, data, cert_package=None):
+        # package0 has no certificates, they are in package1
+        cert_package = cert_package or package
         logger.info("verification of timestamp")
-        ts_path = self._get_file_path_from_dir(dir_path, file_name)
+        ts_member = package.find(file_name)
         logger.info("loading timestamp")
-        ts = common_utils.load_data(ts_path)
+        ts = package.read(ts_member)
+        data = self._get_merkle_root_if_batched(package, file_name, data)
+        tsa_cert = cert_package.read_file("certificate_files/tsa_cert.crt")
+        ca_cert = cert_package.read_file("certificate_files/tsa_ca_cert.pem")
         logger.info("verifying timestamp")
-        if not (
-            common_utils.verify_timestamp(ts, data, self.config["TSA_info"])
-        ):
+        if not (self.ts_verifier.verify(ts, data, tsa_cert, ca_cert)):
             logger.exception(
-                "Timestamp invalid, timestamp path: %s",
-                str(ts_path),
+                "Timestamp invalid, timestamp: %s in package: %s",
+                ts_member.name,
+                package.name,
             )
             raise TimestampInvalidCustomException("Timestamp invalid")
         logger.info("timestamp is valid")
 
+    def _get_merkle_root_if_batched(self, package, ts_name, data):
+        # packages archived in batch have timestamp of merkle root,
+        # root is computed from data and stored inclusion proof
+        proof_name = ts_name.replace("timestamp", "inclusion_proof")
+        proof_member = package.get(proof_name)
+        if proof_member is None:
+            return data
+        logger.info(
+            "verifying inclusion proof %s in package %s",
+            proof_name,
+            package.name,
+        )
+        try:
+            return merkle.compute_root(
+                data, merkle.load_proof(package.read(proof_member))
+            )
+        except (ValueError, KeyError, TypeError):
+            logger.exception("Inclusion proof is invalid: %s", proof_name)
+            raise TimestampInvalidCustomException("Inclusion proof invalid")
+
     def _get_file_path_from_dir(self, dir_path, file_name):
         logger.debug(
             "searching for file: %s in directory: %s",
@@ -391,15 +525,15 @@ class Validator:
             )
         return os.path.join(dir_path, files[0])
 
-    def _verify_certificate_with_crl(self, dir_path, crl_name, cert_name):
-        crl = common_utils.load_data(
-            os.path.join(dir_path, "certificate_files", crl_name)
+    def _verify_certificate_with_crl(self, package, crl_name, cert_name):
+        crl = parse_crl(package.read_file("certificate_files/" + crl_name))
+        ca = x509.load_pem_x509_certificate(
+            package.read_file("certificate_files/" + cert_name),
+            default_backend(),
         )
 
         logger.info("verifying used certificate with crl")
-        common_utils.validate_certificate(
-            crl, os.path.join(dir_path, "certificate_files", cert_name)
-        )
+        common_utils.validate_certificate_with_crl(crl, ca)
 
     def _verify_original_file(self, archived_file_hash, origin_path):
         logger.info("verifying original file hash with archived")
@@ -444,13 +578,3 @@ class Validator:
                 raise UnableToGetRemoteFileDigestCustomException(
                     "Unable to get remote file digest"
                 )
-
-    def __get_file_name(self, path):
-        head, tail = ntpath.split(path)
-        logger.debug(
-            "getting file name from path, splited path head: %s,"
-            " tail(should be name) %s ",
-            str(head),
-            str(tail),
-        )
-        return tail or ntpath.basename(head)
@@ -0,0 +1,158 @@
+import base64
+import os
+import sys
+import time
+import uuid
+from contextlib import closing
+from datetime import datetime, timedelta
+from hashlib import sha512
+
+from archivingsystem.common.yaml_parser import parse_yaml_config
+from archivingsystem.database.archived_file import ArchivedFile
+from archivingsystem.database.db_library import (
+    DatabaseHandler,
+    MysqlConnection,
+)
+
+DEFAULT_COUNT = 1000
+
+# queries as they were built before prepared statements (str.format
+# with base64 text inlined in statement), kept here for comparison
+LEGACY_QUERY_INSERT_INTO_ARCHIVED_FILES = (
+    "INSERT into ArchivedFiles(FileName, OwnerName, OriginalFilePath,"
+    " PackageStoragePath, OriginFileHashSha512, TimeOfFirstTS, SigningCert,"
+    " SignatureHashSha512, Package0HashSha512, ExpirationDateTS) Values('{}',"
+    " '{}', '{}', '{}', {}, '{}', {}, {}, {},'{}');"
+)
+LEGACY_QUERY_ALL_COLUMNS_ON_FILEID_ARCHIVED_FILES = (
+    "select * from ArchivedFiles where FileID = {};"
+)
+QUERY_FILEIDS_OF_OWNER = (
+    "select FileID from ArchivedFiles where OwnerName = %s"
+)
+QUERY_DELETE_OWNER = "delete from ArchivedFiles where OwnerName = %s"
+
+
+def raise_system_exit():
+    raise SystemExit(
+        f"Usage: {sys.argv[0]} <path to yaml config with db_config>"
+        " [number of records]"
+    )
+
+
+def make_record(owner, number, signing_cert):
+    record = ArchivedFile()
+    record.FileName = "benchmark_{}.bin".format(number)
+    record.OwnerName = owner
+    record.OriginalFilePath = "/benchmark/{}".format(number)
+    record.PackageStoragePath = "/benchmark/archive/{}".format(number)
+    record.OriginFileHashSha512 = sha512(os.urandom(32)).digest()
+    record.TimeOfFirstTS = datetime.now().replace(microsecond=0)
+    record.SigningCert = signing_cert
+    record.SignatureHashSha512 = sha512(os.urandom(32)).digest()
+    record.Package0HashSha512 = sha512(os.urandom(32)).digest()
+    record.ExpirationDateTS = record.TimeOfFirstTS + timedelta(days=365)
+    return record
+
+
+def legacy_insert(db_connection, record):
+    query = LEGACY_QUERY_INSERT_INTO_ARCHIVED_FILES.format(
+        record.FileName,
+        record.OwnerName,
+        record.OriginalFilePath,
+        record.PackageStoragePath,
+        repr(base64.b64encode(record.OriginFileHashSha512).decode()),
+        record.TimeOfFirstTS.strftime("%Y-%m-%d %H:%M:%S"),
+        repr(base64.b64encode(record.SigningCert).decode()),
+        repr(base64.b64encode(record.SignatureHashSha512).decode()),
+        repr(base64.b64encode(record.Package0HashSha512).decode()),
+        record.ExpirationDateTS.strftime("%Y-%m-%d %H:%M:%S"),
+    )
+    with closing(db_connection.cursor()) as cursor:
+        cursor.execute(query)
+        db_connection.commit()
+
+
+def legacy_select(db_connection, file_id):
+    with closing(db_connection.cursor()) as cursor:
+        cursor.execute(
+            LEGACY_QUERY_ALL_COLUMNS_ON_FILEID_ARCHIVED_FILES.format(file_id)
+        )
+        return cursor.fetchall()
+
+
+def get_file_ids(db_connection, owner):
+    with closing(db_connection.cursor()) as cursor:
+        cursor.execute(QUERY_FILEIDS_OF_OWNER, (owner,))
+        return [row[0] for row in cursor.fetchall()]
+
+
+def delete_records(db_connection, owner):
+    with closing(db_connection.cursor()) as cursor:
+        cursor.execute(QUERY_DELETE_OWNER, (owner,))
+        db_connection.commit()
+
+
+def measure(name, function, items):
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    elapsed = time.perf_counter() - start
+    print(
+        "{:<28} {:8.3f} s  {:10.1f} ops/s".format(
+            name, elapsed, len(items) / elapsed
+        )
+    )
+
+
+def main():
+    """
+    Compares insert and select throughput of str.format queries
+    with inlined base64 values (before) and prepared statements
+    with bound binary values (DatabaseHandler) on records of
+    ArchivedFiles table. Created records are deleted at the end
+    """
+    if len(sys.argv) < 2:
+        raise_system_exit()
+    config = parse_yaml_config(sys.argv[1])
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_COUNT
+    signing_cert = os.urandom(1800)  # size of typical PEM certificate
+
+    with MysqlConnection(config["db_config"]) as db_connection:
+        db_handler = DatabaseHandler(db_connection)
+        legacy_owner = "benchmark-" + str(uuid.uuid4())
+        prepared_owner = "benchmark-" + str(uuid.uuid4())
+        try:
+            measure(
+                "insert str.format",
+                lambda r: legacy_insert(db_connection, r),
+                [
+                    make_record(legacy_owner, i, signing_cert)
+                    for i in range(count)
+                ],
+            )
+            measure(
+                "insert prepared",
+                db_handler.create_new_record_archived_file,
+                [
+                    make_record(prepared_owner, i, signing_cert)
+                    for i in range(count)
+                ],
+            )
+            measure(
+                "select str.format",
+                lambda file_id: legacy_select(db_connection, file_id),
+                get_file_ids(db_connection, legacy_owner),
+            )
+            measure(
+                "select prepared",
+                db_handler.get_specific_archived_file_record_by_file_id,
+                get_file_ids(db_connection, prepared_owner),
+            )
+        finally:
+            delete_records(db_connection, legacy_owner)
+            delete_records(db_connection, prepared_owner)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+from hashlib import sha512
+from shutil import copy2
+from tempfile import TemporaryDirectory
+
+from archivingsystem.common import utils as common_utils
+
+# file sizes in MB, from 1 MB to 10 GB
+DEFAULT_SIZES = [1, 10, 100, 1024, 10240]
+
+
+def raise_system_exit():
+    raise SystemExit(
+        f"Usage: {sys.argv[0]} <directory on filesystem of archiving"
+        " storage> [file sizes in MB...]"
+    )
+
+
+def create_source_file(path, size_mb):
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+
+
+def copy2_with_hashes(src, dst):
+    # original archiving path: hash source, copy2, hash copy
+    common_utils.get_file_hash(sha512, src)
+    copy2(src, dst)
+    common_utils.get_file_hash(sha512, dst)
+
+
+def kernel_with_hash(src, dst):
+    common_utils.copy_file_kernel(src, dst)
+    common_utils.get_file_hash(sha512, dst)
+
+
+def measure(function, src, dst):
+    start = time.perf_counter()
+    function(src, dst)
+    elapsed = time.perf_counter() - start
+    os.remove(dst)
+    return elapsed
+
+
+def main():
+    """
+    Compares copy2 with kernel copy backend on files of given
+    sizes. Directory should be on the same filesystem as
+    archiving_storage_path, results depend on page cache state
+    """
+    if len(sys.argv) < 2:
+        raise_system_exit()
+    sizes = [int(size) for size in sys.argv[2:]] or DEFAULT_SIZES
+    benchmarks = [
+        ("copy2", copy2),
+        ("copy2 + 2x hash", copy2_with_hashes),
+        ("stream (hash while copy)", common_utils.copy_file_with_hash),
+        ("kernel", common_utils.copy_file_kernel),
+        ("kernel + hash", kernel_with_hash),
+    ]
+
+    with TemporaryDirectory(dir=sys.argv[1]) as temp_dir:
+        src = os.path.join(temp_dir, "source.bin")
+        dst = os.path.join(temp_dir, "copy.bin")
+        method = None
+        for size_mb in sizes:
+            create_source_file(src, size_mb)
+            for name, function in benchmarks:
+                if function is common_utils.copy_file_with_hash:
+                    elapsed = measure(
+                        lambda s, d: function(sha512, s, d), src, dst
+                    )
+                else:
+                    elapsed = measure(function, src, dst)
+                print(
+                    "{:>6} MB  {:<26} {:8.3f} s  {:8.1f} MB/s".format(
+                        size_mb, name, elapsed, size_mb / elapsed
+                    )
+                )
+            method = common_utils.copy_file_kernel(src, dst)
+            os.remove(dst)
+        print("kernel copy method used:", method)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from mysql.connector import errors as mysql_errors
+
+from archivingsystem.common.exceptions import (
+    DatabaseSyntaxErrorCustomException,
+    WrongTaskCustomException,
+)
+from archivingsystem.database.db_library import DatabaseHandler
+from archivingsystem.validation import bulk_validator as bulk_validator_module
+from archivingsystem.validation.bulk_validator import (
+    BulkValidator,
+    format_bulk_task_message,
+)
+
+OWNERS = ("alice", "bob")
+
+
+class StubCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+        self.rowcount = -1
+
+    def execute(self, query, params=()):
+        self.rows = self.connection.execute(query, list(params))
+        self.rowcount = self.connection.rowcount
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class StubConnection:
+    """
+    In-memory replacement of MySQL connection, it answers
+    queries of DatabaseHandler used by bulk validation
+    """
+
+    def __init__(self, file_ids):
+        self.archived_files = {
+            file_id: (
+                file_id,
+                "file{}.txt".format(file_id),
+                OWNERS[file_id % 2],
+                "/origin/file{}.txt".format(file_id),
+                "/storage/{}".format(file_id),
+                b"hash",
+                datetime(2026, 1, 1),
+                b"cert",
+                b"signature",
+                b"package0",
+                datetime(2030, 1, 1),
+            )
+            for file_id in file_ids
+        }
+        self.validations = {}
+        self.bulk_validations = {}
+        self.queries = []
+        self.error = None
+        self.rowcount = -1
+
+    def cursor(self, prepared=False):
+        return StubCursor(self)
+
+    def commit(self):
+        pass
+
+    def execute(self, query, params):
+        self.queries.append(query)
+        if self.error is not None:
+            raise self.error
+        if query.startswith("select FileID from ArchivedFiles"):
+            *params, after_id, limit = params
+            if "OwnerName" in query:
+                (owner,) = params
+                ids = [
+                    file_id
+                    for file_id, row in self.archived_files.items()
+                    if row[2] == owner
+                ]
+            else:
+                first_id, last_id = params
+                ids = [
+                    file_id
+                    for file_id in self.archived_files
+                    if first_id <= file_id <= last_id
+                ]
+            return self._page(ids, after_id, limit)
+        if query.startswith("select a.FileID from"):
+            validated_since, after_id, limit = params
+            ids = [
+                file_id
+                for file_id in self.archived_files
+                if file_id not in self.validations
+                or self.validations[file_id][0] < validated_since
+            ]
+            return self._page(ids, after_id, limit)
+        if query.startswith("select * from ArchivedFiles"):
+            return [self.archived_files[i] for i in params]
+        if query.startswith("select * from FilePackages"):
+            return [
+                (i, i, "tsa", datetime(2026, 1, 1), b"tsa_cert", b"hash")
+                for i in params
+                if i % 7
+            ]
+        if query.startswith("INSERT into FileValidations"):
+            values = iter(params)
+            for file_id, *validation in zip(*[values] * 5):
+                self.validations[file_id] = tuple(validation)
+            return []
+        if query.startswith("select a.FileID, a.FileName"):
+            (bulk_validation_id,) = params
+            return [
+                self.archived_files[file_id][:3] + (result,)
+                for file_id, (_, is_valid, job_id, result) in sorted(
+                    self.validations.items()
+                )
+                if job_id == bulk_validation_id and not is_valid
+            ]
+        if query.startswith("INSERT IGNORE into BulkValidations"):
+            bulk_validation_id, started_at = params
+            self.bulk_validations.setdefault(
+                bulk_validation_id,
+                [bulk_validation_id, 0, 0, 0, started_at, None],
+            )
+            return []
+        if query.startswith("select BulkValidationID"):
+            (bulk_validation_id,) = params
+            job = self.bulk_validations.get(bulk_validation_id)
+            return [tuple(job)] if job else []
+        if query.startswith("UPDATE BulkValidations"):
+            last_id, validated, not_valid, finished_at, job_id, after_id = (
+                params
+            )
+            job = self.bulk_validations.get(job_id)
+            self.rowcount = 0
+            if job and job[1] == after_id and job[5] is None:
+                job[1:] = [
+                    last_id,
+                    job[2] + validated,
+                    job[3] + not_valid,
+                    job[4],
+                    finished_at,
+                ]
+                self.rowcount = 1
+            return []
+        raise AssertionError("unexpected query: " + query)
+
+    def _page(self, ids, after_id, limit):
+        return [(i,) for i in sorted(ids) if i > after_id][:limit]
+
+
+def validate_record(archived_file_rec, file_packages):
+    if archived_file_rec.FileID % 5 == 0:
+        return "archived file with id: {} isnt valid".format(
+            archived_file_rec.FileID
+        )
+    if archived_file_rec.FileID % 11 == 0:
+        raise OSError("package is not readable")
+    return True
+
+
+class StubSmtp:
+    """
+    Replacement of smtplib module, sent mails are kept in
+    class attribute
+    """
+
+    sent = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def login(self, *args):
+        pass
+
+    def sendmail(self, sender, recipients, message):
+        StubSmtp.sent.append((recipients, message))
+
+    SMTP_SSL = None
+
+
+StubSmtp.SMTP_SSL = StubSmtp
+
+
+def make_bulk_validator(connection, page_size, executor, published):
+    config = {
+        "bulk_page_size": page_size,
+        "contact": {
+            "email_server": "localhost",
+            "sender_email": "archive@example.com",
+            "sender_password": "",
+            "email": "admin@example.com",
+            "phone": "000",
+        },
+    }
+    bulk_validator = BulkValidator(
+        DatabaseHandler(connection), config, executor, published.append
+    )
+    bulk_validator.validator.validate_record = validate_record
+    return bulk_validator
+
+
+def run_bulk_validation(
+    bulk_validator, published, job_id, selection, recipients
+):
+    """
+    Publishes first task and executes published tasks like
+    validation worker, returns number of executed tasks
+    """
+    published.append(format_bulk_task_message(job_id, selection, recipients))
+    tasks = 0
+    while published:
+        body = json.loads(published.pop(0))
+        assert body["task"] == "validate_bulk"
+        result = bulk_validator.validate_bulk(
+            body["bulk_validation_id"],
+            body["selection"],
+            body["recipients"],
+            body["after_file_id"],
+        )
+        assert result == "OK"
+        tasks += 1
+    return tasks
+
+
+def check_db_handler():
+    connection = StubConnection(range(1, 26))
+    db_handler = DatabaseHandler(connection)
+
+    pages = db_handler.get_file_id_pages_in_range(3, 20, 5)
+    # query runs when pages are iterated
+    assert connection.queries == []
+    assert list(pages) == [
+        [3, 4, 5, 6, 7],
+        [8, 9, 10, 11, 12],
+        [13, 14, 15, 16, 17],
+        [18, 19, 20],
+    ]
+    # full last page needs one more query which returns nothing
+    assert list(db_handler.get_file_id_pages_in_range(1, 10, 5)) == [
+        [1, 2, 3, 4, 5],
+        [6, 7, 8, 9, 10],
+    ]
+    assert list(db_handler.get_file_id_pages_of_owner("alice", 4)) == [
+        [2, 4, 6, 8],
+        [10, 12, 14, 16],
+        [18, 20, 22, 24],
+    ]
+    assert list(db_handler.get_file_id_pages_of_owner("nobody", 4)) == []
+
+    validated_at = datetime(2026, 5, 1)
+    db_handler.set_validation_results(
+        [(1, True), (2, "not valid"), (3, True)], validated_at
+    )
+    assert connection.validations[1] == (validated_at, True, None, None)
+    assert connection.validations[2] == (
+        validated_at,
+        False,
+        None,
+        "not valid",
+    )
+    assert list(
+        db_handler.get_file_id_pages_not_validated_since(validated_at, 10)
+    ) == [list(range(4, 14)), list(range(14, 24)), [24, 25]]
+    assert list(
+        db_handler.get_file_id_pages_not_validated_since(
+            datetime(2026, 6, 1), 30
+        )
+    ) == [list(range(1, 26))]
+    # page of task continues after FileID reached by previous task
+    pages = db_handler.get_file_id_pages_in_range(3, 20, 5, 14)
+    assert next(pages) == list(range(15, 20))
+    pages = db_handler.get_file_id_pages_of_owner("bob", 2, 20)
+    assert next(pages) == [21, 23]
+
+    records = db_handler.get_archived_file_records_by_file_ids([4, 7, 9])
+    assert sorted(records) == [4, 7, 9]
+    assert records[9].OwnerName == "bob"
+    file_packages = db_handler.get_file_package_records_by_file_ids([4, 7])
+    assert list(file_packages) == [4]
+    assert file_packages[4][0].ArchivedFileID == 4
+
+    # errors raised while pages are iterated are translated
+    connection.error = mysql_errors.ProgrammingError("syntax")
+    for get_pages, args in (
+        (db_handler.get_file_id_pages_in_range, (1, 10, 5)),
+        (db_handler.get_file_id_pages_of_owner, ("alice", 5)),
+        (db_handler.get_file_id_pages_not_validated_since, (validated_at, 5)),
+    ):
+        try:
+            list(get_pages(*args))
+        except DatabaseSyntaxErrorCustomException:
+            pass
+        else:
+            raise AssertionError("mysql error was not translated")
+
+
+def check_bulk_validator(executor):
+    bulk_validator_module.smtplib = StubSmtp
+    connection = StubConnection(range(1, 48))
+    published = []
+    bulk_validator = make_bulk_validator(connection, 10, executor, published)
+
+    selection = {"file_id_from": 5, "file_id_to": 40}
+    job_id = "range-job"
+    tasks = run_bulk_validation(
+        bulk_validator, published, job_id, selection, ["a@b.c", "d@e.f"]
+    )
+    # one task per page of 10 files
+    assert tasks == 4
+    # records of every page are read by two queries
+    assert (
+        sum(query.startswith("select * from") for query in connection.queries)
+        == 8
+    )
+    # no packages (7), not valid (5) and validation errors (11)
+    failed_ids = [
+        i for i in range(5, 41) if i % 5 == 0 or i % 7 == 0 or i % 11 == 0
+    ]
+    assert sorted(connection.validations) == list(range(5, 41))
+    for file_id, validation in connection.validations.items():
+        _, is_valid, bulk_validation_id, result = validation
+        assert bulk_validation_id == job_id
+        assert is_valid == (file_id not in failed_ids)
+        assert (result is None) == is_valid
+    job = connection.bulk_validations[job_id]
+    assert job[1:4] == [40, 36, len(failed_ids)]
+    assert job[5] is not None
+
+    # one report with results of all pages to every recipient
+    assert [recipients for recipients, _ in StubSmtp.sent] == [
+        ["a@b.c"],
+        ["d@e.f"],
+    ]
+    report = StubSmtp.sent[0][1]
+    assert "Validated files: 36" in report
+    assert "Files which are not valid: {}".format(len(failed_ids)) in report
+    for file_id in failed_ids:
+        assert "file{}.txt (".format(file_id) in report
+    assert "package is not readable" in report
+
+    # duplicate tasks of stored pages are dropped
+    StubSmtp.sent.clear()
+    queries = len(connection.queries)
+    for after_file_id in (0, 14, 34):
+        assert (
+            bulk_validator.validate_bulk(job_id, selection, [], after_file_id)
+            == "OK"
+        )
+    assert published == [] and StubSmtp.sent == []
+    assert not any(
+        query.startswith("select * from")
+        for query in connection.queries[queries:]
+    )
+
+    # task of unknown job
+    try:
+        bulk_validator.validate_bulk("unknown", selection, [], 14)
+    except WrongTaskCustomException:
+        pass
+    else:
+        raise AssertionError("task of unknown job was accepted")
+
+    # last page is full, job is finished by task of empty page
+    bulk_validator.page_size = 8
+    tasks = run_bulk_validation(
+        bulk_validator, published, "owner-job", {"owner": "bob"}, []
+    )
+    assert tasks == 4
+    assert connection.bulk_validations["owner-job"][1:3] == [47, 24]
+
+    StubSmtp.sent.clear()
+    tasks = run_bulk_validation(
+        bulk_validator,
+        published,
+        "not-validated-job",
+        {"not_validated_since": "2000-01-01 00:00:00"},
+        ["a@b.c"],
+    )
+    assert tasks == 1
+    # even files out of range were never validated
+    assert "Validated files: 5" in StubSmtp.sent[0][1]
+
+
+def main():
+    check_db_handler()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        check_bulk_validator(executor)
+    print("test successful")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import hashlib
+import os
+from hashlib import sha512
+from tempfile import TemporaryDirectory
+
+from archivingsystem.common import hashing
+from archivingsystem.common import utils as common_utils
+
+
+def main():
+    hashing.configure_hashing({"block_size": 65536, "mmap_threshold": 65536})
+    with TemporaryDirectory() as temp_dir:
+        src = os.path.join(temp_dir, "source.bin")
+        data = os.urandom(3 * hashing.get_block_size() + 123)
+        with open(src, "wb") as f:
+            f.write(data)
+
+        dst = os.path.join(temp_dir, "copy.bin")
+        digests = {
+            "sha3_512": hashlib.sha3_512(),
+            "blake2b": hashlib.blake2b(),
+        }
+        digest = common_utils.copy_file_with_hash(
+            sha512, src, dst, True, digests
+        )
+
+        assert digest == common_utils.get_file_hash(sha512, src)
+        assert digest == common_utils.get_file_hash(sha512, dst)
+        assert os.stat(src).st_mtime == os.stat(dst).st_mtime
+
+        assert digests["sha3_512"].digest() == hashlib.sha3_512(data).digest()
+        assert digests["blake2b"].digest() == hashlib.blake2b(data).digest()
+
+        mmap_digests = {"sha3_512": hashlib.sha3_512()}
+        common_utils.get_file_hash(sha512, src, mmap_digests)
+
+        assert (
+            mmap_digests["sha3_512"].digest()
+            == hashlib.sha3_512(data).digest()
+        )
+
+        kernel_dst = os.path.join(temp_dir, "kernel_copy.bin")
+        common_utils.copy_file_kernel(src, kernel_dst)
+
+        assert digest == common_utils.get_file_hash(sha512, kernel_dst)
+        os.remove(kernel_dst)
+
+        package_dir = os.path.join(temp_dir, "package")
+        os.mkdir(package_dir)
+        os.rename(dst, os.path.join(package_dir, "copy.bin"))
+        tar_path, tar_digest = common_utils.create_tar_file_from_dir(
+            package_dir, os.path.join(package_dir, "Package0.tar"), sha512
+        )
+
+        assert os.listdir(package_dir) == ["Package0.tar"]
+        assert tar_digest == common_utils.get_file_hash(sha512, tar_path)
+
+    print("test successful")
+
+
+if __name__ == "__main__":
+    main()
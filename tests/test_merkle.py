@@ -0,0 +1,22 @@
+import os
+
+from archivingsystem.common import merkle
+
+
+def main():
+    for leaf_count in range(1, 20):
+        leaves = [os.urandom(64) for _ in range(leaf_count)]
+        tree = merkle.MerkleTree(leaves)
+
+        for index, leaf in enumerate(leaves):
+            proof = merkle.load_proof(merkle.dump_proof(tree.get_proof(index)))
+            assert merkle.compute_root(leaf, proof) == tree.root
+
+        if leaf_count > 1:
+            assert merkle.compute_root(leaves[0], tree.get_proof(1)) != tree.root
+
+    print("test successful")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import os
+import tarfile
+from hashlib import sha512
+from tempfile import TemporaryDirectory
+
+from archivingsystem.common import package_index
+from archivingsystem.common import utils as common_utils
+from archivingsystem.validation.package_reader import PackageReader
+
+
+def write_file(dir_path, name, data):
+    path = os.path.join(dir_path, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def write_certificate_files(dir_path):
+    for name in ("signing_cert.pem", "tsa_cert.crt", "tsa_ca_cert.pem"):
+        write_file(dir_path, "certificate_files/" + name, os.urandom(700))
+
+
+def make_package(dir_path, name, previous_index=None):
+    tar_path, _ = common_utils.create_tar_file_from_dir(
+        dir_path, os.path.join(dir_path, name), sha512
+    )
+    index = package_index.build_index(tar_path, previous_index)
+    package_index.store_index(dir_path, index)
+    return tar_path, index
+
+
+def read_layers(tar_path):
+    """
+    Returns list of layers as dictionaries {member name: data},
+    layers are read by nested tarfile without index
+    """
+    layers = []
+    tarf = tarfile.open(tar_path, "r:")
+    name = os.path.basename(tar_path)
+    while tarf is not None:
+        layer = {
+            member.name: tarf.extractfile(member).read()
+            for member in tarf.getmembers()
+            if member.isfile()
+        }
+        layers.append(layer)
+        inner = [
+            member_name
+            for member_name in layer
+            if "/" not in member_name
+            and member_name.startswith("Package")
+            and member_name.endswith(".tar")
+        ]
+        if name == "Package0.tar" or not inner:
+            tarf = None
+        else:
+            name = inner[0]
+            tarf = tarfile.open(fileobj=tarf.extractfile(name), mode="r:")
+    return layers
+
+
+def read_layers_by_reader(tar_path, index=None):
+    layers = []
+    readers = [PackageReader.open(tar_path, index=index)]
+    try:
+        while True:
+            reader = readers[-1]
+            layers.append(
+                {
+                    member.name: reader.read(member)
+                    for member in reader.tarf.getmembers()
+                    if member.isfile()
+                }
+            )
+            if reader.name.endswith("Package0.tar"):
+                break
+            readers.append(reader.open_inner(reader.find("Package")))
+    finally:
+        for reader in reversed(readers):
+            reader.close()
+    return type(readers[0].tarf), layers
+
+
+def check_index(tar_path, index):
+    """
+    Checks offsets and sizes of index against data of
+    members read by tarfile
+    """
+    layers = read_layers(tar_path)
+    assert index["package"] == os.path.basename(tar_path)
+    assert index["size"] == os.path.getsize(tar_path)
+    assert len(index["layers"]) == len(layers)
+    with open(tar_path, "rb") as f:
+        for indexed_layer, layer in zip(index["layers"], layers):
+            assert set(indexed_layer["members"]) == set(layer)
+            for name, (offset, size) in indexed_layer["members"].items():
+                assert size == len(layer[name])
+                f.seek(offset)
+                assert f.read(size) == layer[name]
+
+
+def main():
+    with TemporaryDirectory() as package_dir:
+        write_file(package_dir, "archived.bin", os.urandom(300000))
+        write_file(package_dir, "timestamp0", os.urandom(900))
+        tar_path, index = make_package(package_dir, "Package0.tar")
+        check_index(tar_path, index)
+        assert len(index["layers"]) == 1
+
+        # index must not be packed to next layer
+        package_index.remove_index(package_dir)
+        write_file(package_dir, "signature.sig", os.urandom(512))
+        write_file(package_dir, "timestamp1", os.urandom(900))
+        write_certificate_files(package_dir)
+        tar_path, index = make_package(package_dir, "Package1.tar")
+        check_index(tar_path, index)
+
+        for number in range(2, 5):
+            previous_index = package_index.load_index(package_dir)
+            assert previous_index == index
+            package_index.remove_index(package_dir)
+            write_file(package_dir, "timestamp", os.urandom(900 + number))
+            write_certificate_files(package_dir)
+            tar_path, index = make_package(
+                package_dir, "PackageF{}.tar".format(number), previous_index
+            )
+
+            assert len(index["layers"]) == number + 1
+            assert index == package_index.build_index(tar_path)
+            check_index(tar_path, index)
+
+        assert package_index.load_index(package_dir) == index
+        indexed_type, indexed_layers = read_layers_by_reader(tar_path, index)
+        assert indexed_type is package_index.IndexedTarFile
+        package_index.remove_index(package_dir)
+        tar_type, tar_layers = read_layers_by_reader(tar_path)
+        assert tar_type is tarfile.TarFile
+        assert indexed_layers == tar_layers == read_layers(tar_path)
+
+        # package changed after index was stored
+        package_index.store_index(package_dir, index)
+        write_file(package_dir, "appended", os.urandom(100))
+        with tarfile.open(tar_path, "a:") as tarf:
+            tarf.add(os.path.join(package_dir, "appended"), "appended")
+        os.remove(os.path.join(package_dir, "appended"))
+        assert package_index.load_index(package_dir) is None
+        tar_type, _ = read_layers_by_reader(tar_path)
+        assert tar_type is tarfile.TarFile
+
+        # index which does not fit size of package
+        index["size"] = os.path.getsize(tar_path)
+        index["mtime_ns"] = os.stat(tar_path).st_mtime_ns
+        index["layers"][-2]["members"]["Package0.tar"][0] = index["size"]
+        package_index.store_index(package_dir, index)
+        assert package_index.load_index(package_dir) is None
+
+    print("test successful")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+import rfc3161ng
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+from pyasn1.codec.der import decoder, encoder
+from pyasn1.type import tag, univ, useful
+from pyasn1_modules import rfc2315, rfc2459
+
+from archivingsystem.common.timestamp_verifier import (
+    ID_ATTRIBUTE_CONTENT_TYPE,
+    ID_ATTRIBUTE_MESSAGE_DIGEST,
+    TimestampVerifier,
+)
+
+ID_ATTRIBUTE_SIGNING_TIME = univ.ObjectIdentifier((1, 2, 840, 113549, 1, 9, 5))
+ID_SHA256_WITH_RSA = univ.ObjectIdentifier((1, 2, 840, 113549, 1, 1, 11))
+
+
+def make_name(common_name):
+    return x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+
+
+def make_ca(common_name="Test Root CA"):
+    key = ec.generate_private_key(ec.SECP256R1())
+    now = datetime.now(timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(make_name(common_name))
+        .issuer_name(make_name(common_name))
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=30))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), True)
+        .sign(key, hashes.SHA256())
+    )
+    return key, certificate
+
+
+def make_tsa_certificate(ca_key, ca_certificate, key_usage):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    now = datetime.now(timezone.utc)
+    builder = (
+        x509.CertificateBuilder()
+        .subject_name(make_name("Test TSA"))
+        .issuer_name(ca_certificate.subject)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=30))
+    )
+    if key_usage is not None:
+        builder = builder.add_extension(
+            x509.ExtendedKeyUsage([key_usage]), True
+        )
+    return key, builder.sign(ca_key, hashes.SHA256())
+
+
+def pem(certificate):
+    return certificate.public_bytes(serialization.Encoding.PEM)
+
+
+def make_attribute(oid, value):
+    attribute = rfc2315.Attribute()
+    attribute["type"] = oid
+    attribute["values"].setComponentByPosition(0, encoder.encode(value))
+    return attribute
+
+
+def make_token(data, tsa_key, tsa_certificate, content_type=None):
+    """
+    Returns DER timestamp token of sha512 of data signed by
+    tsa_key, signed attributes hold content_type, sha256
+    digest of TSTInfo and signing time
+    """
+    imprint = rfc3161ng.MessageImprint()
+    imprint["hashAlgorithm"]["algorithm"] = rfc3161ng.id_sha512
+    imprint["hashedMessage"] = hashlib.sha512(data).digest()
+    tst_info = rfc3161ng.TSTInfo()
+    tst_info["version"] = 1
+    tst_info["policy"] = univ.ObjectIdentifier((1, 2, 3, 4))
+    tst_info["messageImprint"] = imprint
+    tst_info["serialNumber"] = 1
+    now = datetime.now(timezone.utc)
+    tst_info["genTime"] = useful.GeneralizedTime(now.strftime("%Y%m%d%H%M%SZ"))
+    content = encoder.encode(tst_info)
+
+    attributes = rfc2315.Attributes().subtype(
+        implicitTag=tag.Tag(tag.tagClassContext, tag.tagFormatConstructed, 0)
+    )
+    attributes.setComponentByPosition(
+        0,
+        make_attribute(
+            ID_ATTRIBUTE_CONTENT_TYPE, content_type or rfc3161ng.id_ct_TSTInfo
+        ),
+    )
+    attributes.setComponentByPosition(
+        1,
+        make_attribute(
+            ID_ATTRIBUTE_MESSAGE_DIGEST,
+            univ.OctetString(hashlib.sha256(content).digest()),
+        ),
+    )
+    attributes.setComponentByPosition(
+        2,
+        make_attribute(
+            ID_ATTRIBUTE_SIGNING_TIME,
+            useful.UTCTime(now.strftime("%y%m%d%H%M%SZ")),
+        ),
+    )
+    signed_attributes = univ.SetOf()
+    for i, attribute in enumerate(attributes):
+        signed_attributes.setComponentByPosition(i, attribute)
+    signature = tsa_key.sign(
+        encoder.encode(signed_attributes), padding.PKCS1v15(), hashes.SHA256()
+    )
+
+    signer_info = rfc2315.SignerInfo()
+    signer_info["version"] = 1
+    issuer, _ = decoder.decode(
+        tsa_certificate.issuer.public_bytes(), asn1Spec=rfc2459.Name()
+    )
+    signer_info["issuerAndSerialNumber"]["issuer"] = issuer
+    signer_info["issuerAndSerialNumber"][
+        "serialNumber"
+    ] = tsa_certificate.serial_number
+    signer_info["digestAlgorithm"]["algorithm"] = rfc3161ng.id_sha256
+    signer_info["authenticatedAttributes"] = attributes
+    signer_info["digestEncryptionAlgorithm"]["algorithm"] = ID_SHA256_WITH_RSA
+    signer_info["encryptedDigest"] = signature
+
+    token = rfc3161ng.TimeStampToken()
+    token["contentType"] = rfc2315.signedData
+    signed_data = token["content"]
+    signed_data["version"] = 3
+    digest_algorithm = rfc2459.AlgorithmIdentifier()
+    digest_algorithm["algorithm"] = rfc3161ng.id_sha256
+    signed_data["digestAlgorithms"].setComponentByPosition(0, digest_algorithm)
+    signed_data["contentInfo"]["contentType"] = rfc3161ng.id_ct_TSTInfo
+    signed_data["contentInfo"]["content"] = encoder.encode(
+        univ.OctetString(content)
+    )
+    signed_data["signerInfos"].setComponentByPosition(0, signer_info)
+    return encoder.encode(token)
+
+
+def tamper_signed_attribute(ts):
+    token, _ = decoder.decode(ts, asn1Spec=rfc3161ng.TimeStampToken())
+    signer_info = token["content"]["signerInfos"][0]
+    for attribute in signer_info["authenticatedAttributes"]:
+        if attribute["type"] == ID_ATTRIBUTE_SIGNING_TIME:
+            attribute["values"][0] = encoder.encode(
+                useful.UTCTime("000101000000Z")
+            )
+    return encoder.encode(token)
+
+
+def main():
+    data = b"archived file digest"
+    verifier = TimestampVerifier()
+    ca_key, ca_certificate = make_ca()
+    tsa_key, tsa_certificate = make_tsa_certificate(
+        ca_key, ca_certificate, ExtendedKeyUsageOID.TIME_STAMPING
+    )
+    ts = make_token(data, tsa_key, tsa_certificate)
+
+    assert verifier.verify(ts, data, pem(tsa_certificate), pem(ca_certificate))
+    # DER certificates are accepted too
+    assert verifier.verify(
+        ts,
+        data,
+        tsa_certificate.public_bytes(serialization.Encoding.DER),
+        ca_certificate.public_bytes(serialization.Encoding.DER),
+    )
+
+    # wrong message imprint
+    assert not verifier.verify(
+        ts, b"other data", pem(tsa_certificate), pem(ca_certificate)
+    )
+
+    # signed attribute changed after signing
+    assert not verifier.verify(
+        tamper_signed_attribute(ts),
+        data,
+        pem(tsa_certificate),
+        pem(ca_certificate),
+    )
+
+    # signed content type is not TSTInfo, signature is valid
+    other_content = make_token(
+        data, tsa_key, tsa_certificate, content_type=rfc2315.data
+    )
+    assert not verifier.verify(
+        other_content, data, pem(tsa_certificate), pem(ca_certificate)
+    )
+
+    # CA with the same name, but different key
+    _, other_ca_certificate = make_ca()
+    assert not verifier.verify(
+        ts, data, pem(tsa_certificate), pem(other_ca_certificate)
+    )
+
+    # token signed by other key than key of TSA certificate
+    other_key, _ = make_tsa_certificate(
+        ca_key, ca_certificate, ExtendedKeyUsageOID.TIME_STAMPING
+    )
+    assert not verifier.verify(
+        make_token(data, other_key, tsa_certificate),
+        data,
+        pem(tsa_certificate),
+        pem(ca_certificate),
+    )
+
+    # TSA certificate without time stamping key usage
+    for key_usage in (None, ExtendedKeyUsageOID.CLIENT_AUTH):
+        key, certificate = make_tsa_certificate(
+            ca_key, ca_certificate, key_usage
+        )
+        assert not verifier.verify(
+            make_token(data, key, certificate),
+            data,
+            pem(certificate),
+            pem(ca_certificate),
+        )
+
+    print("test successful")
+
+
+if __name__ == "__main__":
+    main()
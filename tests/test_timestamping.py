@@ -1,9 +1,18 @@
 from hashlib import sha512
 
+from cryptography import x509
+
 from archivingsystem.common import utils
+from archivingsystem.common.tsa_client import TimestampingClient
 from archivingsystem.common.yaml_parser import parse_yaml_config
 
 
+def validate_certificate(crl_content, ca_file_path):
+    crl = x509.load_pem_x509_crl(crl_content)
+    ca = x509.load_pem_x509_certificate(utils.load_data(ca_file_path))
+    return utils.validate_certificate_with_crl(crl, ca)
+
+
 def main():
     parsed_config = parse_yaml_config(
         "/home/nextcloudadmin/archiving-system-nextcloud/config/start_retimestamping_worker_config.yaml"
@@ -13,7 +22,7 @@ def main():
         parsed_config["retimestamping_info"]["TSA_info"]["tsa_crl_url"]
     )
 
-    validation = utils.validate_certificate(
+    validation = validate_certificate(
         crl, parsed_config["retimestamping_info"]["TSA_info"]["tsa_ca_pem"]
     )
     assert validation is None
@@ -21,10 +30,9 @@ def main():
     hash_to_ts = sha512()
     hash_to_ts.update(b"Test")
 
-    ts = utils.get_timestamp(
-        parsed_config["retimestamping_info"]["TSA_info"],
-        hash_to_ts.digest(),
-    )
+    ts = TimestampingClient(
+        parsed_config["retimestamping_info"]["TSA_info"]
+    ).get_timestamp(hash_to_ts.digest())
 
     ver = utils.verify_timestamp(
         ts,
@@ -38,7 +46,7 @@ def main():
         parsed_config["retimestamping_info"]["TSA_info"]["tsa_crl_url"]
     )
 
-    validation = utils.validate_certificate(
+    validation = validate_certificate(
         crl, parsed_config["retimestamping_info"]["TSA_info"]["tsa_ca_pem"]
     )
     assert validation is None